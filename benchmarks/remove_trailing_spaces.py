@@ -0,0 +1,73 @@
+"""
+Benchmark of `remove_trailing_spaces` against the cell by cell implementation it
+replaced, on a wide reference table.
+
+    python benchmarks/remove_trailing_spaces.py --rows 50000 --columns 40
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from rules_engine.external_source import remove_trailing_spaces
+
+
+def remove_trailing_spaces_applymap(df: pd.DataFrame) -> pd.DataFrame:
+    return df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+
+
+def make_frame(rows: int, columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    names = np.array([f" name {idx} " for idx in range(100)], dtype=object)
+    data = {}
+    for idx in range(columns):
+        if idx % 4 == 0:
+            data[f"amount_{idx}"] = rng.random(rows)
+        elif idx % 4 == 1:
+            data[f"count_{idx}"] = rng.integers(0, 1000, rows)
+        elif idx % 4 == 2:
+            data[f"name_{idx}"] = names[rng.integers(0, len(names), rows)]
+        else:
+            # free text with a few missing cells
+            text = np.array([f"text {idx}  " for idx in range(rows)], dtype=object)
+            text[::50] = None
+            data[f"text_{idx}"] = text
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = make_frame(args.rows, args.columns)
+    pd.testing.assert_frame_equal(
+        remove_trailing_spaces(frame), remove_trailing_spaces_applymap(frame)
+    )
+    timings = {
+        "applymap": lambda: remove_trailing_spaces_applymap(frame),
+        "vectorized": lambda: remove_trailing_spaces(frame),
+        "vectorized + categoricals": lambda: remove_trailing_spaces(frame, 0.01),
+    }
+    results = {}
+    for name, func in timings.items():
+        results[name] = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:<28}{results[name] * 1000:10.1f} ms")
+    print(f"speedup: {results['applymap'] / results['vectorized']:.1f}x")
+    memory = {
+        name: remove_trailing_spaces(frame, threshold).memory_usage(deep=True).sum()
+        / 1024**2
+        for name, threshold in (("object", None), ("categoricals", 0.01))
+    }
+    print(
+        f"memory: {memory['object']:.1f} MB as objects, "
+        f"{memory['categoricals']:.1f} MB with categoricals"
+    )
+
+
+if __name__ == "__main__":
+    main()
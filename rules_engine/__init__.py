@@ -1 +1,2 @@
 from .rules_engine import RulesEngine
+from .rule_set import CompiledRuleSet
@@ -0,0 +1,155 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .models import Rule, RulesDefinition
+from .models.models import RuleValue
+from .utils.comparison import convert_to_datetime
+
+logger = logging.getLogger("bre.decision_table")
+logger.setLevel("DEBUG")
+
+# the shorter runs of rules are evaluated one after another
+MIN_RULES = 8
+
+
+class DecisionTable:
+    """
+    A run of consecutive rules of a first hit group whose leading comparison is an
+    `equal_to` or `within` comparison of the same variable with literals (e.g. the
+    `${country} equal_to FR`, `${country} equal_to DE`, ... rules). The rules are
+    indexed by the values satisfying that comparison, so that only the candidates of
+    the value of the variable are evaluated, in the order of the group.
+
+    The rules of a table have no `else` and do not read the external data: a rule
+    whose conditions are not satisfied has no effect, it can be skipped.
+
+    Example usage:
+        for rule_name in table.candidates(engine):
+            ...
+    """
+
+    __slots__ = ("start", "rule_names", "variable", "exact", "stripped")
+
+    def __init__(self, start: int, variable: RuleValue):
+        # the position of the first rule in the group
+        self.start = start
+        self.rule_names: List[str] = []
+        self.variable = variable
+        # value -> positions of the rules satisfied by it, and the same for the
+        # stripped strings of the `equal_to` comparisons with a string
+        self.exact: Dict[Any, List[int]] = {}
+        self.stripped: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rule_names)
+
+    def add(self, rule_name: str, stripped: bool, keys: List[Any]):
+        position = len(self.rule_names)
+        self.rule_names.append(rule_name)
+        for key in keys:
+            positions = self.exact.setdefault(key, [])
+            if not positions or positions[-1] != position:
+                positions.append(position)
+            if stripped:
+                positions = self.stripped.setdefault(key.strip(), [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+    def candidates(self, engine) -> List[str]:
+        """The rules which may be satisfied by the current value of the variable."""
+        value = convert_to_datetime(self.variable.resolve(engine))
+        try:
+            positions = self.exact.get(value, [])
+        except TypeError:
+            # an unhashable value, e.g. a list, all the rules are evaluated
+            return self.rule_names
+        if isinstance(value, str):
+            stripped = self.stripped.get(value.strip())
+            if stripped:
+                positions = sorted({*positions, *stripped})
+        logger.info(
+            f"Dispatching {self.variable.raw} = {value} to {len(positions)} "
+            f"of {len(self.rule_names)} rules"
+        )
+        return [self.rule_names[position] for position in positions]
+
+
+def _dispatch_keys(
+    rule: Rule, ext_data_variables_name: List[str]
+) -> Optional[Tuple[str, bool, List[Any]]]:
+    # the dispatched variable, and the keys of the rule, when it can be skipped
+    condition = rule.if_condition
+    if condition is None or rule.else_transformations:
+        return None
+    if len(condition.comparisons) > 1 and condition.logical_operator != "and":
+        return None
+    if any(
+        comparison.reads_ext_data(ext_data_variables_name)
+        for comparison in condition.comparisons
+    ):
+        return None
+    leading = condition.comparisons[0]
+    keys = leading.dispatch_keys()
+    if keys is None:
+        return None
+    return (leading.compiled_variable.raw, *keys)
+
+
+def compile_decision_tables(
+    rules_definition: RulesDefinition,
+    parsed_rules: Dict[str, Rule],
+    ext_data_variables_name: List[str],
+) -> Dict[str, Dict[int, DecisionTable]]:
+    """
+    Index the runs of at least `MIN_RULES` consecutive rules of the first hit groups
+    which are dispatched on the same variable, see `DecisionTable`. Return the tables
+    of each group by the position of their first rule.
+    """
+    decision_tables: Dict[str, Dict[int, DecisionTable]] = {}
+    for group_name, rules in rules_definition.groups.items():
+        if group_name == "no_group_rules":
+            # every rule is evaluated, there is no first hit
+            continue
+        tables: Dict[int, DecisionTable] = {}
+        table: Optional[DecisionTable] = None
+        for position, rule_name in enumerate(rules):
+            keys = _dispatch_keys(parsed_rules[rule_name], ext_data_variables_name)
+            if keys is not None and table is not None and keys[0] == table.variable.raw:
+                table.add(rule_name, *keys[1:])
+                continue
+            if table is not None and len(table) >= MIN_RULES:
+                tables[table.start] = table
+            table = None
+            if keys is not None:
+                leading = parsed_rules[rule_name].if_condition.comparisons[0]
+                table = DecisionTable(position, leading.compiled_variable)
+                table.add(rule_name, *keys[1:])
+        if table is not None and len(table) >= MIN_RULES:
+            tables[table.start] = table
+        if tables:
+            logger.info(
+                f"Group '{group_name}' dispatches {sum(map(len, tables.values()))} "
+                f"rules with {len(tables)} decision tables"
+            )
+            decision_tables[group_name] = tables
+    return decision_tables
+
+
+def group_rules(
+    engine, rules: List[str], tables: Optional[Dict[int, DecisionTable]]
+) -> Iterator[str]:
+    """The rules of a group to process, in order, without the rules of its decision
+    tables which cannot be satisfied. The candidates of a table are looked up when
+    the processing reaches it, after the rules before it have been applied."""
+    if not tables:
+        yield from rules
+        return
+    position = 0
+    while position < len(rules):
+        table = tables.get(position)
+        if table is None:
+            yield rules[position]
+            position += 1
+        else:
+            yield from table.candidates(engine)
+            position += len(table)
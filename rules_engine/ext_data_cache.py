@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Set
+
+import pandas as pd
+
+from .external_source import ExternalSource
+from .utils.ext_data import ExtDataTable
+
+logger = logging.getLogger("bre.ext_data_cache")
+logger.setLevel("DEBUG")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    refreshes: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+@dataclass
+class _Entry:
+    ext_data: pd.DataFrame
+    size: int
+    expires_at: float
+    # what the source needs to refresh the data incrementally
+    state: Dict
+    # the data with its indexes, shared by the engines, see `get_table`
+    table: Optional[ExtDataTable] = None
+
+
+@dataclass
+class ExtDataCache:
+    """
+    A process-wide cache of the external data frames, keyed by the normalized
+    configuration of their source.
+
+    An entry expires after the `cache_ttl` of its source (`default_ttl` seconds when
+    the source does not define one, a TTL of 0 disables the cache for the source),
+    then it is refreshed, in the background by default.
+    When the frames held exceed `max_bytes`, the least recently used ones are
+    evicted. The cached frames are shared, they must not be modified.
+
+    Example usage:
+        cache = ExtDataCache(max_bytes=256 * 1024**2)
+        ext_data = cache.get(get_ext_source({"source": "excel", "file_name": "a.xlsx"}))
+        cache.stats()  # CacheStats(hits=0, misses=1, ...)
+    """
+
+    max_bytes: int = 512 * 1024**2
+    default_ttl: float = 300.0
+    # serve the expired data while it is refreshed in a background thread
+    background_refresh: bool = True
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    # key -> entry, least recently used first
+    _entries: "OrderedDict[str, _Entry]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _stats: CacheStats = field(default_factory=CacheStats, init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+    # one lock per key being loaded, concurrent misses of a key load it once
+    _loading: Dict[str, threading.Lock] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # the keys being refreshed in the background
+    _refreshing: Set[str] = field(default_factory=set, init=False, repr=False)
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if self.clock() < entry.expires_at:
+                self._stats.hits += 1
+            return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._stats.size_bytes -= entry.size
+        self._stats.entries -= 1
+
+    def _store(self, key: str, ext_data: pd.DataFrame, state: Dict, ttl: float):
+        size = int(ext_data.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            logger.info(f"External data of {size} bytes exceeds the cache budget")
+            return
+        with self._lock:
+            table = None
+            if key in self._entries:
+                if self._entries[key].ext_data is ext_data:
+                    # refreshed without change, the indexes stay valid
+                    table = self._entries[key].table
+                self._remove(key)
+            self._entries[key] = _Entry(
+                ext_data, size, self.clock() + ttl, state, table
+            )
+            self._stats.size_bytes += size
+            self._stats.entries += 1
+            while self._stats.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def _refresh(self, key: str, ext_source: ExternalSource, entry: _Entry, ttl: float):
+        logger.info(f"Refreshing {ext_source.source} external data")
+        try:
+            ext_data, state = ext_source.refresh(entry.ext_data, entry.state)
+        except Exception as e:
+            # the previous data is served until the next attempt
+            logger.error(f"Cannot refresh {ext_source.source} external data: {e}")
+            with self._lock:
+                entry.expires_at = self.clock() + ttl
+            raise
+        self._store(key, ext_data, state, ttl)
+        with self._lock:
+            self._stats.refreshes += 1
+        return ext_data
+
+    def _refresh_in_background(
+        self, key: str, ext_source: ExternalSource, entry: _Entry, ttl: float
+    ):
+        try:
+            self._refresh(key, ext_source, entry, ttl)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(
+        self,
+        ext_source: ExternalSource,
+        load: Optional[Callable[[], pd.DataFrame]] = None,
+    ) -> pd.DataFrame:
+        """
+        Return the data of the source, loading it with `load` (the `load` of the
+        source by default) when it is not cached.
+
+        Expired data is brought up to date with the `refresh` of the source, which
+        only fetches what changed when the source supports it. With
+        `background_refresh`, the expired data is returned at once and refreshed in
+        a background thread.
+        """
+        ttl = ext_source.cache_ttl
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0:
+            return load() if load else ext_source.get_data()
+        key = ext_source.cache_key()
+        entry = self._lookup(key)
+        if entry is None:
+            return self._load(key, ext_source, load, ttl)
+        if self.clock() < entry.expires_at:
+            return entry.ext_data
+        with self._lock:
+            self._stats.expirations += 1
+            refreshing = key in self._refreshing
+            if self.background_refresh and not refreshing:
+                self._refreshing.add(key)
+        if self.background_refresh:
+            if not refreshing:
+                threading.Thread(
+                    target=self._refresh_in_background,
+                    args=(key, ext_source, entry, ttl),
+                    name="bre-ext-data-refresh",
+                    daemon=True,
+                ).start()
+            return entry.ext_data
+        return self._refresh(key, ext_source, entry, ttl)
+
+    def get_table(
+        self,
+        ext_source: ExternalSource,
+        load: Optional[Callable[[], pd.DataFrame]] = None,
+    ) -> ExtDataTable:
+        """
+        Return the data of the source as an `ExtDataTable`, see `get`. The table is
+        cached with the data, so that its indexes are built once per version of the
+        data and shared by all the engines.
+        """
+        ext_data = self.get(ext_source, load)
+        key = ext_source.cache_key()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.ext_data is not ext_data:
+                # not cached, e.g. with a TTL of 0 or over the budget
+                return ExtDataTable(ext_data)
+            if entry.table is None:
+                entry.table = ExtDataTable(ext_data)
+            return entry.table
+
+    def _load(
+        self,
+        key: str,
+        ext_source: ExternalSource,
+        load: Optional[Callable[[], pd.DataFrame]],
+        ttl: float,
+    ) -> pd.DataFrame:
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            # another thread may have loaded it while this one was waiting
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry.ext_data
+            with self._lock:
+                self._stats.misses += 1
+            logger.info(f"Loading {ext_source.source} external data")
+            if load is not None:
+                ext_data, state = load(), {}
+            else:
+                ext_data, state = ext_source.load()
+            self._store(key, ext_data, state, ttl)
+        with self._lock:
+            self._loading.pop(key, None)
+        return ext_data
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats = CacheStats()
+
+
+# shared by all the engines and rule sets of the process
+ext_data_cache = ExtDataCache()
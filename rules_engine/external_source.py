@@ -1,35 +1,106 @@
 import io
+import json
+import logging
 import os
-from typing import Literal, Self
+import shutil
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Literal, Optional, Self, Tuple
 
+import numpy as np
 import pandas as pd
-import requests
-from pydantic import BaseModel, model_validator, field_validator
+from pydantic import BaseModel, Field, model_validator, field_validator
+
+from .utils import airtable_utils, disk_cache
+
+logger = logging.getLogger("bre.external_source")
+logger.setLevel("DEBUG")
 
 
 class ExternalSourceException(Exception):
     pass
 
 
-def remove_trailing_spaces(df: pd.DataFrame) -> pd.DataFrame:
+def remove_trailing_spaces(
+    df: pd.DataFrame, categorical_threshold: Optional[float] = None
+) -> pd.DataFrame:
     """
     Removes trailing spaces from all string cells in the given DataFrame.
 
+    Only the object columns are stripped, each distinct string once; the other cells
+    are left as they are.
+
     Args:
     df (pd.DataFrame): The input DataFrame.
+    categorical_threshold (float, optional): The string columns whose ratio of
+        distinct values to rows is at most the threshold are converted to categoricals.
 
     Returns:
     pd.DataFrame: The DataFrame with trailing spaces removed.
     """
-    return df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    df = df.copy(deep=False)
+    for idx in range(df.shape[1]):
+        values = df.iloc[:, idx]
+        if not pd.api.types.is_object_dtype(values):
+            continue
+        inferred_type = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred_type not in ("string", "mixed", "mixed-integer"):
+            continue
+        # each distinct value is stripped once, the missing values (code -1) and the
+        # cells that are not strings are kept as they are
+        try:
+            codes, uniques = pd.factorize(values)
+        except TypeError:
+            # unhashable cells, e.g. lists
+            df.isetitem(
+                idx, values.map(lambda x: x.strip() if isinstance(x, str) else x)
+            )
+            continue
+        if inferred_type == "string":
+            uniques = [x.strip() for x in uniques]
+        else:
+            uniques = [x.strip() if isinstance(x, str) else x for x in uniques]
+        uniques = np.array(uniques + [None], dtype=object)
+        stripped = uniques[codes]
+        missing = codes < 0
+        if missing.any():
+            stripped[missing] = values.to_numpy()[missing]
+        stripped = pd.Series(stripped, index=values.index, name=values.name)
+        if (
+            categorical_threshold is not None
+            and inferred_type == "string"
+            and len(set(uniques[:-1])) <= categorical_threshold * len(stripped)
+        ):
+            stripped = stripped.astype("category")
+        df.isetitem(idx, stripped)
+    return df
+
+
+def _usecols(columns: Optional[List[str]]) -> Optional[Callable[[str], bool]]:
+    # a callable ignores the columns missing from the file instead of failing
+    if columns is None:
+        return None
+    return lambda column: column in columns
 
 
 class ExternalSource(BaseModel):
     data: pd.DataFrame = pd.DataFrame()
+    # the columns to read, all of them when None
+    columns: Optional[List[str]] = None
+    # see `remove_trailing_spaces`
+    categorical_threshold: Optional[float] = None
+    # seconds the loaded data is kept in the process-wide cache, 0 disables it
+    cache_ttl: Optional[float] = None
 
     class Config:
         arbitrary_types_allowed = True
 
+    def cache_key(cls) -> str:
+        """The normalized configuration of the source, identifying its data."""
+        config = cls.model_dump(exclude={"data", "cache_ttl", "disk_cache_dir"})
+        if config.get("source") in ("excel", "csv"):
+            config["file_name"] = os.path.abspath(config["file_name"])
+        return json.dumps(config, sort_keys=True, default=str)
+
     def get_bytes(cls):
         """Get the excel binary of the dataframe hosting the data
 
@@ -48,53 +119,106 @@ class ExternalSource(BaseModel):
     def get_data(cls):
         pass
 
+    def load(cls) -> Tuple[pd.DataFrame, Dict]:
+        """Load the data, with the state an incremental `refresh` starts from."""
+        return cls.get_data(), {}
+
+    def refresh(cls, data: pd.DataFrame, state: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """Bring data returned by `load` (or `refresh`) up to date. The sources which
+        cannot tell what has changed load everything again."""
+        return cls.load()
+
 
 class AirTableExternalSource(ExternalSource):
     source: Literal["airtable"]
     airtable_token: str
     base_id: str
     table: str
+    # only the records whose field is one of the values are fetched
+    filters: Dict[str, Any] = Field(default_factory=dict)
+    # a formula combined with the filters, see AirTable's `filterByFormula`
+    filter_by_formula: Optional[str] = None
+    # seconds after which a refresh loads all the records again
+    full_refresh_after: float = 3600.0
+    api_url: str = airtable_utils.AIRTABLE_API_URL
+
+    def formula(cls) -> Optional[str]:
+        formulas = [
+            formula
+            for formula in (
+                airtable_utils.equality_formula(cls.filters),
+                cls.filter_by_formula,
+            )
+            if formula
+        ]
+        if len(formulas) > 1:
+            return f"AND({','.join(formulas)})"
+        return formulas[0] if formulas else None
 
-    def get_data(cls) -> pd.DataFrame:
+    def _fetch(cls, formula: Optional[str]) -> pd.DataFrame:
         data = []
-        still_data = True
-        offset = 0
-        while still_data:
-            url = f"https://api.airtable.com/v0/{cls.base_id}/{cls.table}"
-            url_schema = f"https://api.airtable.com/v0/meta/bases/{cls.base_id}/tables"
-            header = {"Authorization": f"Bearer {cls.airtable_token}"}
-            res = requests.get(url, headers=header, data={}, params={"offset": offset})
-            if res.status_code == 200:
-                table = res.json()["records"]
-                for x in table:
-                    x.update(x.get("fields"))
-                    x.pop("fields")
-                    data.append(x)
-                if res.json().get("offset", ""):
-                    offset = res.json()["offset"]
-                else:
-                    still_data = False
-            else:
-                raise ExternalSourceException(res.text)
+        try:
+            for x in airtable_utils.iter_records(
+                cls.base_id,
+                cls.table,
+                cls.airtable_token,
+                cls.columns,
+                formula,
+                cls.api_url,
+            ):
+                x.update(x.get("fields"))
+                x.pop("fields")
+                data.append(x)
+        except airtable_utils.AirTableError as e:
+            raise ExternalSourceException(e.text)
         df = pd.DataFrame(data)
-        # get schema of the table
-        url_schema = url_schema.format(base_id=cls.base_id)
-        res = requests.get(url_schema, headers=header, data={})
         # get the name of the column of type date
-        date_columns = []
-        if res.status_code == 200:
-            tables_schema = res.json()["tables"]
-            for table in tables_schema:
-                if table["name"] == cls.table:
-                    for field in table["fields"]:
-                        if field["type"] == "date":
-                            date_columns.append(field["name"])
-                    break
+        date_columns = airtable_utils.get_date_fields(
+            cls.base_id, cls.table, cls.airtable_token, cls.api_url
+        )
         for date_column in date_columns:
+            if date_column not in df:
+                continue
             df[date_column] = pd.to_datetime(df[date_column], format="%Y-%m-%d")
+        return remove_trailing_spaces(df, cls.categorical_threshold)
 
-        cls.data = df
-        return remove_trailing_spaces(cls.data)
+    def get_data(cls) -> pd.DataFrame:
+        cls.data = cls._fetch(cls.formula())
+        return cls.data
+
+    def load(cls) -> Tuple[pd.DataFrame, Dict]:
+        now = datetime.now(timezone.utc)
+        return cls.get_data(), {"loaded_at": now, "synced_at": now}
+
+    def refresh(cls, data: pd.DataFrame, state: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """
+        Fetch the records modified since the previous sync and merge them into the
+        data. The deleted records, or the records which no longer match the filters,
+        are only dropped by a full load, done every `full_refresh_after` seconds.
+        """
+        now = datetime.now(timezone.utc)
+        if (
+            "synced_at" not in state
+            or "id" not in data
+            or (now - state["loaded_at"]).total_seconds() >= cls.full_refresh_after
+        ):
+            return cls.load()
+        # a margin for the clock skew with AirTable's servers
+        since = state["synced_at"] - timedelta(seconds=60)
+        modified = (
+            "IS_AFTER(LAST_MODIFIED_TIME(),"
+            f"'{since.strftime('%Y-%m-%dT%H:%M:%S.000Z')}')"
+        )
+        formula = cls.formula()
+        changes = cls._fetch(f"AND({formula},{modified})" if formula else modified)
+        logger.info(f"{len(changes)} records of {cls.table} modified since last sync")
+        state = {**state, "synced_at": now}
+        if changes.empty:
+            return data, state
+        cls.data = pd.concat(
+            [data[~data["id"].isin(changes["id"])], changes], ignore_index=True
+        )
+        return cls.data, state
 
 
 class GDriveExternalSource(ExternalSource):
@@ -111,24 +235,42 @@ class GDriveExternalSource(ExternalSource):
         return value
 
     def get_data(cls) -> pd.DataFrame:
-        from utils import gdrive_utils
+        from .utils import gdrive_utils
 
         file = gdrive_utils.search_file(cls.file_name, cls.mimetype)
-        if file is not None:
-            file_b = gdrive_utils.download_file(file)
-            if cls.file_name.endswith(".csv"):
-                cls.data = pd.read_csv(file_b)
-            else:
-                cls.data = pd.read_excel(file_b)
-            return remove_trailing_spaces(cls.data)
-        else:
+        if file is None:
             raise ExternalSourceException("The external source cannot be found")
+        try:
+            reader = gdrive_utils.open_file(file)
+        except gdrive_utils.HttpError:
+            # the file may have been replaced since it was searched
+            gdrive_utils.forget_file(cls.file_name, cls.mimetype)
+            file = gdrive_utils.search_file(cls.file_name, cls.mimetype)
+            if file is None:
+                raise ExternalSourceException("The external source cannot be found")
+            reader = gdrive_utils.open_file(file)
+        with reader:
+            exported = (file.get("mimeType") or cls.mimetype) == (
+                gdrive_utils.SPREADSHEET_MIMETYPE
+            )
+            if cls.file_name.endswith(".csv") and not exported:
+                # the file is parsed while it is downloaded
+                cls.data = pd.read_csv(reader, usecols=_usecols(cls.columns))
+            else:
+                # the workbook is a zip archive, which is read with seeks
+                workbook = io.BytesIO()
+                shutil.copyfileobj(reader, workbook)
+                workbook.seek(0)
+                cls.data = pd.read_excel(workbook, usecols=_usecols(cls.columns))
+        return remove_trailing_spaces(cls.data, cls.categorical_threshold)
 
 
 class S3ExternalSource(ExternalSource):
     source: Literal["s3"]
     bucket: str
     file_name: str
+    # read the CSV files with ranged GETs of this many bytes, see `S3RangeReader`
+    range_size: Optional[int] = None
 
     @field_validator("file_name", mode="before")
     def check_extension(cls, value: str):
@@ -148,25 +290,51 @@ class S3ExternalSource(ExternalSource):
             )
         return self
 
-    def get_data(cls) -> pd.DataFrame:
-        from utils import s3_utils
-
-        file_b = s3_utils.get_file_from_s3(cls.bucket, cls.file_name)
-        if file_b is not None:
-            if cls.file_name.endswith(".csv"):
-                cls.data = pd.read_csv(
-                    io.BytesIO(file_b),
-                )
-            else:
-                cls.data = pd.read_excel(io.BytesIO(file_b))
-            return remove_trailing_spaces(cls.data)
+    def _parse(cls, file: io.RawIOBase) -> pd.DataFrame:
+        if cls.file_name.endswith(".csv"):
+            # the body is parsed while it is downloaded
+            cls.data = pd.read_csv(file, usecols=_usecols(cls.columns))
         else:
-            raise ExternalSourceException("The external source cannot be found")
+            # the workbook is a zip archive, which is read with seeks
+            workbook = io.BytesIO()
+            shutil.copyfileobj(file, workbook)
+            workbook.seek(0)
+            cls.data = pd.read_excel(workbook, usecols=_usecols(cls.columns))
+        return remove_trailing_spaces(cls.data, cls.categorical_threshold)
+
+    def get_data(cls) -> pd.DataFrame:
+        return cls.load()[0]
+
+    def load(cls) -> Tuple[pd.DataFrame, Dict]:
+        return cls.refresh(None, {})
+
+    def refresh(cls, data: pd.DataFrame, state: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """Download and parse the file again only when its ETag has changed."""
+        from .utils import s3_utils
+
+        file, etag = s3_utils.open_file_from_s3_if_changed(
+            cls.bucket,
+            cls.file_name,
+            state.get("etag"),
+            cls.range_size if cls.file_name.endswith(".csv") else None,
+        )
+        if etag is None:
+            # the cause is logged by `open_file_from_s3_if_changed`
+            raise ExternalSourceException(
+                f"s3://{cls.bucket}/{cls.file_name} cannot be retrieved"
+            )
+        if file is None:
+            logger.info(f"{cls.file_name} has not changed")
+            return data, state
+        with file:
+            return cls._parse(file), {"etag": etag}
 
 
 class ExcelExternalSource(ExternalSource):
     source: Literal["excel"]
     file_name: str
+    # where the parsed file is cached, see `disk_cache.default_cache_dir`
+    disk_cache_dir: Optional[str] = None
 
     @field_validator("file_name")
     def check_extension(cls, value: str):
@@ -178,8 +346,16 @@ class ExcelExternalSource(ExternalSource):
 
     def get_data(cls) -> pd.DataFrame:
         if os.path.exists(cls.file_name):
-            cls.data = pd.read_excel(cls.file_name)
-            return remove_trailing_spaces(cls.data)
+            cls.data = disk_cache.read_through(
+                cls.file_name,
+                [cls.columns, cls.categorical_threshold],
+                lambda: remove_trailing_spaces(
+                    pd.read_excel(cls.file_name, usecols=_usecols(cls.columns)),
+                    cls.categorical_threshold,
+                ),
+                cls.disk_cache_dir,
+            )
+            return cls.data
         else:
             raise FileExistsError(cls.file_name)
 
@@ -187,6 +363,8 @@ class ExcelExternalSource(ExternalSource):
 class CsvExternalSource(ExternalSource):
     source: Literal["csv"]
     file_name: str
+    # where the parsed file is cached, see `disk_cache.default_cache_dir`
+    disk_cache_dir: Optional[str] = None
 
     @field_validator("file_name")
     def check_extension(cls, value: str):
@@ -198,7 +376,15 @@ class CsvExternalSource(ExternalSource):
 
     def get_data(cls) -> pd.DataFrame:
         if os.path.exists(cls.file_name):
-            cls.data = pd.read_csv(cls.file_name)
-            return remove_trailing_spaces(cls.data)
+            cls.data = disk_cache.read_through(
+                cls.file_name,
+                [cls.columns, cls.categorical_threshold],
+                lambda: remove_trailing_spaces(
+                    pd.read_csv(cls.file_name, usecols=_usecols(cls.columns)),
+                    cls.categorical_threshold,
+                ),
+                cls.disk_cache_dir,
+            )
+            return cls.data
         else:
             raise FileExistsError(cls.file_name)
@@ -1,136 +1,193 @@
+import functools
+import logging
+import operator
 import re
-import datetime  # noqa: F401 required for the eval
+import copy
 
+import pandas as pd
 
-from typing import Any, Dict, List, Literal, Optional, Self, Union
 
-from pydantic import BaseModel, Field, model_validator
+from typing import Any, Dict, List, Literal, Optional, Self, Tuple, Union
 
-from ..exceptions import ParsingRuleException
-from ..utils.transformation import parse_transformation_method, TransformationMethod
-from ..utils.comparison import parse_comparison_method, ComparisonMethod
-
-
-def transform_variable_for_dict(variable: str) -> str:
-    match = re.fullmatch(r"(?P<name>\w+)(?:\[(?P<index>\d+)\])?", variable)
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 
-    if not match:
-        raise ValueError(f"Invalid input format: {variable}")
-
-    var_name = match.group("name")
-    index = match.group("index")
+from ..exceptions import ParsingRuleException
+from ..utils.accessors import REFERENCE_PATTERN, VARIABLE_PATTERN, get_variable_path
+from ..utils.expressions import CLOCK_FUNCTIONS, Expression, datetime_calls
+from ..utils.literals import UnsupportedLiteral, parse_literal
+from ..utils.transformation import get_transformation_method
+from ..utils.comparison import (
+    MembershipList,
+    convert_to_datetime,
+    get_comparison_method,
+)
 
-    return f"['{var_name}']{f'[{index}]' if index else ''}"
+logger = logging.getLogger("bre.models")
+logger.setLevel("DEBUG")
 
 
 def evaluate_variable(variable: Any):
-    eval_var = variable
-    # ensure the value is not numeric
-    if isinstance(eval_var, str) and eval_var.isnumeric():
-        return eval_var
-    try:
-        eval_var = eval(f"{variable}")
-    except NameError:
-        pass
-    except SyntaxError:
-        pass
-    return eval_var
-
-
-def _evaluate_value(
-    engine,
-    v: str,
-    to_filter: bool = False,
-    filter_value: Union[Any, None] = None,
-    method: Union[str, None] = None,
-):
-    var_split = v.split(".")
-    ext_var_name = var_split[0]
-    if engine._is_ext_data_variable(ext_var_name):
-        ext_var_col = var_split[1]
-        if method in ("equal_to", "within") and to_filter:
-            filter = (
-                engine.ext_data_variables[ext_var_name][ext_var_col] == filter_value
-            )
-            engine.ext_data_variables[ext_var_name] = engine.ext_data_variables[
-                ext_var_name
-            ][filter]
-            eval_string = (
-                v.replace(ext_var_name, f"engine.ext_data_variables['{ext_var_name}']")
-                + ".tolist()"
-            )
-        elif method in ("not_equal_to", "not_in") and to_filter:
-            filter = (
-                engine.ext_data_variables[ext_var_name][ext_var_col] == filter_value
-            )
-            engine.ext_data_variables[ext_var_name] = engine.ext_data_variables[
-                ext_var_name
-            ][filter]
-            eval_string = (
-                v.replace(ext_var_name, f"engine.ext_data_variables['{ext_var_name}']")
-                + ".tolist()"
-            )
-        else:
-            # the ext_data variable has been already filtered and we need to fetch the value
-            if not engine.ext_data_variables[ext_var_name].empty:
-                eval_string = (
-                    v.replace(
-                        ext_var_name, f"engine.ext_data_variables['{ext_var_name}']"
-                    )
-                    + ".values[0]"
-                )
-            else:
-                eval_string = "None"
-    else:
-        if isinstance(engine.process_variables, dict):
-            # split variables by dot
-            v_: str = ""
-            for vv in v.split("."):
-                if vv.isnumeric():
-                    v_ += f"[{vv}]"
-                else:
-                    v_ += transform_variable_for_dict(vv)
-
-            # v = "".join([f"['{vv}']" for vv in v.split(".")])
-            eval_string = f"engine.process_variables{v_}"
-        else:
-            v_: List[str] = []
-            for vv in v.split("."):
-                if vv.isnumeric():
-                    v_.append(f"[{vv}]")
-                else:
-                    v_.append(vv)
-            eval_string = f"engine.process_variables.{'.'.join(v_)}"
-    return eval_string
+    # the numeric strings and the strings which are not literals are kept as they
+    # are, see `parse_literal`
+    return parse_literal(variable)
 
 
-def _clean_variable_with_eval(
+def _resolve_ext_data(
     engine,
-    v: Any,
+    ext_var_name: str,
+    ext_var_col: Optional[str],
     to_filter: bool = False,
     filter_value: Union[Any, None] = None,
     method: Union[str, None] = None,
 ):
-    if isinstance(v, str):
-        final_eval_string = v
-        while True:
-            pattern = r"^\$\{(?P<variable>(\w+(?:\.\w+|\[\d+\])*)*)\}$"  # r"\$\{(?P<variable>(\w*\.?\w*)*)\}"
-            matches = re.search(pattern, final_eval_string)
-            if not matches:
-                pattern = r"\$\{(?P<variable>(\w*\.?\w*)*)\}"
-                matches = re.search(pattern, final_eval_string)
-                if not matches:
-                    break
-            v_eval_str = _evaluate_value(
-                engine, matches["variable"], to_filter, filter_value, method
+    # the tables are shared, the filters of the evaluation are kept as the
+    # positions of the rows selected so far
+    table = engine.ext_data_tables[ext_var_name]
+    selection = engine.ext_data_selections.get(ext_var_name)
+    if method in ("equal_to", "within", "not_equal_to", "not_in") and to_filter:
+        selection = table.select(ext_var_col, filter_value, selection)
+        engine.ext_data_selections[ext_var_name] = selection
+        return table.column(ext_var_col, selection).tolist()
+    # the ext_data variable has been already filtered and we need to fetch the value
+    return table.first(ext_var_col, selection)
+
+
+class VariableReference:
+    """A `${...}` reference compiled into an accessor path."""
+
+    __slots__ = ("variable", "path", "ext_var_name", "ext_var_col")
+
+    def __init__(self, variable: str):
+        self.variable = variable
+        self.path = get_variable_path(variable)
+        var_split = variable.split(".")
+        self.ext_var_name = var_split[0]
+        self.ext_var_col = var_split[1] if len(var_split) > 1 else None
+
+    def resolve(
+        self,
+        engine,
+        to_filter: bool = False,
+        filter_value: Union[Any, None] = None,
+        method: Union[str, None] = None,
+    ):
+        if engine._is_ext_data_variable(self.ext_var_name):
+            return _resolve_ext_data(
+                engine,
+                self.ext_var_name,
+                self.ext_var_col,
+                to_filter,
+                filter_value,
+                method,
             )
-            final_eval_string = final_eval_string.replace(matches.group(), v_eval_str)
-        if final_eval_string == v:
-            # no modification done return v
-            return evaluate_variable(final_eval_string)
-        else:
-            return eval(final_eval_string)
-    return v
+        return self.path.get(engine.process_variables)
+
+
+class RuleValue:
+    """
+    A value of a rule compiled once at parse time. It is either a literal, a single
+    variable reference (`${a.b}`) or an expression embedding variable references
+    (`max(${a}, ${b})`), in which case each reference is bound to a local name of the
+    expression, which is compiled once (see `Expression`).
+    """
+
+    __slots__ = ("raw", "reference", "references", "expression", "value", "mutable")
+
+    def __init__(self, raw: Any):
+        self.raw = raw
+        self.reference: Optional[VariableReference] = None
+        self.references: List[VariableReference] = []
+        self.expression: Optional[Expression] = None
+        # the literal is parsed once, here
+        self.value = raw
+        self.mutable = False
+        if not isinstance(raw, str):
+            return
+        matches = VARIABLE_PATTERN.match(raw)
+        if matches:
+            self.reference = VariableReference(matches["variable"])
+            return
+        names: Dict[str, str] = {}
+
+        def _bind(match: re.Match) -> str:
+            variable = match["variable"]
+            if variable not in names:
+                names[variable] = f"_ref_{len(names)}"
+                self.references.append(VariableReference(variable))
+            return names[variable]
+
+        source = REFERENCE_PATTERN.sub(_bind, raw)
+        if self.references:
+            try:
+                self.expression = Expression(source, names.values())
+            except UnsupportedLiteral as e:
+                raise ParsingRuleException(f"Cannot compile [{raw}]: {e}")
+            return
+        self.value = evaluate_variable(raw)
+        if self.value is raw and datetime_calls(raw):
+            # not a literal, e.g. `datetime.datetime.now()`, which is evaluated at
+            # each evaluation. A datetime call is never kept as a string.
+            try:
+                self.expression = Expression(raw, ())
+                if not any(name in CLOCK_FUNCTIONS for name in datetime_calls(raw)):
+                    # e.g. an invalid date, the error of the literal
+                    self.expression.evaluate({})
+            except (UnsupportedLiteral, TypeError, ValueError, ArithmeticError) as e:
+                raise ParsingRuleException(f"Cannot compile [{raw}]: {e}")
+            self.value = None
+            return
+        self.mutable = isinstance(self.value, (list, dict, set))
+
+    @property
+    def is_literal(self) -> bool:
+        return self.reference is None and self.expression is None
+
+    @property
+    def variable_references(self) -> List[VariableReference]:
+        if self.reference is not None:
+            return [self.reference]
+        return self.references
+
+    def is_column(self, ext_data_variables_name: List[str]) -> bool:
+        """Whether the value is a top level variable, i.e. a column of a frame of
+        records."""
+        return (
+            self.reference is not None
+            and len(self.reference.path.steps) == 1
+            and isinstance(self.reference.path.steps[0], str)
+            and self.reference.ext_var_name not in ext_data_variables_name
+        )
+
+    def literal(self) -> Any:
+        if self.mutable:
+            # a transformation may modify the value it has set
+            return copy.deepcopy(self.value)
+        return self.value
+
+    def resolve_frame(self, frame: pd.DataFrame) -> Any:
+        """Resolve a literal or a column value against a frame of records."""
+        if self.reference is not None:
+            return frame[self.reference.variable]
+        return self.literal()
+
+    def resolve(
+        self,
+        engine,
+        to_filter: bool = False,
+        filter_value: Union[Any, None] = None,
+        method: Union[str, None] = None,
+    ):
+        if self.reference is not None:
+            return self.reference.resolve(engine, to_filter, filter_value, method)
+        if self.expression is not None:
+            namespace = {
+                f"_ref_{idx}": reference.resolve(
+                    engine, to_filter, filter_value, method
+                )
+                for idx, reference in enumerate(self.references)
+            }
+            return self.expression.evaluate(namespace)
+        return self.literal()
 
 
 class RulesDefinition(BaseModel):
@@ -141,6 +198,9 @@ class RulesDefinition(BaseModel):
     no_group_rules: List = Field(default_factory=list)
     rules_in_group: List = Field(default_factory=list)
     parsed_rules: Dict = Field(default_factory=dict)
+    # group name -> position of its first rule -> `DecisionTable`, built when the
+    # rules are parsed
+    decision_tables: Dict = Field(default_factory=dict)
 
     @model_validator(mode="after")
     def validate_rules_definition(self: Self) -> Self:
@@ -163,11 +223,225 @@ class RulesDefinition(BaseModel):
         return self
 
 
+def _membership_list(value: Any) -> Any:
+    # the lists of comparison variables are searched through a hash set
+    if value.__class__ is list:
+        return MembershipList(value)
+    return value
+
+
+class _Constant:
+    """A literal evaluated at parse time, which may be None."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class CompiledComparison:
+    """
+    The hot path of a `Comparison`: the comparison method class and the rule values
+    are bound once at parse time and the evaluation is a plain function call.
+    """
+
+    __slots__ = (
+        "comparison_method",
+        "method",
+        "compare",
+        "variable",
+        "comparison_variables",
+        "constants",
+        "constant",
+    )
+
+    def __init__(
+        self, comparison_method: str, variable: Any, comparison_variables: Any
+    ):
+        self.comparison_method = comparison_method
+        self.method = get_comparison_method(comparison_method)
+        self.compare = self.method.compare
+        self.variable = RuleValue(variable)
+        if isinstance(comparison_variables, list):
+            self.comparison_variables = [
+                RuleValue(comparison_variable)
+                for comparison_variable in comparison_variables
+            ]
+        else:
+            self.comparison_variables = RuleValue(comparison_variables)
+        # the literal comparison variables are evaluated once, here, the others
+        # (None) when the comparison is evaluated. The constants are shared by all
+        # the evaluations, the comparison methods do not modify them.
+        self.constants: Optional[List[Optional[_Constant]]] = None
+        # the comparison variables, when they are all literals, in the form prepared
+        # by the comparison method (e.g. a compiled regex)
+        self.constant: Optional[_Constant] = None
+        if isinstance(self.comparison_variables, list):
+            self.constants = [
+                (
+                    _Constant(evaluate_variable(comparison_variable.literal()))
+                    if comparison_variable.is_literal
+                    else None
+                )
+                for comparison_variable in self.comparison_variables
+            ]
+            if all(constant is not None for constant in self.constants):
+                self.constant = _Constant(
+                    self.method.prepare(
+                        MembershipList(constant.value for constant in self.constants)
+                    )
+                )
+        elif self.comparison_variables.is_literal:
+            self.constant = _Constant(
+                self.method.prepare(
+                    _membership_list(
+                        evaluate_variable(self.comparison_variables.literal())
+                    )
+                )
+            )
+
+    def literal_comparison_variables(self) -> Any:
+        return self.constant.value
+
+    def reads_ext_data(self, ext_data_variables_name: List[str]) -> bool:
+        comparison_variables = self.comparison_variables
+        if not isinstance(comparison_variables, list):
+            comparison_variables = [comparison_variables]
+        return any(
+            reference.ext_var_name in ext_data_variables_name
+            for value in [self.variable, *comparison_variables]
+            for reference in value.variable_references
+        )
+
+    def dispatch_keys(self) -> Optional[Tuple[bool, List[Any]]]:
+        """
+        The values of the variable satisfying an `equal_to` or `within` comparison
+        with literals, for a `DecisionTable`: whether the strings are compared
+        stripped (`equal_to` a string) and the hashable values. None for the other
+        comparisons.
+        """
+        if self.constant is None or self.variable.reference is None:
+            return None
+        value = self.constant.value
+        if isinstance(value, list):
+            if self.comparison_method not in ("equal_to", "within"):
+                return None
+            keys = list(value)
+        elif self.comparison_method == "equal_to":
+            keys = [value]
+        else:
+            # e.g. `within` a string is a substring search
+            return None
+        try:
+            for key in keys:
+                hash(key)
+        except TypeError:
+            return None
+        return self.comparison_method == "equal_to" and isinstance(value, str), keys
+
+    def evaluate_comparison_variables(self, engine, variable: Any) -> Any:
+        if self.constant is not None:
+            return self.constant.value
+        if isinstance(self.comparison_variables, list):
+            eval_comp_vars = MembershipList()
+            for comparison_variable, constant in zip(
+                self.comparison_variables, self.constants
+            ):
+                if constant is not None:
+                    eval_comp_vars.append(constant.value)
+                    continue
+                comparison_variable = comparison_variable.resolve(
+                    engine,
+                    True,
+                    variable,
+                    self.comparison_method,
+                )
+                eval_comp_var = evaluate_variable(comparison_variable)
+                eval_comp_vars.append(eval_comp_var)
+            return self.method.coerce(eval_comp_vars)
+        comparison_variables = self.comparison_variables.resolve(
+            engine,
+            True,
+            variable,
+            self.comparison_method,
+        )
+        return self.method.coerce(
+            _membership_list(evaluate_variable(comparison_variables))
+        )
+
+    def evaluate(self, engine) -> bool:
+        variable = self.variable.resolve(engine)
+        # evaluate for each of the comparison variable
+        comparison_variables = self.evaluate_comparison_variables(engine, variable)
+        return self.compare(
+            convert_to_datetime(variable), convert_to_datetime(comparison_variables)
+        )
+
+    def is_vectorized(self, ext_data_variables_name: List[str]) -> bool:
+        comparison_variables = self.comparison_variables
+        if not isinstance(comparison_variables, list):
+            comparison_variables = [comparison_variables]
+        return self.variable.is_column(ext_data_variables_name) and all(
+            comparison_variable.is_literal
+            for comparison_variable in comparison_variables
+        )
+
+    def evaluate_frame(self, frame: pd.DataFrame) -> pd.Series:
+        comparison_variables = self.literal_comparison_variables()
+        logger.info(
+            f"Checking {self.comparison_method} {comparison_variables} on {self.variable.raw}"
+        )
+        return self.method.compare_series(
+            self.variable.resolve_frame(frame), comparison_variables
+        ).astype(bool)
+
+
+class CompiledTransformation:
+    """The hot path of a `Transformation`, see `CompiledComparison`."""
+
+    __slots__ = ("method", "transform", "variable", "target_value")
+
+    def __init__(self, transformation_method: str, variable: Any, target_value: Any):
+        self.method = get_transformation_method(transformation_method)
+        self.transform = self.method.transform
+        self.variable = variable
+        self.target_value = RuleValue(target_value)
+
+    def apply(self, engine):
+        target_value = self.target_value.resolve(engine)
+        if isinstance(engine.process_variables, BaseModel):
+            res = self.transform(
+                engine.process_variables.dict(), self.variable, target_value
+            )
+            engine.process_variables = engine.process_variables.__class__(**res)
+        else:
+            engine.process_variables = self.transform(
+                engine.process_variables, self.variable, target_value
+            )
+
+    def is_vectorized(self, ext_data_variables_name: List[str]) -> bool:
+        return (
+            isinstance(self.variable, str)
+            and len(get_variable_path(self.variable).steps) == 1
+            and (
+                self.target_value.is_literal
+                or self.target_value.is_column(ext_data_variables_name)
+            )
+        )
+
+    def apply_frame(self, frame: pd.DataFrame, mask: pd.Series):
+        self.method.transform_frame(
+            frame, mask, self.variable, self.target_value.resolve_frame(frame)
+        )
+
+
 class Comparison(BaseModel):
     comparison_method: str
     variable: Any
     comparison_variables: Union[Any, List[Any]]
 
+    _compiled: CompiledComparison = PrivateAttr(default=None)
+
     @model_validator(mode="after")
     def val_comparison_variables(self: Self) -> Self:
         if (
@@ -177,37 +451,35 @@ class Comparison(BaseModel):
             self.comparison_variables = self.comparison_variables[0]
         return self
 
-    def evaluate_comparison_variables(self, engine):
-        if isinstance(self.comparison_variables, list):
-            eval_comp_vars: List[Any] = []
-            for comparison_variable in self.comparison_variables:
-                comparison_variable = _clean_variable_with_eval(
-                    engine,
-                    comparison_variable,
-                    True,
-                    self.variable,
-                    self.comparison_method,
-                )
-                eval_comp_var = evaluate_variable(comparison_variable)
-                eval_comp_vars.append(eval_comp_var)
-            self.comparison_variables = eval_comp_vars
-        else:
-            self.comparison_variables = _clean_variable_with_eval(
-                engine,
-                self.comparison_variables,
-                True,
-                self.variable,
-                self.comparison_method,
-            )
-            self.comparison_variables = evaluate_variable(self.comparison_variables)
+    @model_validator(mode="after")
+    def compile_comparison(self: Self) -> Self:
+        self._compiled = CompiledComparison(
+            self.comparison_method, self.variable, self.comparison_variables
+        )
+        return self
+
+    def evaluate_comparison_variables(self, engine, variable: Any) -> Any:
+        return self._compiled.evaluate_comparison_variables(engine, variable)
 
     def evaluate(self, engine) -> bool:
-        self.variable = _clean_variable_with_eval(engine, self.variable)
-        # evaluate for each of the comparison variable
-        self.evaluate_comparison_variables(engine)
-        # self.variable = evaluate_variable(self.variable)
-        method: ComparisonMethod = parse_comparison_method(self.dict())
-        return method.evaluate()
+        # the resolved values are kept local so that the parsed rule can be shared
+        return self._compiled.evaluate(engine)
+
+    def is_vectorized(self, ext_data_variables_name: List[str]) -> bool:
+        return self._compiled.is_vectorized(ext_data_variables_name)
+
+    def evaluate_frame(self, frame: pd.DataFrame) -> pd.Series:
+        return self._compiled.evaluate_frame(frame)
+
+    @property
+    def compiled_variable(self) -> RuleValue:
+        return self._compiled.variable
+
+    def reads_ext_data(self, ext_data_variables_name: List[str]) -> bool:
+        return self._compiled.reads_ext_data(ext_data_variables_name)
+
+    def dispatch_keys(self) -> Optional[Tuple[bool, List[Any]]]:
+        return self._compiled.dispatch_keys()
 
 
 class Transformation(BaseModel):
@@ -215,15 +487,23 @@ class Transformation(BaseModel):
     variable: Any
     target_value: Any
 
+    _compiled: CompiledTransformation = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def compile_transformation(self: Self) -> Self:
+        self._compiled = CompiledTransformation(
+            self.transformation_method, self.variable, self.target_value
+        )
+        return self
+
     def apply(self, engine):
-        self.target_value = _clean_variable_with_eval(engine, self.target_value)
-        # self.variable = evaluate_variable(self.variable)
-        method: TransformationMethod = parse_transformation_method(self.dict())
-        if isinstance(engine.process_variables, BaseModel):
-            res = method.apply(engine.process_variables.dict())
-            engine.process_variables = engine.process_variables.__class__(**res)
-        else:
-            engine.process_variables = method.apply(engine.process_variables)
+        self._compiled.apply(engine)
+
+    def is_vectorized(self, ext_data_variables_name: List[str]) -> bool:
+        return self._compiled.is_vectorized(ext_data_variables_name)
+
+    def apply_frame(self, frame: pd.DataFrame, mask: pd.Series):
+        self._compiled.apply_frame(frame, mask)
 
 
 class Condition(BaseModel):
@@ -261,6 +541,16 @@ class Condition(BaseModel):
             # there is only one comparison condition
             return self.comparisons[0].evaluate(engine)
 
+    def evaluate_frame(self, frame: pd.DataFrame) -> pd.Series:
+        # same as evaluate with one boolean per record of the frame
+        masks = [comparison.evaluate_frame(frame) for comparison in self.comparisons]
+        if self.logical_operator == "or":
+            return functools.reduce(operator.or_, masks)
+        elif self.logical_operator == "and":
+            return functools.reduce(operator.and_, masks)
+        else:
+            return masks[0]
+
 
 class Rule(BaseModel):
     description: Optional[str] = None
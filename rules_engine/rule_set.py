@@ -0,0 +1,379 @@
+import copy
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing.context import BaseContext
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import pandas as pd
+from pydantic import BaseModel
+
+from .models import RulesDefinition, Rule
+from .rules_engine import RulesEngine, load_external_tables, load_rules_definition
+from .shared_ext_data import SharedExtDataStore, SharedFrame
+from .utils.accessors import VARIABLE_PATTERN
+from .utils.ext_data import ExtDataFrames, ExtDataTable
+from .utils.variables_mutations import get_variables_mutations
+
+logger = logging.getLogger("bre.rule_set")
+logger.setLevel("DEBUG")
+
+# the rule set of a `process_many` worker process, set once by its initializer
+_worker_rule_set: Optional["CompiledRuleSet"] = None
+# when the worker last looked for a new generation of the shared external data
+_worker_refreshed_at: float = 0.0
+
+
+def _init_worker(rule_set: "CompiledRuleSet"):
+    global _worker_rule_set, _worker_refreshed_at
+    _worker_rule_set = rule_set
+    _worker_refreshed_at = time.monotonic()
+
+
+def _evaluate_in_worker(
+    process_variables: Union[Dict, BaseModel]
+) -> Union[Dict, BaseModel]:
+    global _worker_refreshed_at
+    if _worker_rule_set.ext_data_shared_dir and (
+        time.monotonic() - _worker_refreshed_at
+        >= _worker_rule_set.ext_data_refresh_interval
+    ):
+        _worker_rule_set.refresh_ext_data()
+        _worker_refreshed_at = time.monotonic()
+    return _worker_rule_set.evaluate(process_variables)
+
+
+def _evaluate_chunk_in_worker(
+    chunk: List[Union[Dict, BaseModel]]
+) -> List[Union[Dict, BaseModel]]:
+    return [_evaluate_in_worker(process_variables) for process_variables in chunk]
+
+
+def _collect_variables(rule_def: Any, variables: List[str]) -> List[str]:
+    # variables are the keys of the if / then / else mappings at any depth
+    if isinstance(rule_def, dict):
+        for key, value in rule_def.items():
+            if isinstance(key, str):
+                matches = VARIABLE_PATTERN.match(key)
+                if matches and matches["variable"] not in variables:
+                    variables.append(matches["variable"])
+            _collect_variables(value, variables)
+    elif isinstance(rule_def, list):
+        for value in rule_def:
+            _collect_variables(value, variables)
+    return variables
+
+
+@dataclass
+class CompiledRuleSet:
+    """
+    A rules definition parsed once and evaluated against many process variables.
+
+    The YAML (or dict) definition is validated and the external data sources
+    referenced by the rules are loaded when the rule set is created (or when a rule
+    first reads them with `ext_data_lazy`). The rules are parsed once per shape of the
+    process variables: the shape only depends on the length of the lists traversed by
+    nested variables (e.g. `${items.price}`), so flat process variables are always
+    served by the same parsed rules.
+
+    The parsed rules are not modified by the evaluation, the values resolved for one
+    input live in the `RulesEngine` created for it. A rule set can therefore be shared
+    by the threads of a pool.
+
+    Example usage:
+        rule_set = CompiledRuleSet(rules_definition_path="rules.yml")
+        for process_variables in requests:
+            result = rule_set.evaluate(process_variables)
+    """
+
+    rules_definition_path: str = field(default="")
+    rules: Dict = field(default_factory=dict)
+    rules_definition: RulesDefinition = field(
+        default_factory=lambda: RulesDefinition(rules={})
+    )
+    ext_data_variables: Mapping[str, pd.DataFrame] = field(default_factory=dict)
+    ext_data_variables_name: List[str] = field(default_factory=list)
+    ext_data_tables: Dict[str, ExtDataTable] = field(default_factory=dict)
+    nested_variables: List[str] = field(default_factory=list)
+    # loading of the external data sources, see `load_external_tables`
+    ext_data_lazy: bool = False
+    ext_data_max_workers: int = 8
+    ext_data_excel_processes: int = 0
+    ext_data_load_times: Dict[str, float] = field(default_factory=dict)
+    # directory of the tables shared by the processes of the host, see
+    # `SharedExtDataStore`, and seconds between two checks of a new generation by the
+    # `process_many` workers
+    ext_data_shared_dir: Optional[str] = None
+    ext_data_refresh_interval: float = 1.0
+    # the rules parsed for each shape of the nested variables, the least recently
+    # used shapes are dropped beyond `max_compiled_shapes`
+    compiled_rules: "OrderedDict[Tuple, Tuple[RulesDefinition, Dict[str, Rule]]]" = (
+        field(default_factory=OrderedDict)
+    )
+    max_compiled_shapes: int = 64
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.rules_definition = load_rules_definition(
+            self.rules_definition_path, self.rules
+        )
+        self.ext_data_tables = load_external_tables(
+            self.rules_definition,
+            self.ext_data_lazy,
+            self.ext_data_max_workers,
+            self.ext_data_excel_processes,
+            self.ext_data_load_times,
+            (
+                SharedExtDataStore(self.ext_data_shared_dir)
+                if self.ext_data_shared_dir
+                else None
+            ),
+        )
+        self.ext_data_variables = ExtDataFrames(self.ext_data_tables)
+        self.ext_data_variables_name = list(self.ext_data_tables.keys())
+        self.nested_variables = [
+            variable
+            for variable in _collect_variables(self.rules_definition.rules, [])
+            if "." in variable
+            and variable.split(".")[0] not in self.ext_data_variables_name
+        ]
+        if not self.nested_variables:
+            # the parsed rules do not depend on the process variables
+            self.engine({})
+
+    def __getstate__(self) -> Dict:
+        # the lock cannot be pickled, each process creates its own
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def refresh_ext_data(self) -> bool:
+        """
+        Swap the shared external data tables to their current generation, return
+        whether one of them has changed. The engines already created keep the tables
+        they started with, the next ones use the new generation.
+        """
+        tables = dict(self.ext_data_tables)
+        for name, table in self.ext_data_tables.items():
+            renewed = table.renewed()
+            if renewed is not None:
+                logger.info(f"Swapping '{name}' external data to a new generation")
+                if not self.ext_data_lazy:
+                    # attached before the swap, the engines never wait for it
+                    renewed.frame
+                tables[name] = renewed
+        if tables == self.ext_data_tables:
+            return False
+        self.ext_data_tables = tables
+        self.ext_data_variables = ExtDataFrames(tables)
+        return True
+
+    def publish_ext_data(self) -> bool:
+        """Reload the shared external data sources and publish them as a new
+        generation, then swap to it. Return whether any source is shared."""
+        published = False
+        for table in self.ext_data_tables.values():
+            if isinstance(table.load, SharedFrame):
+                table.load.publish()
+                published = True
+        return published and self.refresh_ext_data()
+
+    def _shape_key(self, process_variables: Union[Dict, BaseModel]) -> Tuple:
+        return tuple(
+            tuple(
+                get_variables_mutations(
+                    process_variables,
+                    variable.split("."),
+                    self.ext_data_variables_name,
+                )
+            )
+            for variable in self.nested_variables
+        )
+
+    def get_rules(self, engine: RulesEngine) -> Tuple[RulesDefinition, Dict[str, Rule]]:
+        """Return the rules definition and the parsed rules for the engine's
+        process variables, parsing them only for a shape not seen before (or
+        dropped from the `max_compiled_shapes` most recently used ones)."""
+        key = self._shape_key(engine.process_variables)
+        compiled = self.compiled_rules.get(key)
+        if compiled is not None:
+            if len(self.compiled_rules) > 1:
+                with self._lock:
+                    if key in self.compiled_rules:
+                        self.compiled_rules.move_to_end(key)
+        else:
+            with self._lock:
+                compiled = self.compiled_rules.get(key)
+                if compiled is None:
+                    logger.info(f"Compiling rules for shape {key}")
+                    # parsing renames the rules and pops the then / else keys
+                    engine.rules_definition = self.rules_definition.model_copy(
+                        deep=True
+                    )
+                    engine.parsed_rules = {}
+                    engine._parse_rules()
+                    compiled = (engine.rules_definition, engine.parsed_rules)
+                    self.compiled_rules[key] = compiled
+                    while len(self.compiled_rules) > max(self.max_compiled_shapes, 1):
+                        self.compiled_rules.popitem(last=False)
+        return compiled
+
+    def engine(self, process_variables: Union[Dict, BaseModel]) -> RulesEngine:
+        return RulesEngine(process_variables=process_variables, rule_set=self)
+
+    def evaluate(
+        self, process_variables: Union[Dict, BaseModel]
+    ) -> Union[Dict, BaseModel]:
+        return self.engine(process_variables).process_rules()
+
+    def process_many(
+        self,
+        records: Iterable[Union[Dict, BaseModel]],
+        workers: Optional[int] = None,
+        chunksize: int = 1,
+        mp_context: Optional[BaseContext] = None,
+    ) -> Iterator[Union[Dict, BaseModel]]:
+        """
+        Evaluate the rules for every process variables of `records` in a pool of
+        `workers` processes (one per CPU by default) and yield the processed variables
+        in the order of the input.
+
+        The rule set, with its parsed rules and the external data, is sent once to
+        each worker when it starts, only the records travel between the processes.
+        They are sent by chunks of `chunksize` records: a larger chunk size reduces
+        the communication overhead for many small records. At most two chunks per
+        worker are pending at a time, so `records` can be a large or unbounded
+        iterable: it is read as the results are consumed, and closing the generator
+        cancels the chunks which have not started.
+
+        The workers are started with the `mp_context` multiprocessing context (e.g.
+        `multiprocessing.get_context("spawn")`), the default one of the platform
+        otherwise.
+
+        Example usage:
+            for result in rule_set.process_many(records, workers=8, chunksize=64):
+                ...
+        """
+        workers = workers or os.cpu_count() or 1
+        records = iter(records)
+        pending: Deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as executor:
+            try:
+                exhausted = False
+                while True:
+                    while not exhausted and len(pending) < 2 * workers:
+                        chunk = list(itertools.islice(records, chunksize))
+                        if not chunk:
+                            exhausted = True
+                            break
+                        pending.append(
+                            executor.submit(_evaluate_chunk_in_worker, chunk)
+                        )
+                    if not pending:
+                        break
+                    # the results are yielded in the order of the records
+                    yield from pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _is_vectorized(self, parsed_rules: Dict[str, Rule]) -> bool:
+        for rule in parsed_rules.values():
+            transformations = list(rule.transformations) + list(
+                rule.else_transformations
+            )
+            if rule.if_condition:
+                transformations.extend(rule.if_condition.then)
+                if not all(
+                    comparison.is_vectorized(self.ext_data_variables_name)
+                    for comparison in rule.if_condition.comparisons
+                ):
+                    return False
+            if not all(
+                transformation.is_vectorized(self.ext_data_variables_name)
+                for transformation in transformations
+            ):
+                return False
+        return True
+
+    def evaluate_frame(self, records: pd.DataFrame) -> pd.DataFrame:
+        """
+        Evaluate the rules for every record of a DataFrame, one row per process
+        variables, and return the processed records as a new DataFrame.
+
+        When the rules only compare top level variables (the columns) with literals and
+        set them to literals or other columns, each comparison is evaluated as a boolean
+        mask over its column and the first hit policy of the groups is applied with
+        masks. Otherwise the records are evaluated one by one.
+        """
+        compiled = None if self.nested_variables else self.compiled_rules.get(())
+        if compiled is None or not self._is_vectorized(compiled[1]):
+            logger.info("Rules cannot be vectorised, evaluating the records one by one")
+            return pd.DataFrame(
+                [
+                    # the cells are copied so that the input records are left untouched
+                    self.evaluate(copy.deepcopy(process_variables))
+                    for process_variables in records.to_dict("records")
+                ],
+                index=records.index,
+            )
+
+        rules_definition, parsed_rules = compiled
+        # masks are aligned on a unique index, the original one is restored at the end
+        frame = records.reset_index(drop=True)
+        # whether the last processed rule of the record is a global rule
+        last_rule_global = pd.Series(False, index=frame.index)
+        for group_name, rules in rules_definition.groups.items():
+            logger.info(f"Processing '{group_name}' group")
+            active = ~last_rule_global
+            for rule_name in rules:
+                if not active.any():
+                    break
+                logger.info(f"Processing '{rule_name}' rule")
+                rule: Rule = parsed_rules[rule_name]
+                satisfied = rule.if_condition.evaluate_frame(frame)
+                hit = active & satisfied
+                miss = active & ~satisfied
+                for transf in rule.if_condition.then:
+                    transf.apply_frame(frame, hit)
+                for transf in rule.else_transformations:
+                    transf.apply_frame(frame, miss)
+                last_rule_global[active] = rule_name in rules_definition.global_rules
+                ## First hit policy
+                if group_name != "no_group_rules" or (
+                    rule_name in rules_definition.global_rules
+                ):
+                    active = miss
+        frame.index = records.index
+        # the columns created by the rules start as object columns of None
+        new_columns = [column for column in frame.columns if column not in records]
+        frame[new_columns] = frame[new_columns].infer_objects()
+        logger.info("Engine has processed the business rules.")
+        return frame
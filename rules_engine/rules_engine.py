@@ -1,25 +1,243 @@
+import functools
 import logging
-import re
+import time
 import yaml
+import numpy as np
 import pandas as pd
-from typing import Any, Dict, List, Tuple, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple, Union
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pydantic import BaseModel
 from dataclasses import dataclass, field
 
+from .decision_table import compile_decision_tables, group_rules
 from .exceptions import ParsingRuleException
+from .ext_data_cache import ext_data_cache
+from .external_source import ExcelExternalSource
 from .get_external_source import ExternalSourceTypes, get_ext_source
 from .models import RulesDefinition, Rule, Comparison, Condition, Transformation
+from .shared_ext_data import SharedExtDataStore, SharedFrame
+from .utils.accessors import REFERENCE_PATTERN, VARIABLE_PATTERN
+from .utils.ext_data import ExtDataFrames, ExtDataTable
 from .utils.variables_mutations import (
     get_permutations,
     get_variables_mutations,
     parse_mutation_key_value,
 )
 
+if TYPE_CHECKING:
+    from .rule_set import CompiledRuleSet
+
 logger = logging.getLogger("bre.v3")
 logger.setLevel("DEBUG")
 
 
+def load_rules_definition(
+    rules_definition_path: str = "", rules: Optional[Dict] = None
+) -> RulesDefinition:
+    if not rules_definition_path and not rules:
+        raise ValueError(
+            "One of `rules_definition_path` and `rules` has to be provided."
+        )
+    if rules:
+        return RulesDefinition(**rules)
+    with open(rules_definition_path, "r", encoding="utf-8") as f:
+        rules_dict = yaml.load(f, yaml.Loader)
+        return RulesDefinition(**rules_dict)
+
+
+def _collect_references(rule_def: Any, references: List[str]) -> List[str]:
+    # the variables are referenced by the keys and the values of the rules
+    if isinstance(rule_def, dict):
+        for key, value in rule_def.items():
+            _collect_references(key, references)
+            _collect_references(value, references)
+    elif isinstance(rule_def, list):
+        for value in rule_def:
+            _collect_references(value, references)
+    elif isinstance(rule_def, str):
+        references.extend(REFERENCE_PATTERN.findall(rule_def))
+    return references
+
+
+def referenced_external_data(
+    rules_definition: RulesDefinition,
+) -> Dict[str, Optional[List[str]]]:
+    """
+    The external data sources referenced by the rules, with the columns the rules
+    read (None when the whole table is referenced, e.g. `${ext_data_1}`).
+    """
+    referenced: Dict[str, Optional[List[str]]] = {}
+    for variable in _collect_references(rules_definition.rules, []):
+        var_split = variable.split(".")
+        name = var_split[0]
+        if name not in rules_definition.external_data:
+            continue
+        columns = referenced.setdefault(name, [])
+        if len(var_split) == 1 or columns is None:
+            referenced[name] = None
+        elif var_split[1] not in columns:
+            columns.append(var_split[1])
+    return referenced
+
+
+def _get_ext_sources(
+    rules_definition: RulesDefinition,
+) -> Dict[str, ExternalSourceTypes]:
+    # the sources the rules do not reference are not loaded, the others only read
+    # the referenced columns unless the configuration lists them
+    referenced = referenced_external_data(rules_definition)
+    return {
+        key: get_ext_source({"columns": referenced[key], **value})
+        for key, value in rules_definition.external_data.items()
+        if key in referenced
+    }
+
+
+def _read_ext_source(ext_source: ExternalSourceTypes) -> pd.DataFrame:
+    return ext_source.get_data()
+
+
+def _load_ext_table(
+    name: str,
+    ext_source: ExternalSourceTypes,
+    load_times: Dict[str, float],
+    parse_executor: Optional[ProcessPoolExecutor] = None,
+    cached: bool = True,
+) -> ExtDataTable:
+    load = None
+    if parse_executor is not None and isinstance(ext_source, ExcelExternalSource):
+        # openpyxl holds the GIL, the workbooks are parsed in other processes
+        load = lambda: parse_executor.submit(_read_ext_source, ext_source).result()
+    start = time.perf_counter()
+    if cached:
+        # the cached table keeps its indexes for the next engines
+        table = ext_data_cache.get_table(ext_source, load)
+    else:
+        table = ExtDataTable((load or ext_source.get_data)())
+    load_times[name] = time.perf_counter() - start
+    logger.info(
+        f"External data '{name}' ({ext_source.source}) loaded in {load_times[name]:.3f}s"
+    )
+    return table
+
+
+def _load_ext_source(
+    name: str,
+    ext_source: ExternalSourceTypes,
+    load_times: Dict[str, float],
+    parse_executor: Optional[ProcessPoolExecutor] = None,
+    cached: bool = True,
+) -> pd.DataFrame:
+    return _load_ext_table(name, ext_source, load_times, parse_executor, cached).frame
+
+
+def _load_ext_tables(
+    rules_definition: RulesDefinition,
+    max_workers: int,
+    excel_processes: int,
+    load_times: Dict[str, float],
+) -> Dict[str, ExtDataTable]:
+    ext_sources = _get_ext_sources(rules_definition)
+    if len(ext_sources) <= 1:
+        return {
+            key: _load_ext_table(key, ext_source, load_times)
+            for key, ext_source in ext_sources.items()
+        }
+    parse_executor = None
+    if excel_processes > 0:
+        parse_executor = ProcessPoolExecutor(max_workers=excel_processes)
+    try:
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(ext_sources)),
+            thread_name_prefix="bre-ext-data",
+        ) as executor:
+            futures = {
+                key: executor.submit(
+                    _load_ext_table, key, ext_source, load_times, parse_executor
+                )
+                for key, ext_source in ext_sources.items()
+            }
+            return {key: future.result() for key, future in futures.items()}
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
+
+
+def load_external_data(
+    rules_definition: RulesDefinition,
+    max_workers: int = 8,
+    excel_processes: int = 0,
+    load_times: Optional[Dict[str, float]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Load the external data sources referenced by the rules concurrently, in a pool of
+    at most `max_workers` threads. With `excel_processes` > 0, the Excel workbooks are
+    parsed in a pool of as many processes. The time spent loading each source is
+    logged and stored in `load_times` when given.
+    """
+    if load_times is None:
+        load_times = {}
+    return {
+        key: table.frame
+        for key, table in _load_ext_tables(
+            rules_definition, max_workers, excel_processes, load_times
+        ).items()
+    }
+
+
+def load_external_tables(
+    rules_definition: RulesDefinition,
+    lazy: bool = False,
+    max_workers: int = 8,
+    excel_processes: int = 0,
+    load_times: Optional[Dict[str, float]] = None,
+    shared_store: Optional[SharedExtDataStore] = None,
+) -> Dict[str, ExtDataTable]:
+    """
+    The tables of the external data sources referenced by the rules. When `lazy`,
+    each source is loaded the first time a rule reads it, otherwise they are all
+    loaded now, see `load_external_data`.
+
+    With a `shared_store`, the tables are attached from the store, the process
+    which finds a table missing loads the source and publishes it.
+    """
+    if load_times is None:
+        load_times = {}
+    if shared_store is not None:
+        tables = {
+            key: ExtDataTable(
+                load=SharedFrame(
+                    shared_store,
+                    ext_source.cache_key(),
+                    # the store is the cache, a publication reloads the source
+                    functools.partial(
+                        _load_ext_source, key, ext_source, load_times, cached=False
+                    ),
+                )
+            )
+            for key, ext_source in _get_ext_sources(rules_definition).items()
+        }
+        if not lazy and tables:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(tables)),
+                thread_name_prefix="bre-ext-data",
+            ) as executor:
+                list(executor.map(lambda table: table.frame, tables.values()))
+        return tables
+    if not lazy:
+        return _load_ext_tables(
+            rules_definition, max_workers, excel_processes, load_times
+        )
+    return {
+        # the loaded table shares the frame and the indexes of the cached one
+        key: ExtDataTable(
+            load=functools.partial(_load_ext_table, key, ext_source, load_times)
+        )
+        for key, ext_source in _get_ext_sources(rules_definition).items()
+    }
+
+
 @dataclass
 class RulesEngine:
     process_variables: Union[Dict, BaseModel]
@@ -29,31 +247,51 @@ class RulesEngine:
         default_factory=lambda: RulesDefinition(rules={})
     )
     parsed_rules: Dict[str, Rule] = field(default_factory=dict)
-    ext_data_variables: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    ext_data_variables: Mapping[str, pd.DataFrame] = field(default_factory=dict)
     ext_data_variables_name: List[str] = field(default_factory=list)
+    ext_data_tables: Dict[str, ExtDataTable] = field(default_factory=dict)
+    # positions of the external data rows selected by the filters of the evaluation
+    ext_data_selections: Dict[str, np.ndarray] = field(default_factory=dict)
+    rule_set: Optional["CompiledRuleSet"] = None
+    # load each external data source the first time a rule reads it, instead of
+    # when the engine is created
+    ext_data_lazy: bool = False
 
     def __post_init__(self):
+        if self.rule_set is not None:
+            # parsing and external data loading have been paid by the rule set
+            self._use_rule_set()
+            return
         self._parse_rules_definition()
         self._create_external_data_variable()
         self._parse_rules()
 
+    def _use_rule_set(self):
+        self.ext_data_variables_name = list(self.rule_set.ext_data_variables_name)
+        # the frames are never filtered, they and their indexes are shared by all
+        # the evaluations
+        self.ext_data_variables = self.rule_set.ext_data_variables
+        self.ext_data_tables = self.rule_set.ext_data_tables
+        self.rules_definition, self.parsed_rules = self.rule_set.get_rules(self)
+
     def _parse_rules_definition(self):
-        if not self.rules_definition_path and not self.rules:
-            raise ValueError(
-                "One of `rules_definition_path` and `rules` has to be provided."
-            )
-        if self.rules:
-            self.rules_definition = RulesDefinition(**self.rules)
-        else:
-            with open(self.rules_definition_path, "r", encoding="utf-8") as f:
-                rules_dict = yaml.load(f, yaml.Loader)
-                self.rules_definition: RulesDefinition = RulesDefinition(**rules_dict)
+        self.rules_definition = load_rules_definition(
+            self.rules_definition_path, self.rules
+        )
 
     def _create_external_data_variable(self):
-        for key, value in self.rules_definition.external_data.items():
-            ext_source: ExternalSourceTypes = get_ext_source(value)
-            self.ext_data_variables_name.append(key)
-            self.ext_data_variables.update({key: ext_source.get_data()})
+        # the frames given to the engine are completed by the referenced sources,
+        # loaded now (a source which cannot be loaded fails here) or, with
+        # `ext_data_lazy`, when a rule reads them
+        self.ext_data_tables = {
+            name: ExtDataTable(ext_data)
+            for name, ext_data in self.ext_data_variables.items()
+        }
+        self.ext_data_tables.update(
+            load_external_tables(self.rules_definition, self.ext_data_lazy)
+        )
+        self.ext_data_variables = ExtDataFrames(self.ext_data_tables)
+        self.ext_data_variables_name.extend(self.ext_data_tables.keys())
 
     def _is_ext_data_variable(self, variable: str):
         return variable in self.ext_data_variables_name
@@ -66,8 +304,7 @@ class RulesEngine:
         return variable
 
     def _clean_variable(self, v: str):
-        pattern = r"^\$\{(?P<variable>(\w+(?:\.\w+|\[\d+\])*)*)\}$"
-        matches = re.match(pattern, v)
+        matches = VARIABLE_PATTERN.match(v)
         if not matches:
             return None
         return matches["variable"]
@@ -152,7 +389,7 @@ class RulesEngine:
             mutations: List[str] = get_variables_mutations(
                 self.process_variables,
                 variable_tree,
-                list(self.ext_data_variables.keys()),
+                self.ext_data_variables_name,
             )
             return mutations, ".".join(cleaned_variable.split(".")[:-1])
         else:
@@ -396,12 +633,17 @@ class RulesEngine:
                 raise ParsingRuleException(
                     f"Error in [{rule_name}] rule: cannot define else without if condition"
                 )
+        self.rules_definition.decision_tables = compile_decision_tables(
+            self.rules_definition, self.parsed_rules, self.ext_data_variables_name
+        )
 
     def process_rules(self):
         rule_name = None
         for group_name, rules in self.rules_definition.groups.items():
             logger.info(f"Processing '{group_name}' group")
-            for rule_name in rules:
+            for rule_name in group_rules(
+                self, rules, self.rules_definition.decision_tables.get(group_name)
+            ):
                 logger.info(f"Processing '{rule_name}' rule")
                 rule: Rule = self.parsed_rules[rule_name]
                 if rule.if_condition:
@@ -430,8 +672,12 @@ class RulesEngine:
                     # run transformations
                     for transf in rule.transformations:
                         transf.apply(self)
+            else:
+                if rules:
+                    # the rules skipped by a decision table have not been satisfied
+                    rule_name = rules[-1]
             if rule_name in self.rules_definition.global_rules:
-                logger.info(f"Global rule '{rule}' satisfied.")
+                logger.info(f"Global rule '{rule_name}' satisfied.")
                 break
 
         logger.info("Engine has processed the business rules.")
@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .utils.disk_cache import load_frame, save_frame
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger("bre.shared_ext_data")
+logger.setLevel("DEBUG")
+
+_CURRENT_FILE = "CURRENT"
+_LOCK_FILE = ".lock"
+
+
+def shareable(frame: pd.DataFrame) -> pd.DataFrame:
+    """Convert the string columns to categoricals, whose codes can be memory-mapped
+    (the strings of an object column are unpickled by every process)."""
+    frame = frame.copy(deep=False)
+    for idx in range(frame.shape[1]):
+        column = frame.iloc[:, idx]
+        if pd.api.types.is_object_dtype(column) and (
+            pd.api.types.infer_dtype(column, skipna=True) == "string"
+        ):
+            frame.isetitem(idx, column.astype("category"))
+    return frame
+
+
+@dataclass
+class SharedExtDataStore:
+    """
+    External data tables published as memory-mapped column files in a directory
+    (e.g. under `/dev/shm`) and attached read-only by every process of the host, so
+    that the workers share one copy of the tables.
+
+    Each publication of a table is a new generation: it is written aside, then the
+    `CURRENT` pointer of the table is atomically replaced. Processes attached to the
+    previous generation keep reading it until they swap to the new one, the last
+    `keep_generations` generations are kept on disk.
+
+    Example usage:
+        store = SharedExtDataStore("/dev/shm/business_rules_engine")
+        generation, frame = store.get(key, load)  # published by the first process
+        store.publish(key, new_frame)  # workers swap on their next refresh
+    """
+
+    root: str
+    keep_generations: int = 2
+
+    def _table_dir(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest()[:20])
+
+    @contextmanager
+    def _locked(self, key: str) -> Iterator[None]:
+        table_dir = self._table_dir(key)
+        os.makedirs(table_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(table_dir, _LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current_generation(self, key: str) -> Optional[str]:
+        try:
+            with open(
+                os.path.join(self._table_dir(key), _CURRENT_FILE), encoding="utf-8"
+            ) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _generations(self, table_dir: str) -> List[str]:
+        return sorted(entry for entry in os.listdir(table_dir) if entry.isdigit())
+
+    def _publish(self, key: str, frame: pd.DataFrame) -> str:
+        table_dir = self._table_dir(key)
+        generation = f"{time.time_ns():020d}"
+        tmp_path = tempfile.mkdtemp(dir=table_dir, prefix=".tmp-")
+        try:
+            save_frame(shareable(frame), os.path.join(tmp_path, "frame"))
+            # read back before any process is pointed to it
+            load_frame(os.path.join(tmp_path, "frame"))
+            os.replace(
+                os.path.join(tmp_path, "frame"), os.path.join(table_dir, generation)
+            )
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        fd, current_path = tempfile.mkstemp(dir=table_dir, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as current:
+            current.write(generation)
+        os.replace(current_path, os.path.join(table_dir, _CURRENT_FILE))
+        # the files of the older generations stay readable by the processes which
+        # still map them
+        for old_generation in self._generations(table_dir)[: -self.keep_generations]:
+            shutil.rmtree(os.path.join(table_dir, old_generation), ignore_errors=True)
+        logger.info(f"Published generation {generation} of {table_dir}")
+        return generation
+
+    def publish(self, key: str, frame: pd.DataFrame) -> str:
+        """Publish a new generation of the table and return it. A frame which cannot
+        be saved without pickling raises a `TypeError` or a `ValueError`, the
+        current generation is left as it was."""
+        with self._locked(key):
+            return self._publish(key, frame)
+
+    def attach(self, key: str, generation: str) -> pd.DataFrame:
+        return load_frame(os.path.join(self._table_dir(key), generation))
+
+    def get(
+        self, key: str, load: Callable[[], pd.DataFrame]
+    ) -> Tuple[Optional[str], pd.DataFrame]:
+        """Attach the current generation of the table, loading and publishing it
+        first when no process has. A table which cannot be shared is returned as
+        loaded, without a generation: each process keeps its own copy."""
+        while True:
+            generation = self.current_generation(key)
+            if generation is not None:
+                try:
+                    return generation, self.attach(key, generation)
+                except FileNotFoundError:
+                    # the generation has been replaced and removed in the meantime
+                    continue
+                except (KeyError, ValueError) as e:
+                    # e.g. written by another version of the package
+                    logger.warning(
+                        f"Cannot attach generation {generation} of the table {key}, "
+                        f"publishing it again: {e}"
+                    )
+            with self._locked(key):
+                if self.current_generation(key) != generation:
+                    # published by another process in the meantime
+                    continue
+                frame = load()
+                try:
+                    self._publish(key, frame)
+                except (TypeError, ValueError) as e:
+                    logger.warning(
+                        f"Cannot share the table {key}, it is loaded by each "
+                        f"process: {e}"
+                    )
+                    return None, frame
+
+
+class SharedFrame:
+    """
+    The load function of an `ExtDataTable` attached to a shared store. It is pickled
+    without the frame: a worker process attaches the store itself.
+    """
+
+    reloadable = True
+
+    def __init__(
+        self, store: SharedExtDataStore, key: str, load: Callable[[], pd.DataFrame]
+    ):
+        self.store = store
+        self.key = key
+        self.load = load
+        self.generation: Optional[str] = None
+
+    def __call__(self) -> pd.DataFrame:
+        self.generation, frame = self.store.get(self.key, self.load)
+        return frame
+
+    def is_stale(self) -> bool:
+        return (
+            self.generation is not None
+            and self.store.current_generation(self.key) != self.generation
+        )
+
+    def renewed(self) -> "SharedFrame":
+        return SharedFrame(self.store, self.key, self.load)
+
+    def publish(self) -> Optional[str]:
+        """Load the data again and publish it as a new generation, return None when
+        it cannot be shared."""
+        try:
+            return self.store.publish(self.key, self.load())
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Cannot share the table {self.key}: {e}")
+            return None
@@ -0,0 +1,96 @@
+import re
+from functools import lru_cache
+from typing import Any, Tuple, Union
+
+# a value made only of a variable reference, e.g. `${a.b[0].c}`
+VARIABLE_PATTERN = re.compile(r"^\$\{(?P<variable>(\w+(?:\.\w+|\[\d+\])*)*)\}$")
+# a variable reference embedded in an expression, e.g. `max(${a}, ${b})`
+REFERENCE_PATTERN = re.compile(r"\$\{(?P<variable>\w+(?:\.\w+|\[\d+\])*)\}")
+
+_STEP_PATTERN = re.compile(r"\[(\d+)\]|([^.\[\]]+)")
+
+
+def _parse_steps(variable: str) -> Tuple[Union[str, int], ...]:
+    steps = []
+    for index, name in _STEP_PATTERN.findall(variable):
+        if index:
+            steps.append(int(index))
+        elif name.isnumeric():
+            steps.append(int(name))
+        else:
+            steps.append(name)
+    return tuple(steps)
+
+
+class VariablePath:
+    """
+    A variable path (e.g. `a.b[0].c` or `a.b.0.c`) compiled once into a chain of
+    steps. String steps are dict keys or attributes of pydantic models, integer steps
+    are list indexes.
+
+    Example usage:
+        path = VariablePath("items.0.price")
+        path.get({"items": [{"price": 10}]})  # 10
+        path.set(process_variables, 12)
+    """
+
+    __slots__ = ("variable", "steps")
+
+    def __init__(self, variable: str):
+        self.variable = variable
+        self.steps = _parse_steps(variable)
+        if not self.steps:
+            raise ValueError(f"Invalid variable path: {variable}")
+
+    def __repr__(self) -> str:
+        return f"VariablePath({self.variable!r})"
+
+    def get(self, obj: Any) -> Any:
+        for step in self.steps:
+            if step.__class__ is int or isinstance(obj, dict):
+                obj = obj[step]
+            else:
+                obj = getattr(obj, step)
+        return obj
+
+    def set(self, obj: Any, value: Any) -> Any:
+        """Set the value, creating the missing intermediate dicts."""
+        target = obj
+        for step in self.steps[:-1]:
+            if step.__class__ is int:
+                target = target[step]
+            elif isinstance(target, dict):
+                if step not in target:
+                    target[step] = {}
+                target = target[step]
+            else:
+                target = getattr(target, step)
+        last = self.steps[-1]
+        if last.__class__ is int or isinstance(target, dict):
+            target[last] = value
+        else:
+            setattr(target, last, value)
+        return obj
+
+    def append(self, obj: Any, value: Any) -> Any:
+        """Append the value to the list or string at the end of the path. A missing
+        final key is created as an empty list or string depending on the value."""
+        target = obj
+        for step in self.steps[:-1]:
+            if step.__class__ is int:
+                target = target[step]
+            else:
+                target = target.get(step, {})
+        last = self.steps[-1]
+        if last.__class__ is not int and last not in target:
+            target[last] = [] if isinstance(value, list) else ""
+        if isinstance(target[last], list):
+            target[last].append(value)
+        elif isinstance(target[last], str):
+            target[last] += f"\n{value}" if target[last] else str(value)
+        return obj
+
+
+@lru_cache(maxsize=4096)
+def get_variable_path(variable: str) -> VariablePath:
+    return VariablePath(variable)
@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+AIRTABLE_API_URL = "https://api.airtable.com"
+# seconds a table schema is reused before being fetched again
+SCHEMA_TTL = 300.0
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+# (api url, base id) -> (fetch time, schema of the tables of the base)
+_schemas: Dict[Tuple[str, str], Tuple[float, List[Dict]]] = {}
+
+
+class AirTableError(Exception):
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+
+def get_session() -> requests.Session:
+    """The keep-alive session shared by all the AirTable requests of the process."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _headers(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def formula_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "TRUE()" if value else "FALSE()"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    escaped = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def equality_formula(filters: Dict[str, List[Any]]) -> Optional[str]:
+    """
+    The `filterByFormula` keeping the records whose field is one of the values, for
+    every field, e.g. `AND(OR({Status}='Active',{Status}='New'),{Country}='IT')`.
+    """
+    conditions = []
+    for field_name, values in filters.items():
+        if not isinstance(values, list):
+            values = [values]
+        equalities = [f"{{{field_name}}}={formula_value(value)}" for value in values]
+        if len(equalities) == 1:
+            conditions.append(equalities[0])
+        elif equalities:
+            conditions.append(f"OR({','.join(equalities)})")
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return f"AND({','.join(conditions)})"
+
+
+def iter_records(
+    base_id: str,
+    table: str,
+    token: str,
+    fields: Optional[List[str]] = None,
+    formula: Optional[str] = None,
+    api_url: str = AIRTABLE_API_URL,
+) -> Iterator[Dict]:
+    """Yield the records of the table, page by page, with only the `fields` and the
+    records matching the `formula` when given."""
+    url = f"{api_url}/v0/{base_id}/{table}"
+    params: Dict[str, Any] = {}
+    if fields is not None:
+        params["fields[]"] = fields
+    if formula:
+        params["filterByFormula"] = formula
+    while True:
+        res = get_session().get(url, headers=_headers(token), params=params)
+        if res.status_code != 200:
+            raise AirTableError(res.text)
+        page = res.json()
+        yield from page["records"]
+        if not page.get("offset"):
+            break
+        params["offset"] = page["offset"]
+
+
+def get_tables_schema(
+    base_id: str, token: str, api_url: str = AIRTABLE_API_URL
+) -> List[Dict]:
+    """The schema of the tables of the base, cached for `SCHEMA_TTL` seconds. An
+    empty list when it cannot be fetched."""
+    key = (api_url, base_id)
+    cached = _schemas.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SCHEMA_TTL:
+        return cached[1]
+    res = get_session().get(
+        f"{api_url}/v0/meta/bases/{base_id}/tables", headers=_headers(token)
+    )
+    if res.status_code != 200:
+        return []
+    tables_schema = res.json()["tables"]
+    _schemas[key] = (time.monotonic(), tables_schema)
+    return tables_schema
+
+
+def get_date_fields(
+    base_id: str, table: str, token: str, api_url: str = AIRTABLE_API_URL
+) -> List[str]:
+    for table_schema in get_tables_schema(base_id, token, api_url):
+        if table_schema["name"] == table:
+            return [
+                field["name"]
+                for field in table_schema["fields"]
+                if field["type"] == "date"
+            ]
+    return []
@@ -1,6 +1,7 @@
 from pydantic import Field
 from pydantic.type_adapter import TypeAdapter
-from typing import Annotated, Union
+from typing import Annotated, Dict, Type, Union, get_args
+from .base import ComparisonBaseMethod, MembershipList, convert_to_datetime
 from .methods import *
 
 ComparisonMethod = Union[
@@ -27,3 +28,16 @@ ComparisonMethodAdapter = TypeAdapter(
 
 def parse_comparison_method(method_info: dict) -> ComparisonMethod:
     return ComparisonMethodAdapter.validate_python(method_info)
+
+
+COMPARISON_METHODS: Dict[str, Type[ComparisonBaseMethod]] = {
+    method.model_fields["comparison_method"].default: method
+    for method in get_args(ComparisonMethod)
+}
+
+
+def get_comparison_method(comparison_method: str) -> Type[ComparisonBaseMethod]:
+    try:
+        return COMPARISON_METHODS[comparison_method]
+    except KeyError:
+        raise ValueError(f"Unknown comparison method: {comparison_method}")
@@ -1,6 +1,9 @@
 import numpy as np
-from pydantic import BaseModel, field_validator
-from typing import List, Literal, Any, Union
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+from pydantic import BaseModel, TypeAdapter, field_validator
+from typing import Any, FrozenSet, Iterable, List, Literal, Optional, Type, Union
 
 ComparisonMethodTypes = Literal[
     "is_empty",
@@ -19,6 +22,79 @@ ComparisonMethodTypes = Literal[
 ]
 
 
+def convert_to_datetime(value: Any) -> Any:
+    if isinstance(value, np.datetime64):
+        # this is an external variable of type np.datetime64
+        value = datetime.fromtimestamp(int(value) / 1e9)
+    return value
+
+
+class MembershipList(list):
+    """
+    A list of comparison variables searched through a hash set, built the first
+    time the list is searched when it holds at least `hash_threshold` values, so
+    that `value in values` does not scan the list. The unhashable values are kept
+    aside and scanned. The list must not be modified once it has been searched.
+
+    Example usage:
+        codes = MembershipList(["A01", "A02", ...])
+        "A02" in codes  # a set lookup
+    """
+
+    __slots__ = ("_hashed", "_unhashable")
+    hash_threshold = 8
+
+    def __init__(self, values: Iterable[Any] = ()):
+        super().__init__(values)
+        self._hashed: Optional[FrozenSet[Any]] = None
+        self._unhashable: List[Any] = []
+
+    def __reduce__(self):
+        # the set is built again by the receiving process
+        return MembershipList, (list(self),)
+
+    def _build(self) -> FrozenSet[Any]:
+        hashed = set()
+        unhashable = []
+        for value in self:
+            try:
+                hashed.add(value)
+            except TypeError:
+                unhashable.append(value)
+        self._unhashable = unhashable
+        self._hashed = frozenset(hashed)
+        return self._hashed
+
+    def _hashed_values(self) -> Optional[FrozenSet[Any]]:
+        if len(self) < self.hash_threshold:
+            return None
+        if self._hashed is None:
+            return self._build()
+        return self._hashed
+
+    def __contains__(self, value: Any) -> bool:
+        hashed = self._hashed_values()
+        if hashed is None:
+            return list.__contains__(self, value)
+        try:
+            if value in hashed:
+                return True
+        except TypeError:
+            # an unhashable value can only be equal to an unhashable one
+            pass
+        return value in self._unhashable
+
+    def has_other_than(self, value: Any) -> bool:
+        """Same as `any(value != v for v in self)`."""
+        hashed = self._hashed_values()
+        if hashed is None or self._unhashable:
+            return any(value != v for v in self)
+        try:
+            return len(hashed) > 1 or (len(hashed) == 1 and value not in hashed)
+        except TypeError:
+            return True
+
+
 class ComparisonBaseMethod(BaseModel):
     comparison_method: ComparisonMethodTypes
     variable: Any
@@ -26,12 +102,61 @@ class ComparisonBaseMethod(BaseModel):
 
     @field_validator("variable", "comparison_variables", mode="before")
     def convert_to_datetime(cls, value):
-        if isinstance(value, np.datetime64):
-            # this is an external variable of type np.datetime64
-            from datetime import datetime
+        return convert_to_datetime(value)
 
-            value = datetime.fromtimestamp(int(value) / 1e9)
-        return value
+    @classmethod
+    def coerce(cls, comparison_variables: Any) -> Any:
+        """Validate the comparison variables against the type declared by the method
+        (e.g. `"false"` becomes `False` for `is_empty`), a value which does not
+        match raises a `ValidationError`."""
+        adapter = _comparison_variables_adapter(cls)
+        if adapter is None:
+            return comparison_variables
+        coerced = adapter.validate_python(comparison_variables)
+        if isinstance(comparison_variables, MembershipList) and isinstance(
+            coerced, list
+        ):
+            # the list is still searched through a hash set
+            return MembershipList(coerced)
+        return coerced
 
-    def evaluate(self) -> bool:
+    @classmethod
+    def prepare(cls, comparison_variables: Any) -> Any:
+        """The form of literal comparison variables passed to `compare` and
+        `compare_series`, computed once when the rule is compiled (e.g. a compiled
+        regex). The default coerces them, see `coerce`."""
+        return cls.coerce(comparison_variables)
+
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
         raise NotImplementedError
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        """Evaluate `compare` for a column of variables, one row per record, and return
+        the boolean mask. Subclasses override it with vectorised pandas operations,
+        the default evaluates the rows one by one."""
+        return variables.map(
+            lambda variable: cls.compare(
+                convert_to_datetime(variable), comparison_variables
+            )
+        ).astype(bool)
+
+    def evaluate(self) -> bool:
+        return self.compare(self.variable, self.comparison_variables)
+
+
+@lru_cache(maxsize=None)
+def _comparison_variables_adapter(
+    method: Type[ComparisonBaseMethod],
+) -> Optional[TypeAdapter]:
+    # None when the method does not narrow the type of its comparison variables
+    annotation = method.model_fields["comparison_variables"].annotation
+    if (
+        annotation
+        == ComparisonBaseMethod.model_fields["comparison_variables"].annotation
+    ):
+        return None
+    return TypeAdapter(annotation)
@@ -1,14 +1,72 @@
 import logging
 import re
-from typing import Any, List, Literal, Union
+from functools import lru_cache
+from typing import Any, Iterable, List, Literal, Optional, Union
 
-from .base import ComparisonBaseMethod
+import pandas as pd
+
+from .base import ComparisonBaseMethod, MembershipList
 
 
 logger = logging.getLogger("bre.comparison")
 logger.setLevel("DEBUG")
 
 
+def _string_values(variables: pd.Series) -> Optional[Any]:
+    # the `.str` accessor is only available for columns holding strings
+    try:
+        return variables.str
+    except AttributeError:
+        return None
+
+
+# the needle lists from this size are searched with one combined regex
+SUBSTRINGS_THRESHOLD = 16
+
+
+@lru_cache(maxsize=1024)
+def compiled_pattern(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def _all_strings(values: Any) -> bool:
+    return isinstance(values, list) and all(isinstance(v, str) for v in values)
+
+
+class Substrings:
+    """
+    A list of needles searched in a string at once with a combined alternation
+    regex, instead of one `in` per needle.
+
+    Example usage:
+        needles = Substrings(["foo", "bar", ...])
+        needles.found_in("a bar")  # True
+    """
+
+    __slots__ = ("needles", "pattern")
+
+    def __init__(self, needles: Iterable[str]):
+        self.needles = tuple(needles)
+        self.pattern = re.compile("|".join(re.escape(n) for n in self.needles))
+
+    def __repr__(self) -> str:
+        return repr(list(self.needles))
+
+    def found_in(self, variable: Any) -> bool:
+        if isinstance(variable, str):
+            return self.pattern.search(variable) is not None
+        # e.g. a list, the needles are its items
+        return any(v in variable for v in self.needles)
+
+
+def _isin(variables: pd.Series, comparison_variables: List[Any]) -> pd.Series:
+    try:
+        return variables.isin(comparison_variables)
+    except TypeError:
+        # unhashable comparison variables
+        return variables.map(lambda v: v in comparison_variables).astype(bool)
+
+
 class IsEmpty(ComparisonBaseMethod):
     """
     The IsEmpty class is a subclass of the ComparisonBaseMethod class.
@@ -35,19 +93,29 @@ class IsEmpty(ComparisonBaseMethod):
     comparison_method: Literal["is_empty"] = "is_empty"
     comparison_variables: bool
 
-    def evaluate(self) -> bool:
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
         # check if the input variable is empty
-        logger.info(f"Checking is_empty for {self.variable}")
-        if isinstance(self.variable, str):
-            return (self.variable.strip() == "") == self.comparison_variables
-        elif isinstance(self.variable, list):
-            return (self.variable == []) == self.comparison_variables
-        elif isinstance(self.variable, dict):
-            return (self.variable == {}) == self.comparison_variables
-        elif isinstance(self.variable, tuple):
-            return (self.variable == ()) == self.comparison_variables
+        logger.info(f"Checking is_empty for {variable}")
+        if isinstance(variable, str):
+            return (variable.strip() == "") == comparison_variables
+        elif isinstance(variable, list):
+            return (variable == []) == comparison_variables
+        elif isinstance(variable, dict):
+            return (variable == {}) == comparison_variables
+        elif isinstance(variable, tuple):
+            return (variable == ()) == comparison_variables
         else:
-            return (self.variable is None) == self.comparison_variables
+            return (variable is None) == comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        if variables.dtype != object:
+            # numbers and dates are never empty
+            return pd.Series(not comparison_variables, index=variables.index)
+        return super().compare_series(variables, comparison_variables)
 
 
 class LessThan(ComparisonBaseMethod):
@@ -72,9 +140,16 @@ class LessThan(ComparisonBaseMethod):
 
     comparison_method: Literal["less_than"] = "less_than"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} < {self.comparison_variables}")
-        return self.variable < self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} < {comparison_variables}")
+        return variable < comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        return variables < comparison_variables
 
 
 class LessThanOrEqual(ComparisonBaseMethod):
@@ -96,9 +171,16 @@ class LessThanOrEqual(ComparisonBaseMethod):
 
     comparison_method: Literal["less_than_or_equal_to"] = "less_than_or_equal_to"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} <= {self.comparison_variables}")
-        return self.variable <= self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} <= {comparison_variables}")
+        return variable <= comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        return variables <= comparison_variables
 
 
 class GreaterThan(ComparisonBaseMethod):
@@ -125,9 +207,16 @@ class GreaterThan(ComparisonBaseMethod):
 
     comparison_method: Literal["greater_than"] = "greater_than"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} > {self.comparison_variables}")
-        return self.variable > self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} > {comparison_variables}")
+        return variable > comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        return variables > comparison_variables
 
 
 class GreaterThanOrEqual(ComparisonBaseMethod):
@@ -150,9 +239,16 @@ class GreaterThanOrEqual(ComparisonBaseMethod):
 
     comparison_method: Literal["greater_than_or_equal_to"] = "greater_than_or_equal_to"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} >= {self.comparison_variables}")
-        return self.variable >= self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} >= {comparison_variables}")
+        return variable >= comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        return variables >= comparison_variables
 
 
 class EqualTo(ComparisonBaseMethod):
@@ -170,18 +266,29 @@ class EqualTo(ComparisonBaseMethod):
 
     comparison_method: Literal["equal_to"] = "equal_to"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} == {self.comparison_variables}")
-        if isinstance(self.variable, str) and isinstance(
-            self.comparison_variables, str
-        ):
-            return self.variable.strip() == self.comparison_variables.strip()
-        elif isinstance(self.comparison_variables, list):
-            return any(
-                [self.variable == comp_var for comp_var in self.comparison_variables]
-            )
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} == {comparison_variables}")
+        if isinstance(variable, str) and isinstance(comparison_variables, str):
+            return variable.strip() == comparison_variables.strip()
+        elif isinstance(comparison_variables, list):
+            return variable in comparison_variables
+        else:
+            return variable == comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        if isinstance(comparison_variables, str):
+            strings = _string_values(variables)
+            if strings is None:
+                return variables == comparison_variables
+            return strings.strip() == comparison_variables.strip()
+        elif isinstance(comparison_variables, list):
+            return _isin(variables, comparison_variables)
         else:
-            return self.variable == self.comparison_variables
+            return variables == comparison_variables
 
 
 class NotEqualTo(ComparisonBaseMethod):
@@ -205,18 +312,34 @@ class NotEqualTo(ComparisonBaseMethod):
 
     comparison_method: Literal["not_equal_to"] = "not_equal_to"
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking {self.variable} != {self.comparison_variables}")
-        if isinstance(self.variable, str) and isinstance(
-            self.comparison_variables, str
-        ):
-            return self.variable.strip() != self.comparison_variables.strip()
-        elif isinstance(self.comparison_variables, list):
-            return any(
-                [self.variable != comp_var for comp_var in self.comparison_variables]
-            )
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking {variable} != {comparison_variables}")
+        if isinstance(variable, str) and isinstance(comparison_variables, str):
+            return variable.strip() != comparison_variables.strip()
+        elif isinstance(comparison_variables, MembershipList):
+            return comparison_variables.has_other_than(variable)
+        elif isinstance(comparison_variables, list):
+            return any(variable != comp_var for comp_var in comparison_variables)
+        else:
+            return variable != comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        if isinstance(comparison_variables, str):
+            strings = _string_values(variables)
+            if strings is None:
+                return variables != comparison_variables
+            return strings.strip() != comparison_variables.strip()
+        elif isinstance(comparison_variables, list):
+            result = pd.Series(False, index=variables.index)
+            for comp_var in comparison_variables:
+                result |= variables != comp_var
+            return result
         else:
-            return self.variable != self.comparison_variables
+            return variables != comparison_variables
 
 
 class StartsWith(ComparisonBaseMethod):
@@ -249,21 +372,39 @@ class StartsWith(ComparisonBaseMethod):
     variable: str
     comparison_variables: Union[str, List[str]]
 
-    def evaluate(self) -> bool:
-        logger.info(
-            f"Checking if {self.variable} starts with {self.comparison_variables}"
-        )
-        if isinstance(self.comparison_variables, list):
-            return any([self.variable.startswith(v) for v in self.comparison_variables])
-
-        elif isinstance(self.comparison_variables, str):
-
-            return self.variable.startswith(self.comparison_variables)
+    @classmethod
+    def prepare(cls, comparison_variables: Any) -> Any:
+        # `str.startswith` checks a tuple of needles in one call
+        comparison_variables = cls.coerce(comparison_variables)
+        if _all_strings(comparison_variables):
+            return tuple(comparison_variables)
+        return comparison_variables
+
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} starts with {comparison_variables}")
+        if isinstance(comparison_variables, list):
+            return any(variable.startswith(v) for v in comparison_variables)
+
+        elif isinstance(comparison_variables, (str, tuple)):
+            # a tuple of needles is prepared from a list, see `prepare`
+            return variable.startswith(comparison_variables)
         else:
             raise TypeError(
-                f"Expected str or list as comparison variable, got {type(self.comparison_variables)}"
+                f"Expected str or list as comparison variable, got {type(comparison_variables)}"
             )
 
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        strings = _string_values(variables)
+        if strings is None:
+            return pd.Series(False, index=variables.index)
+        if isinstance(comparison_variables, list):
+            comparison_variables = tuple(comparison_variables)
+        return strings.startswith(comparison_variables, na=False)
+
 
 class EndsWith(ComparisonBaseMethod):
     """
@@ -288,21 +429,39 @@ class EndsWith(ComparisonBaseMethod):
     variable: str
     comparison_variables: Union[str, List[str]]
 
-    def evaluate(self) -> bool:
-        logger.info(
-            f"Checking if {self.variable} ends with {self.comparison_variables}"
-        )
-        if isinstance(self.comparison_variables, list):
-            return any([self.variable.endswith(v)] for v in self.comparison_variables)
-
-        elif isinstance(self.comparison_variables, str):
-
-            return self.variable.endswith(self.comparison_variables)
+    @classmethod
+    def prepare(cls, comparison_variables: Any) -> Any:
+        # `str.endswith` checks a tuple of needles in one call
+        comparison_variables = cls.coerce(comparison_variables)
+        if _all_strings(comparison_variables):
+            return tuple(comparison_variables)
+        return comparison_variables
+
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} ends with {comparison_variables}")
+        if isinstance(comparison_variables, list):
+            return any(variable.endswith(v) for v in comparison_variables)
+
+        elif isinstance(comparison_variables, (str, tuple)):
+            # a tuple of needles is prepared from a list, see `prepare`
+            return variable.endswith(comparison_variables)
         else:
             raise TypeError(
-                f"Expected str or list as comparison variable, got {type(self.comparison_variables)}"
+                f"Expected str or list as comparison variable, got {type(comparison_variables)}"
             )
 
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        strings = _string_values(variables)
+        if strings is None:
+            return pd.Series(False, index=variables.index)
+        if isinstance(comparison_variables, list):
+            comparison_variables = tuple(comparison_variables)
+        return strings.endswith(comparison_variables, na=False)
+
 
 class ContainsString(ComparisonBaseMethod):
     """
@@ -331,18 +490,47 @@ class ContainsString(ComparisonBaseMethod):
     variable: str
     comparison_variables: Union[str, List[str]]
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking if {self.variable} contains {self.comparison_variables}")
-        if isinstance(self.comparison_variables, list):
-            return any(v in self.variable for v in self.comparison_variables)
-
-        elif isinstance(self.comparison_variables, str):
-            return self.comparison_variables in self.variable
+    @classmethod
+    def prepare(cls, comparison_variables: Any) -> Any:
+        comparison_variables = cls.coerce(comparison_variables)
+        if (
+            _all_strings(comparison_variables)
+            and len(comparison_variables) >= SUBSTRINGS_THRESHOLD
+        ):
+            return Substrings(comparison_variables)
+        return comparison_variables
+
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} contains {comparison_variables}")
+        if isinstance(comparison_variables, Substrings):
+            return comparison_variables.found_in(variable)
+        elif isinstance(comparison_variables, list):
+            return any(v in variable for v in comparison_variables)
+
+        elif isinstance(comparison_variables, str):
+            return comparison_variables in variable
         else:
             raise TypeError(
-                f"Expected str or list as comparison variable, got {type(self.comparison_variables)}"
+                f"Expected str or list as comparison variable, got {type(comparison_variables)}"
             )
 
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        strings = _string_values(variables)
+        if strings is None:
+            return pd.Series(False, index=variables.index)
+        if isinstance(comparison_variables, Substrings):
+            return strings.contains(comparison_variables.pattern, na=False)
+        if isinstance(comparison_variables, str):
+            comparison_variables = [comparison_variables]
+        result = pd.Series(False, index=variables.index)
+        for comp_var in comparison_variables:
+            result |= strings.contains(comp_var, regex=False, na=False)
+        return result
+
 
 class MatchPatterns(ComparisonBaseMethod):
     """
@@ -355,7 +543,7 @@ class MatchPatterns(ComparisonBaseMethod):
         comparison_variables (str): The comparison variable, which represents the pattern to be matched against the input variable.
 
     Methods:
-        evaluate() -> bool: This method evaluates whether the input variable matches the specified pattern. It uses the 're.findall()' function to find all occurrences of the pattern in the input variable. If any matches are found, it returns True; otherwise, it returns False.
+        evaluate() -> bool: This method evaluates whether the input variable matches the specified pattern. It searches the first occurrence of the pattern, compiled once, in the input variable. If a match is found, it returns True; otherwise, it returns False.
 
     Note:
         The 'MatchPatterns' class inherits the 'comparison_method', 'input_variable', and 'comparison_variables' attributes from the 'ComparisonBaseMethod' class. It also overrides the 'evaluate()' method to provide the specific implementation for pattern matching.
@@ -370,11 +558,34 @@ class MatchPatterns(ComparisonBaseMethod):
     variable: str
     comparison_variables: str
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking if {self.variable} matches {self.comparison_variables}")
-        pattern = self.comparison_variables
-        matches = re.findall(pattern, self.variable)
-        return True if matches else False
+    @classmethod
+    def prepare(cls, comparison_variables: Any) -> Any:
+        comparison_variables = cls.coerce(comparison_variables)
+        if isinstance(comparison_variables, str):
+            try:
+                return compiled_pattern(comparison_variables)
+            except re.error:
+                # reported when the rule is evaluated, as the other errors
+                pass
+        return comparison_variables
+
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} matches {comparison_variables}")
+        pattern = comparison_variables
+        if not isinstance(pattern, re.Pattern):
+            pattern = compiled_pattern(pattern)
+        # one match is enough
+        return pattern.search(variable) is not None
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        strings = _string_values(variables)
+        if strings is None:
+            return pd.Series(False, index=variables.index)
+        return strings.contains(comparison_variables, regex=True, na=False)
 
 
 class Within(ComparisonBaseMethod):
@@ -401,9 +612,18 @@ class Within(ComparisonBaseMethod):
     comparison_method: Literal["within"] = "within"
     comparison_variables: Union[List[Any], str]
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking if {self.variable} in {self.comparison_variables}")
-        return self.variable in self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} in {comparison_variables}")
+        return variable in comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        if isinstance(comparison_variables, list):
+            return _isin(variables, comparison_variables)
+        return super().compare_series(variables, comparison_variables)
 
 
 class NotIn(ComparisonBaseMethod):
@@ -428,6 +648,15 @@ class NotIn(ComparisonBaseMethod):
     comparison_method: Literal["not_in"] = "not_in"
     comparison_variables: Union[List[Any], str]
 
-    def evaluate(self) -> bool:
-        logger.info(f"Checking if {self.variable} not in {self.comparison_variables}")
-        return self.variable not in self.comparison_variables
+    @classmethod
+    def compare(cls, variable: Any, comparison_variables: Any) -> bool:
+        logger.info(f"Checking if {variable} not in {comparison_variables}")
+        return variable not in comparison_variables
+
+    @classmethod
+    def compare_series(
+        cls, variables: pd.Series, comparison_variables: Any
+    ) -> pd.Series:
+        if isinstance(comparison_variables, list):
+            return ~_isin(variables, comparison_variables)
+        return super().compare_series(variables, comparison_variables)
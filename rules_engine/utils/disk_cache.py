@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from stat import S_ISDIR
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("bre.disk_cache")
+logger.setLevel("DEBUG")
+
+# bumped when the layout of the cached frames changes
+_FORMAT_VERSION = 4
+_META_FILE = "meta.json"
+# the codes of the missing values of the string columns
+_NONE_CODE = -1
+_NAN_CODE = -2
+# the values of the object columns which are stored as JSON
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+
+def default_cache_dir() -> str:
+    """The `BRE_DISK_CACHE_DIR` environment variable, otherwise the per-user
+    `~/.cache/business_rules_engine` (below `XDG_CACHE_HOME` when it is set)."""
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.getenv(
+        "BRE_DISK_CACHE_DIR", os.path.join(cache_home, "business_rules_engine")
+    )
+
+
+def secure_cache_dir(cache_dir: str) -> bool:
+    """Create the cache directory, readable by the current user only, and tell
+    whether it can be trusted: owned by the current user and not writable by the
+    group or the others."""
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(cache_dir)
+    except OSError as e:
+        logger.warning(f"Cannot create the cache directory {cache_dir}: {e}")
+        return False
+    if not S_ISDIR(stat.st_mode):
+        return False
+    if hasattr(os, "getuid") and (stat.st_uid != os.getuid() or stat.st_mode & 0o022):
+        logger.warning(
+            f"Not using the cache directory {cache_dir}: it is not owned by the "
+            f"current user or it is writable by other users"
+        )
+        return False
+    return True
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20]
+
+
+def _entry_prefix(file_name: str, options: Any) -> str:
+    return _digest(_FORMAT_VERSION, os.path.abspath(file_name), options)
+
+
+def _entry_name(file_name: str, options: Any) -> str:
+    # a new version of the file (mtime or size) gets a new entry
+    stat = os.stat(file_name)
+    return (
+        f"{_entry_prefix(file_name, options)}-"
+        f"{_digest(stat.st_mtime_ns, stat.st_size)}"
+    )
+
+
+def _load_array(file_name: str) -> np.ndarray:
+    # nothing is unpickled, the arrays are memory-mapped
+    return np.load(file_name, mmap_mode="r", allow_pickle=False)
+
+
+def _save_array(file_name: str, values: np.ndarray):
+    np.save(file_name, values, allow_pickle=False)
+
+
+def _save_string_values(values: Any, path: str, name: str):
+    # the UTF-8 bytes of the strings one after another and their end offsets: a
+    # long string does not pad the others, as in a fixed-width unicode array
+    encoded = [value.encode("utf-8", "surrogatepass") for value in values]
+    _save_array(
+        os.path.join(path, f"{name}.npy"),
+        np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    )
+    _save_array(
+        os.path.join(path, f"{name}.offsets.npy"),
+        np.cumsum([len(value) for value in encoded], dtype=np.int64),
+    )
+
+
+def _load_string_values(path: str, name: str) -> np.ndarray:
+    data = _load_array(os.path.join(path, f"{name}.npy")).tobytes()
+    ends = _load_array(os.path.join(path, f"{name}.offsets.npy")).tolist()
+    values = np.empty(len(ends), dtype=object)
+    start = 0
+    for idx, end in enumerate(ends):
+        values[idx] = data[start:end].decode("utf-8", "surrogatepass")
+        start = end
+    return values
+
+
+def _save_strings(column: pd.Series, path: str, idx: int, column_meta: Dict):
+    codes, uniques = pd.factorize(column)
+    codes = codes.astype(np.int32)
+    missing = codes < 0
+    if missing.any():
+        # None and NaN are told apart
+        codes[missing] = np.where(
+            column[missing].map(lambda value: value is None).to_numpy(dtype=bool),
+            _NONE_CODE,
+            _NAN_CODE,
+        )
+    column_meta["strings"] = f"{idx}.strings"
+    _save_string_values(uniques, path, column_meta["strings"])
+    _save_array(os.path.join(path, column_meta["file"]), codes)
+
+
+def _load_strings(codes: np.ndarray, strings: np.ndarray) -> np.ndarray:
+    values = np.full(len(codes), None, dtype=object)
+    present = codes >= 0
+    values[present] = strings[codes[present]]
+    values[codes == _NAN_CODE] = np.nan
+    return values
+
+
+def _is_json_value(value: Any) -> bool:
+    if isinstance(value, (list, dict)):
+        return json.loads(json.dumps(value)) == value
+    return type(value) in _JSON_TYPES
+
+
+def _save_object_column(column: pd.Series, path: str, idx: int, column_meta: Dict):
+    if pd.api.types.infer_dtype(column, skipna=True) in ("string", "empty"):
+        _save_strings(column, path, idx, column_meta)
+        return
+    values = column.tolist()
+    if not all(_is_json_value(value) for value in values):
+        raise TypeError(
+            f"The column {column.name} holds values which cannot be saved without "
+            f"pickling them"
+        )
+    column_meta["file"] = f"{idx}.json"
+    with open(os.path.join(path, column_meta["file"]), "w", encoding="utf-8") as f:
+        json.dump(values, f)
+
+
+def _save_categories(categories: pd.Index, path: str, idx: int, column_meta: Dict):
+    if pd.api.types.is_object_dtype(categories):
+        if pd.api.types.infer_dtype(categories) != "string":
+            raise TypeError("Only string categories can be saved without pickling")
+        column_meta["string_categories"] = f"{idx}.categories"
+        _save_string_values(categories, path, column_meta["string_categories"])
+        return
+    column_meta["categories"] = f"{idx}.categories.npy"
+    _save_array(os.path.join(path, column_meta["categories"]), categories.to_numpy())
+
+
+def save_frame(frame: pd.DataFrame, path: str):
+    """Save the frame as one `.npy` file per column, without pickling anything. The
+    categorical columns are saved as their codes and categories, the string columns
+    the same way, as codes and their UTF-8 strings. The other object columns are
+    saved as JSON, a value JSON cannot hold raises a `TypeError`, and so does a
+    column numpy would pickle (e.g. timezone-aware dates) with a `ValueError`."""
+    os.makedirs(path)
+    columns = []
+    for idx, (name, column) in enumerate(frame.items()):
+        column_meta = {"name": name, "file": f"{idx}.npy"}
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            _save_categories(column.cat.categories, path, idx, column_meta)
+            _save_array(
+                os.path.join(path, column_meta["file"]), column.cat.codes.to_numpy()
+            )
+        elif pd.api.types.is_object_dtype(column):
+            _save_object_column(column, path, idx, column_meta)
+        else:
+            _save_array(os.path.join(path, column_meta["file"]), column.to_numpy())
+        columns.append(column_meta)
+    with open(os.path.join(path, _META_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": _FORMAT_VERSION, "columns": columns, "rows": len(frame)}, f
+        )
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """Load a frame saved by `save_frame`, memory-mapping its numeric columns and
+    the codes of its categorical columns: the pages are shared by all the processes
+    loading the same files."""
+    with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != _FORMAT_VERSION:
+        raise ValueError(f"The frame in {path} has another format")
+    data = {}
+    for column in meta["columns"]:
+        file_name = os.path.join(path, column["file"])
+        if file_name.endswith(".json"):
+            with open(file_name, "r", encoding="utf-8") as f:
+                # the lists of the cells are kept as objects
+                values = pd.Series(json.load(f), dtype=object).to_numpy()
+        else:
+            values = _load_array(file_name)
+        if "categories" in column:
+            values = pd.Categorical.from_codes(
+                values, _load_array(os.path.join(path, column["categories"]))
+            )
+        elif "string_categories" in column:
+            values = pd.Categorical.from_codes(
+                values, _load_string_values(path, column["string_categories"])
+            )
+        elif "strings" in column:
+            values = _load_strings(values, _load_string_values(path, column["strings"]))
+        data[column["name"]] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]), copy=False)
+
+
+def read_through(
+    file_name: str,
+    options: Any,
+    parse: Callable[[], pd.DataFrame],
+    cache_dir: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Return the frame parsed from a local file, from the on-disk cache when the file
+    has not changed since it was cached, otherwise with `parse`, then caching it.
+    The `options` of the parsing (e.g. the columns read) are part of the cache key.
+
+    Example usage:
+        frame = read_through("a.xlsx", None, lambda: pd.read_excel("a.xlsx"))
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    if not secure_cache_dir(cache_dir):
+        return parse()
+    path = os.path.join(cache_dir, _entry_name(file_name, options))
+    if os.path.exists(os.path.join(path, _META_FILE)):
+        try:
+            return load_frame(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot read the cache of {file_name}: {e}")
+    frame = parse()
+    if not isinstance(frame.index, pd.RangeIndex) or frame.index.start != 0:
+        return frame
+    tmp_path = None
+    try:
+        # written aside then renamed, a reader never sees a partial entry
+        tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+        save_frame(frame, os.path.join(tmp_path, "frame"))
+        prefix = _entry_prefix(file_name, options)
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(prefix):
+                # the entries of the previous versions of the file
+                shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+        os.replace(os.path.join(tmp_path, "frame"), path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Cannot cache {file_name}: {e}")
+    finally:
+        if tmp_path is not None:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return frame
@@ -0,0 +1,216 @@
+import ast
+import datetime
+from typing import Any, Callable, Collection, Dict, Optional, Set
+
+from .literals import (
+    BINARY_OPERATORS,
+    NAMED_CONSTANTS,
+    SAFE_FUNCTIONS,
+    UNARY_OPERATORS,
+    UnsupportedLiteral,
+    check_operands,
+    fold_constant,
+    function_name,
+)
+
+# the methods an expression can call on its values, e.g. `${name}.strip()`
+SAFE_METHODS = frozenset(
+    {
+        "capitalize",
+        "count",
+        "endswith",
+        "find",
+        "join",
+        "lower",
+        "lstrip",
+        "replace",
+        "rstrip",
+        "split",
+        "startswith",
+        "strip",
+        "title",
+        "upper",
+        "zfill",
+    }
+)
+
+
+def _clock(function: Callable) -> Callable:
+    # called from a frame of this module: the expressions have no builtins, with
+    # which some of the datetime functions import the `time` module
+    def call(*args, **kwargs):
+        return function(*args, **kwargs)
+
+    return call
+
+
+# the functions of the `datetime` module whose result depends on when they are
+# called, an expression calling them is evaluated at each evaluation of the rules
+CLOCK_FUNCTIONS: Dict[str, Callable] = {
+    "datetime.date.today": _clock(datetime.date.today),
+    "datetime.datetime.now": _clock(datetime.datetime.now),
+    "datetime.datetime.today": _clock(datetime.datetime.today),
+    "datetime.datetime.utcnow": _clock(datetime.datetime.utcnow),
+}
+# the names the calls of the clock functions are compiled to
+_CLOCK_NAMES = {name: f"_{name.replace('.', '_')}" for name in CLOCK_FUNCTIONS}
+COMPARISON_OPERATORS = (
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.In,
+    ast.NotIn,
+)
+
+# no builtins, only the whitelisted functions
+_GLOBALS: Dict[str, Any] = {
+    "__builtins__": {},
+    "datetime": datetime,
+    **SAFE_FUNCTIONS,
+    **{_CLOCK_NAMES[name]: function for name, function in CLOCK_FUNCTIONS.items()},
+}
+
+
+def _constant(node: ast.AST) -> Any:
+    # the value of a constant operand, None when it depends on the names
+    try:
+        return fold_constant(node)
+    except (UnsupportedLiteral, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    # e.g. `datetime.datetime.now` for the function of `datetime.datetime.now()`
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = _dotted_name(node.value)
+        return f"{prefix}.{node.attr}" if prefix else None
+    return None
+
+
+def datetime_calls(source: str) -> Set[str]:
+    """The names of the functions of the `datetime` module called by the source,
+    e.g. `{"datetime.datetime.now"}` for `datetime.datetime.now()`."""
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name and name.startswith("datetime."):
+                names.add(name)
+    return names
+
+
+class _BindClockFunctions(ast.NodeTransformer):
+    def visit_Call(self, node: ast.Call) -> ast.Call:
+        self.generic_visit(node)
+        name = _dotted_name(node.func)
+        if name in CLOCK_FUNCTIONS:
+            node.func = ast.copy_location(
+                ast.Name(id=_CLOCK_NAMES[name], ctx=ast.Load()), node.func
+            )
+        return node
+
+
+class Expression:
+    """
+    A Python expression of a rule (e.g. `max(_ref_0, _ref_1) * 2`) checked against
+    the whitelisted operations and compiled once into a code object. Only the given
+    `names`, the whitelisted functions (see `literals.SAFE_FUNCTIONS`), the datetime
+    constructors, the `CLOCK_FUNCTIONS` and the string methods of `SAFE_METHODS` can
+    be used.
+
+    Example usage:
+        expression = Expression("max(a, b) + 1", ["a", "b"])
+        expression.evaluate({"a": 1, "b": 2})  # 3
+    """
+
+    __slots__ = ("source", "names", "code")
+
+    def __init__(self, source: str, names: Collection[str]):
+        self.source = source
+        self.names = frozenset(names)
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError as e:
+            raise UnsupportedLiteral(f"invalid expression {source}: {e.msg}")
+        self._check(tree.body)
+        tree = ast.fix_missing_locations(_BindClockFunctions().visit(tree))
+        self.code = compile(tree, "<expression>", "eval")
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+    def __reduce__(self):
+        # a code object cannot be pickled, it is compiled again when unpickled
+        return Expression, (self.source, tuple(sorted(self.names)))
+
+    def _check(self, node: ast.AST):
+        if isinstance(node, ast.Constant):
+            return
+        if isinstance(node, ast.Name):
+            if node.id not in self.names and node.id not in NAMED_CONSTANTS:
+                raise UnsupportedLiteral(f"unknown name {node.id} in {self.source}")
+            return
+        if isinstance(node, ast.Call):
+            if _dotted_name(node.func) in CLOCK_FUNCTIONS:
+                pass
+            elif (
+                isinstance(node.func, ast.Attribute) and node.func.attr in SAFE_METHODS
+            ):
+                self._check(node.func.value)
+            else:
+                function_name(node.func)
+            for arg in node.args:
+                if isinstance(arg, ast.Starred):
+                    raise UnsupportedLiteral(f"*args in {self.source}")
+                self._check(arg)
+            for keyword in node.keywords:
+                if keyword.arg is None:
+                    raise UnsupportedLiteral(f"**kwargs in {self.source}")
+                self._check(keyword.value)
+            return
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPERATORS:
+                raise UnsupportedLiteral(f"operator {ast.dump(node.op)}")
+            check_operands(node.op, _constant(node.left), _constant(node.right))
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in UNARY_OPERATORS:
+                raise UnsupportedLiteral(f"operator {ast.dump(node.op)}")
+        elif isinstance(node, ast.Compare):
+            if not all(isinstance(op, COMPARISON_OPERATORS) for op in node.ops):
+                raise UnsupportedLiteral(f"comparison in {self.source}")
+        elif isinstance(node, ast.Subscript):
+            if not isinstance(node.ctx, ast.Load):
+                raise UnsupportedLiteral(f"assignment in {self.source}")
+        elif not isinstance(
+            node,
+            (
+                ast.BoolOp,
+                ast.IfExp,
+                ast.List,
+                ast.Tuple,
+                ast.Set,
+                ast.Dict,
+                ast.Slice,
+                ast.JoinedStr,
+                ast.FormattedValue,
+                ast.boolop,
+                ast.expr_context,
+            ),
+        ):
+            raise UnsupportedLiteral(f"{type(node).__name__} in {self.source}")
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.operator, ast.unaryop, ast.cmpop)):
+                continue
+            self._check(child)
+
+    def evaluate(self, values: Dict[str, Any]) -> Any:
+        return eval(self.code, _GLOBALS, values)
@@ -0,0 +1,159 @@
+import threading
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+def _build_index(column: pd.Series) -> Optional[Dict[Any, np.ndarray]]:
+    if pd.api.types.is_datetime64_any_dtype(
+        column
+    ) or pd.api.types.is_timedelta64_dtype(column):
+        # pandas compares these columns with parsed strings, keep the plain scan
+        return None
+    try:
+        codes, uniques = pd.factorize(column)
+    except TypeError:
+        # unhashable cells, e.g. lists
+        return None
+    # the missing values (code -1) never compare equal, they are left out
+    order = np.argsort(codes, kind="stable")
+    order = order[np.count_nonzero(codes < 0) :]
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    return dict(zip(uniques.tolist(), np.split(order, np.cumsum(counts)[:-1])))
+
+
+class ExtDataTable:
+    """
+    An external data frame with hash indexes (value -> row positions) built on its
+    columns the first time they are looked up. Looking a value up costs a dict access
+    instead of a comparison of the whole column.
+
+    The table can be created with a `load` function instead of a frame, the frame is
+    then loaded the first time it is used. When `load` returns another table (e.g. a
+    cached one), its frame and its indexes are shared.
+
+    Example usage:
+        table = ExtDataTable(pd.DataFrame({"Name": ["a", "b", "a"]}))
+        table.lookup("Name", "a")  # array([0, 2])
+    """
+
+    __slots__ = ("_frame", "_load", "_lock", "indexes")
+
+    def __init__(
+        self,
+        frame: Optional[pd.DataFrame] = None,
+        load: Optional[Callable[[], Union[pd.DataFrame, "ExtDataTable"]]] = None,
+    ):
+        if frame is None and load is None:
+            raise ValueError("One of `frame` and `load` has to be provided.")
+        self._frame = frame
+        self._load = load
+        self._lock = threading.Lock()
+        self.indexes: Dict[str, Optional[Dict[Any, np.ndarray]]] = {}
+
+    def __getstate__(self):
+        if getattr(self._load, "reloadable", False):
+            # the receiving process loads the data itself, e.g. from shared memory
+            return None, self._load, {}
+        return self._frame, self._load, self.indexes
+
+    def __setstate__(self, state):
+        self._frame, self._load, self.indexes = state
+        self._lock = threading.Lock()
+
+    @property
+    def load(self) -> Optional[Callable[[], pd.DataFrame]]:
+        return self._load
+
+    def renewed(self) -> Optional["ExtDataTable"]:
+        """A table for the latest version of a reloadable data, None when the table
+        is up to date."""
+        if not getattr(self._load, "reloadable", False) or not self._load.is_stale():
+            return None
+        return ExtDataTable(load=self._load.renewed())
+
+    @property
+    def loaded(self) -> bool:
+        return self._frame is not None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    loaded = self._load()
+                    if isinstance(loaded, ExtDataTable):
+                        self.indexes = loaded.indexes
+                        loaded = loaded.frame
+                    self._frame = loaded
+        return self._frame
+
+    def index(self, column: str) -> Optional[Dict[Any, np.ndarray]]:
+        """The index of the column, None when the column cannot be indexed."""
+        if column not in self.indexes:
+            # building the same index twice from two threads is harmless
+            self.indexes[column] = _build_index(self.frame[column])
+        return self.indexes[column]
+
+    def lookup(self, column: str, value: Any) -> Optional[np.ndarray]:
+        """
+        The sorted positions of the rows where `column == value`, None when the
+        answer cannot be taken from an index (unhashable value or column) and the
+        column has to be scanned.
+        """
+        index = self.index(column)
+        if index is None:
+            return None
+        try:
+            return index.get(value, _NO_ROWS)
+        except TypeError:
+            return None
+
+    def select(
+        self, column: str, value: Any, selection: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Narrow a selection of rows (all the rows when None) to the rows where
+        `column == value`. The frame itself is never filtered or copied.
+        """
+        positions = self.lookup(column, value)
+        if positions is None:
+            matches = np.flatnonzero(
+                (self.column(column, selection) == value).to_numpy()
+            )
+            return matches if selection is None else selection[matches]
+        if selection is None:
+            return positions
+        return np.intersect1d(selection, positions, assume_unique=True)
+
+    def column(self, column: str, selection: Optional[np.ndarray] = None) -> pd.Series:
+        """The values of the column for the selected rows."""
+        if selection is None:
+            return self.frame[column]
+        return self.frame[column].iloc[selection]
+
+    def first(self, column: str, selection: Optional[np.ndarray] = None) -> Any:
+        """The value of the column for the first selected row, None when no row is
+        selected."""
+        if selection is None:
+            return self.frame[column].values[0] if len(self.frame) else None
+        return self.frame[column].values[selection[0]] if len(selection) else None
+
+
+class ExtDataFrames(Mapping):
+    """The frames of external data tables by name, loaded when they are accessed."""
+
+    def __init__(self, tables: Dict[str, ExtDataTable]):
+        self.tables = tables
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        return self.tables[name].frame
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tables)
+
+    def __len__(self) -> int:
+        return len(self.tables)
@@ -3,6 +3,9 @@ from logging import root
 import mimetypes
 import os
 import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -12,6 +15,12 @@ from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 
 SCOPES = ["https://www.googleapis.com/auth/drive"]
+SPREADSHEET_MIMETYPE = "application/vnd.google-apps.spreadsheet"
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# seconds a file found by name is reused before being searched again
+FILE_ID_TTL = 300.0
+# size of the chunks streamed by `open_file`
+CHUNK_SIZE = 8 * 1024**2
 gdrive_folder = os.path.join(os.getcwd(), "gdrive")
 os.makedirs(gdrive_folder, exist_ok=True)
 
@@ -21,6 +30,13 @@ credentials_file = os.path.join(gdrive_folder, "credentials.json")
 logger = logging.getLogger("business_engine.gdrive_utils")
 logger.setLevel(logging.DEBUG)
 
+_credentials = None
+_credentials_lock = threading.Lock()
+# the service objects are not thread-safe, one per thread
+_local = threading.local()
+# (name, mimetype) -> (search time, file)
+_files: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+
 
 def get_credentials():
     creds = None
@@ -45,67 +61,128 @@ def get_credentials():
     return creds
 
 
+def get_service():
+    """The Drive API client of the thread, built once. The credentials are read
+    from disk once for the process, they are refreshed when they expire."""
+    global _credentials
+    service = getattr(_local, "service", None)
+    if service is None:
+        if _credentials is None:
+            with _credentials_lock:
+                if _credentials is None:
+                    _credentials = get_credentials()
+        service = build("drive", "v3", credentials=_credentials, cache_discovery=False)
+        _local.service = service
+    return service
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
 def search_file(filename: str, mimetype: str):
-    """Search file in drive location"""
+    """Search file in drive location, the file found is cached for `FILE_ID_TTL`
+    seconds"""
+    key = (filename, mimetype)
+    cached = _files.get(key)
+    if cached is not None and time.monotonic() - cached[0] < FILE_ID_TTL:
+        return cached[1]
     try:
-        # create drive api client
-        service = build("drive", "v3", credentials=get_credentials())
-        page_token = None
-        while True:
-            # pylint: disable=maybe-no-member
-            response = (
-                service.files()
-                .list(
-                    q=f"mimeType='{mimetype}'",
-                    spaces="drive",
-                    fields="nextPageToken, " "files(id, name)",
-                    pageToken=page_token,
-                )
-                .execute()
+        # pylint: disable=maybe-no-member
+        response = (
+            get_service()
+            .files()
+            .list(
+                q=(
+                    f"name='{_quote(filename)}' and mimeType='{_quote(mimetype)}' "
+                    "and trashed=false"
+                ),
+                spaces="drive",
+                fields="files(id, name, mimeType)",
+                pageSize=1,
             )
-            for file in response.get("files", []):
-                if file.get("name") == filename:
-                    return file
-            page_token = response.get("nextPageToken", None)
-            if page_token is None:
-                break
+            .execute()
+        )
+        for file in response.get("files", []):
+            _files[key] = (time.monotonic(), file)
+            return file
 
     except HttpError as error:
         print(f"An error occurred: {error}")
     return None
 
 
-def download_file(file) -> str:
+def forget_file(filename: str, mimetype: str):
+    """Search the file again on the next `search_file`, e.g. when it was replaced."""
+    _files.pop((filename, mimetype), None)
+
+
+def _media_request(file):
+    file_mimetype = file.get("mimeType") or SPREADSHEET_MIMETYPE
+    # pylint: disable=maybe-no-member
+    if file_mimetype == SPREADSHEET_MIMETYPE:
+        return (
+            get_service()
+            .files()
+            .export_media(fileId=file.get("id"), mimeType=XLSX_MIMETYPE)
+        )
+    return get_service().files().get_media(fileId=file.get("id"))
+
+
+class DriveFileReader(io.RawIOBase):
+    """
+    A file object downloading a Drive file chunk by chunk as it is read, so that
+    a parser consumes the file while it is downloaded. The Google spreadsheets are
+    exported as `.xlsx` workbooks.
+
+    Example usage:
+        df = pd.read_csv(open_file(search_file("a.csv", "text/csv")))
+    """
+
+    def __init__(self, file, chunksize: Optional[int] = None):
+        chunksize = chunksize or CHUNK_SIZE
+        self.name = file.get("name")
+        self.chunksize = chunksize
+        self._chunk = io.BytesIO()
+        self._downloader = MediaIoBaseDownload(
+            self._chunk, _media_request(file), chunksize=chunksize
+        )
+        self._pending = memoryview(b"")
+        self._done = False
+        # the first chunk is requested at once, a missing file fails here
+        self._next_chunk()
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_chunk(self):
+        status, self._done = self._downloader.next_chunk()
+        if status is not None:
+            logger.debug(f"Download {int(status.progress() * 100)}.")
+        self._pending = memoryview(self._chunk.getvalue())
+        self._chunk.seek(0)
+        self._chunk.truncate()
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            self._next_chunk()
+        length = min(len(buffer), len(self._pending))
+        buffer[:length] = self._pending[:length]
+        self._pending = self._pending[length:]
+        return length
+
+
+def open_file(file, chunksize: Optional[int] = None) -> io.BufferedReader:
+    """Open a file found by `search_file` for streaming, see `DriveFileReader`."""
+    reader = DriveFileReader(file, chunksize)
+    return io.BufferedReader(reader, buffer_size=reader.chunksize)
+
+
+def download_file(file) -> bytes:
     """Downloads a file
     Args:
-        file_id: ID of the file to download
-    Returns : IO object with location.
+        file: the file to download, found by `search_file`
+    Returns : the content of the file.
     """
-    filename = file.get("name")
-    file_id = file.get("id")
-    file_mimetype = file.get("mimeType")
-    if file_mimetype is None:
-        file_mimetype = "application/vnd.google-apps.spreadsheet"
-    # create drive api client
-    service = build("drive", "v3", credentials=get_credentials())
-    # pylint: disable=maybe-no-member
-    if file_mimetype == "application/vnd.google-apps.spreadsheet":
-        request = service.files().export_media(
-            fileId=file_id,
-            mimeType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    else:
-        request = service.files().get_media(fileId=file_id)
-    file = io.BytesIO()
-    downloader = MediaIoBaseDownload(file, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-        logger.debug(f"Download {int(status.progress() * 100)}.")
-
-    extension = mimetypes.guess_extension(file_mimetype)
-    target = os.path.join(gdrive_folder, f"{filename}.{extension}")
-    # with open(target, 'wb') as f:
-    #     f.write(file.getvalue())
-
-    return file.getvalue()
+    with open_file(file) as reader:
+        return reader.read()
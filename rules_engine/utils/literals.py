@@ -0,0 +1,157 @@
+import ast
+import copy
+import datetime
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+# the functions a literal (and an expression, see `expressions`) can call
+SAFE_FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs,
+    "bool": bool,
+    "float": float,
+    "int": int,
+    "len": len,
+    "max": max,
+    "min": min,
+    "round": round,
+    "str": str,
+    "sum": sum,
+}
+# the constructors of the `datetime` module, e.g. `datetime.datetime(2024, 3, 11)`
+DATETIME_FUNCTIONS: Dict[str, Callable] = {
+    "date": datetime.date,
+    "datetime": datetime.datetime,
+    "time": datetime.time,
+    "timedelta": datetime.timedelta,
+}
+NAMED_CONSTANTS: Dict[str, Any] = {"True": True, "False": False, "None": None}
+
+BINARY_OPERATORS: Dict[type, Callable] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS: Dict[type, Callable] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Not: operator.not_,
+}
+# a larger exponent is not folded, e.g. `9**9**9` would never end
+MAX_EXPONENT = 256
+# the longest string or list folded from a repetition, e.g. `'a' * 10**9`
+MAX_REPEAT = 10000
+
+
+class UnsupportedLiteral(ValueError):
+    pass
+
+
+def function_name(node: ast.AST) -> str:
+    """The name of a called function, `datetime.<name>` for the datetime
+    constructors, which must be one of the whitelisted functions."""
+    if isinstance(node, ast.Name) and node.id in SAFE_FUNCTIONS:
+        return node.id
+    if (
+        isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == "datetime"
+        and node.attr in DATETIME_FUNCTIONS
+    ):
+        return f"datetime.{node.attr}"
+    raise UnsupportedLiteral(ast.dump(node))
+
+
+def get_function(name: str) -> Callable:
+    if name.startswith("datetime."):
+        return DATETIME_FUNCTIONS[name[len("datetime.") :]]
+    return SAFE_FUNCTIONS[name]
+
+
+def check_operands(op: ast.operator, left: Any, right: Any):
+    """Refuse the operations whose result would be too large to compute."""
+    if isinstance(op, ast.Pow):
+        if isinstance(right, (int, float)) and abs(right) > MAX_EXPONENT:
+            raise UnsupportedLiteral(f"exponent {right}")
+    elif isinstance(op, ast.Mult):
+        for sequence, times in ((left, right), (right, left)):
+            if (
+                isinstance(sequence, (str, bytes, list, tuple))
+                and isinstance(times, int)
+                and len(sequence) * times > MAX_REPEAT
+            ):
+                raise UnsupportedLiteral(f"repetition of {times}")
+
+
+def fold_constant(node: ast.AST) -> Any:
+    """Evaluate the node of a constant expression, the node types which are not
+    whitelisted raise `UnsupportedLiteral`."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in NAMED_CONSTANTS:
+        return NAMED_CONSTANTS[node.id]
+    if isinstance(node, ast.List):
+        return [fold_constant(element) for element in node.elts]
+    if isinstance(node, ast.Tuple):
+        return tuple(fold_constant(element) for element in node.elts)
+    if isinstance(node, ast.Set):
+        return {fold_constant(element) for element in node.elts}
+    if isinstance(node, ast.Dict) and None not in node.keys:
+        return {
+            fold_constant(key): fold_constant(value)
+            for key, value in zip(node.keys, node.values)
+        }
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](fold_constant(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = fold_constant(node.left), fold_constant(node.right)
+        check_operands(node.op, left, right)
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.Call):
+        function = get_function(function_name(node.func))
+        args = [fold_constant(arg) for arg in node.args]
+        kwargs = {
+            keyword.arg: fold_constant(keyword.value) for keyword in node.keywords
+        }
+        if None in kwargs:
+            raise UnsupportedLiteral("**kwargs")
+        return function(*args, **kwargs)
+    raise UnsupportedLiteral(ast.dump(node))
+
+
+@lru_cache(maxsize=8192)
+def _parse_literal(text: str) -> Any:
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError:
+        return text
+    try:
+        return fold_constant(tree.body)
+    except (UnsupportedLiteral, TypeError, ValueError, ArithmeticError):
+        # e.g. a plain word, which is a name in Python
+        return text
+
+
+def parse_literal(value: Any) -> Any:
+    """
+    The value of a literal of a rule: numbers, quoted strings, lists, dicts,
+    `True`/`False`/`None`, `datetime.datetime(...)` and `datetime.date(...)` calls,
+    and the arithmetic and whitelisted function calls on them, folded into their
+    result. The strings which are not such literals, and the numeric strings, are
+    kept as they are. The results are memoized, the mutable ones are copied.
+
+    Example usage:
+        parse_literal("datetime.datetime(2024, 3, 11)")  # datetime(2024, 3, 11, 0, 0)
+        parse_literal("[1, 2.5, 'a']")  # [1, 2.5, "a"]
+        parse_literal("test")  # "test"
+    """
+    if not isinstance(value, str) or value.isnumeric():
+        return value
+    literal = _parse_literal(value)
+    if isinstance(literal, (list, dict, set)):
+        return copy.deepcopy(literal)
+    return literal
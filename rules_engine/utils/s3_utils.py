@@ -1,10 +1,105 @@
+import io
+import logging
 import os
+import threading
 import boto3
-from botocore.exceptions import NoCredentialsError, BotoCoreError
+from botocore.config import Config
+from botocore.exceptions import ClientError, NoCredentialsError, BotoCoreError
 from urllib.parse import urlparse
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 import backoff
 
+logger = logging.getLogger("bre.s3_utils")
+logger.setLevel("DEBUG")
+
+# size of the ranged GETs of `S3RangeReader`
+DEFAULT_RANGE_SIZE = 8 * 1024**2
+
+# (access key, secret key, endpoint url) -> client, boto3 clients are thread-safe
+_clients: Dict[Tuple[Optional[str], ...], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """The S3 client of the process, created once for the current credentials and
+    reused by every call (with its connection pool)."""
+    key = (
+        os.getenv("AWS_ACCESS_KEY_ID"),
+        os.getenv("AWS_SECRET_ACCESS_KEY"),
+        os.getenv("AWS_ENDPOINT_URL"),
+    )
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                # a session per client, the default session is not thread-safe
+                client = boto3.session.Session().client(
+                    "s3",
+                    aws_access_key_id=key[0],
+                    aws_secret_access_key=key[1],
+                    endpoint_url=key[2],
+                    config=Config(max_pool_connections=16),
+                )
+                _clients[key] = client
+    return client
+
+
+def _is_not_modified(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("304", "NotModified")
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    A file object reading an S3 object with ranged GETs of at most `range_size`
+    bytes, so that a parser consuming it holds one range at a time and a failed
+    read only retries its range. The ranges are read with `If-Match` on the ETag:
+    the object cannot change while it is read.
+
+    Example usage:
+        reader = io.BufferedReader(S3RangeReader(client, "bucket", "a.csv", size, etag))
+        df = pd.read_csv(reader)
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        file_name: str,
+        size: int,
+        etag: str,
+        range_size: int = DEFAULT_RANGE_SIZE,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.file_name = file_name
+        self.size = size
+        self.etag = etag
+        self.range_size = range_size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    @backoff.on_exception(backoff.expo, BotoCoreError, max_time=10)
+    def _get_range(self, start: int, end: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.file_name,
+            Range=f"bytes={start}-{end}",
+            IfMatch=self.etag,
+        )
+        return response["Body"].read()
+
+    def readinto(self, buffer) -> int:
+        if self.position >= self.size:
+            return 0
+        length = min(len(buffer), self.range_size, self.size - self.position)
+        data = self._get_range(self.position, self.position + length - 1)
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
 
 def get_file_from_s3(bucket: str, file_name: str) -> Union[bytes, None]:
     """
@@ -19,11 +114,7 @@ def get_file_from_s3(bucket: str, file_name: str) -> Union[bytes, None]:
     """
 
     # Get the S3 client
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
+    s3 = get_client()
 
     # Try to retrieve the file from S3 for 10 seconds
     @backoff.on_exception(backoff.expo, BotoCoreError, max_time=10)
@@ -40,3 +131,57 @@ def get_file_from_s3(bucket: str, file_name: str) -> Union[bytes, None]:
         print(f"An error occurred while retrieving the attachment: {e}")
 
     return None
+
+
+def open_file_from_s3_if_changed(
+    bucket: str,
+    file_name: str,
+    etag: Optional[str] = None,
+    range_size: Optional[int] = None,
+) -> Tuple[Optional[io.RawIOBase], Optional[str]]:
+    """
+    Open a file of Amazon S3 for streaming unless its ETag is still `etag`, with a
+    conditional request.
+
+    Parameters:
+        range_size (int, optional): read the file with ranged GETs of this size
+            (see `S3RangeReader`) instead of one streamed GET.
+
+    Returns:
+        A readable file object and the ETag of the file, the file object is None
+        when the file has not changed. Both are None when the file cannot be
+        retrieved.
+    """
+    s3 = get_client()
+    kwargs = {"Bucket": bucket, "Key": file_name}
+    if etag:
+        kwargs["IfNoneMatch"] = etag
+
+    @backoff.on_exception(backoff.expo, BotoCoreError, max_time=10)
+    def _open():
+        if range_size:
+            response = s3.head_object(**kwargs)
+            reader = S3RangeReader(
+                s3,
+                bucket,
+                file_name,
+                response["ContentLength"],
+                response["ETag"],
+                range_size,
+            )
+            return io.BufferedReader(reader, buffer_size=range_size), response["ETag"]
+        response = s3.get_object(**kwargs)
+        return response["Body"], response.get("ETag")
+
+    try:
+        return _open()
+    except ClientError as e:
+        if _is_not_modified(e):
+            return None, etag
+        logger.error(f"Cannot retrieve s3://{bucket}/{file_name}: {e}")
+    except NoCredentialsError:
+        logger.error(f"No AWS credentials to retrieve s3://{bucket}/{file_name}")
+    except BotoCoreError:
+        logger.exception(f"Cannot retrieve s3://{bucket}/{file_name}")
+
+    return None, None
@@ -1,6 +1,7 @@
 from pydantic import Field
 from pydantic.type_adapter import TypeAdapter
-from typing import Annotated, Union
+from typing import Annotated, Dict, Type, Union, get_args
+from .base import TransfBaseMethod
 from .methods import *
 
 TransformationMethod = Union[Set, Append, Format]
@@ -12,3 +13,16 @@ TransformationMethodAdapter = TypeAdapter(
 
 def parse_transformation_method(method_info: dict) -> TransformationMethod:
     return TransformationMethodAdapter.validate_python(method_info)
+
+
+TRANSFORMATION_METHODS: Dict[str, Type[TransfBaseMethod]] = {
+    method.model_fields["transformation_method"].default: method
+    for method in get_args(TransformationMethod)
+}
+
+
+def get_transformation_method(transformation_method: str) -> Type[TransfBaseMethod]:
+    try:
+        return TRANSFORMATION_METHODS[transformation_method]
+    except KeyError:
+        raise ValueError(f"Unknown transformation method: {transformation_method}")
@@ -1,3 +1,8 @@
+import copy
+import math
+
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel
 from typing import Any, Dict, Literal
 
@@ -5,10 +10,47 @@ from typing import Any, Dict, Literal
 TransformationMethodsType = Literal["set", "append", "format"]
 
 
+def _is_missing(value: Any) -> bool:
+    # a cell of a column that was not set for the record
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
 class TransfBaseMethod(BaseModel):
     transformation_method: TransformationMethodsType
     variable: str
     target_value: Any
 
-    def apply(self, process_variables: Dict) -> Any:
+    @classmethod
+    def transform(
+        cls, process_variables: Dict, variable: str, target_value: Any
+    ) -> Dict:
         raise NotImplementedError
+
+    @classmethod
+    def transform_frame(
+        cls, frame: pd.DataFrame, mask: pd.Series, variable: str, target_value: Any
+    ) -> None:
+        """Apply `transform` in place to the `variable` column of the rows selected by
+        the mask. `target_value` is either a constant or a Series aligned with the
+        frame. Subclasses override it with vectorised pandas operations, the default
+        transforms the rows one by one."""
+        positions = np.flatnonzero(mask.to_numpy())
+        if not positions.size:
+            return
+        if variable in frame.columns:
+            values = frame[variable].to_numpy(dtype=object, copy=True)
+        else:
+            values = np.full(len(frame), None, dtype=object)
+        if isinstance(target_value, pd.Series):
+            target_values = target_value.to_numpy(dtype=object)[positions]
+        else:
+            target_values = [target_value] * positions.size
+        for position, target in zip(positions, target_values):
+            value = values[position]
+            # the cells are copied so that the input records are left untouched
+            row = {} if _is_missing(value) else {variable: copy.copy(value)}
+            values[position] = cls.transform(row, variable, target).get(variable)
+        frame[variable] = values
+
+    def apply(self, process_variables: Dict) -> Dict:
+        return self.transform(process_variables, self.variable, self.target_value)
@@ -0,0 +1,106 @@
+import datetime
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
+# the date formats parsed locally, in order. The formats which are ambiguous are
+# read day first. The ISO 8601 dates and datetimes are parsed before these.
+INPUT_DATE_FORMATS = (
+    "%d.%m.%Y",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%y",
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d-%m-%Y",
+    "%d-%m-%Y %H:%M",
+    "%d-%m-%Y %H:%M:%S",
+    "%Y/%m/%d",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y.%m.%d",
+    "%d %B %Y",
+    "%d %b %Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> Optional[datetime.datetime]:
+    """The datetime of a string date, None when it has none of the known formats."""
+    value = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    for date_format in INPUT_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=4096)
+def format_date(value: str, output_format: str) -> Optional[str]:
+    """
+    Convert a string date to `output_format`, None when the date cannot be parsed.
+
+    Example usage:
+        format_date("13.03.2024", "%Y%m%d")  # "20240313"
+    """
+    parsed = parse_date(value)
+    if parsed is None:
+        return None
+    return parsed.strftime(output_format)
+
+
+@dataclass(frozen=True)
+class NumberFormat:
+    """The separators of the numbers of a locale, applied without `setlocale`."""
+
+    decimal_point: str = "."
+    thousands_sep: str = ""
+    precision: int = 2
+
+    def format(self, value: float, grouping: bool = False) -> str:
+        """
+        Format the number like `locale.format_string(f"%.{precision}f", value,
+        grouping)` with the locale set.
+
+        Example usage:
+            get_number_format("de_DE.UTF-8").format(1234.5)  # "1234,50"
+        """
+        separator = "," if grouping else ""
+        formatted = f"{value:{separator}.{self.precision}f}"
+        return formatted.translate(
+            {ord(","): self.thousands_sep, ord("."): self.decimal_point}
+        )
+
+
+# language and territory -> separators of the numbers
+LOCALE_NUMBER_FORMATS: Dict[str, NumberFormat] = {
+    "C": NumberFormat(),
+    "POSIX": NumberFormat(),
+    "en_US": NumberFormat(".", ","),
+    "en_GB": NumberFormat(".", ","),
+    "de_DE": NumberFormat(",", "."),
+    "de_AT": NumberFormat(",", " "),
+    "de_CH": NumberFormat(".", "'"),
+    "fr_FR": NumberFormat(",", "\u202f"),
+    "fr_CH": NumberFormat(",", "\u202f"),
+    "it_IT": NumberFormat(",", "."),
+    "it_CH": NumberFormat(".", "'"),
+    "es_ES": NumberFormat(",", "."),
+    "nl_NL": NumberFormat(",", "."),
+    "pt_PT": NumberFormat(",", " "),
+    "pt_BR": NumberFormat(",", "."),
+}
+
+
+@lru_cache(maxsize=256)
+def get_number_format(locale_name: str) -> Optional[NumberFormat]:
+    """The number format of a locale name such as `de_DE.UTF-8`, None when the
+    locale is unknown."""
+    return LOCALE_NUMBER_FORMATS.get(locale_name.split(".")[0].split("@")[0])
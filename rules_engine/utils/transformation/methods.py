@@ -2,11 +2,15 @@ import logging
 import datetime
 import requests
 import json
-import locale
 import os
 
-from typing import Dict, List, Literal
-from .base import TransfBaseMethod
+import numpy as np
+import pandas as pd
+
+from typing import Any, Dict, Literal
+from .base import TransfBaseMethod, _is_missing
+from .converters import format_date, get_number_format
+from ..accessors import get_variable_path
 
 
 logger = logging.getLogger("bre.transformation")
@@ -40,28 +44,37 @@ class Set(TransfBaseMethod):
 
     transformation_method: Literal["set"] = "set"
 
-    def apply(self, process_variables: Dict) -> Dict:
-        logger.info(f"Setting {self.variable} equal to {self.target_value}")
-
-        keys: List[str] = self.variable.split(".")
-        temp = process_variables
-        for key in keys[:-1]:  # Navigate through all keys but the last
-            if "[" in key:
-                key_ = key[: key.index("[")]
-                index = int(key[key.index("[") + 1 : -1])
-                temp = temp[key_].__getitem__(index)
-            else:
-                if key not in temp and not key.isnumeric():
-                    # Initialize a new dict if the key doesn't exist at this level
-                    temp[key] = {}
-                if key.isnumeric():
-                    temp = temp[int(key)]
-                else:
-                    temp = temp[key]  # Move deeper into the nested dict
-        # Set the value for the last key
-        temp[keys[-1]] = self.target_value
-
-        return process_variables
+    @classmethod
+    def transform(
+        cls, process_variables: Dict, variable: str, target_value: Any
+    ) -> Dict:
+        logger.info(f"Setting {variable} equal to {target_value}")
+
+        return get_variable_path(variable).set(process_variables, target_value)
+
+    @classmethod
+    def transform_frame(
+        cls, frame: pd.DataFrame, mask: pd.Series, variable: str, target_value: Any
+    ) -> None:
+        if isinstance(target_value, (list, dict, tuple, set)):
+            # containers cannot be broadcast by pandas
+            return super().transform_frame(frame, mask, variable, target_value)
+        if variable not in frame.columns:
+            frame[variable] = pd.Series(None, index=frame.index, dtype=object)
+        if isinstance(target_value, pd.Series):
+            target_value = target_value[mask]
+        frame.loc[mask, variable] = target_value
+
+
+def _appended(value: Any, target_value: Any) -> Any:
+    # same as VariablePath.append on a single cell, without modifying the cell
+    if value.__class__ is list:
+        return value + [target_value]
+    elif value.__class__ is str:
+        return f"{value}\n{target_value}" if value else str(target_value)
+    elif _is_missing(value):
+        return [target_value] if isinstance(target_value, list) else str(target_value)
+    return value
 
 
 class Append(TransfBaseMethod):
@@ -85,29 +98,39 @@ class Append(TransfBaseMethod):
 
     transformation_method: Literal["append"] = "append"
 
-    def apply(self, process_variables: Dict) -> Dict:
-        logger.info(f"Appending {self.target_value} to {self.variable}")
-        keys = self.variable.split(".")
-        # Navigate to the target container (the one before the last key)
-        temp = process_variables
-        for key in keys[:-1]:  # All but the last key
-            temp = temp.get(key, {})
-
-        # The last key is where the value should be appended or concatenated
-        final_key = keys[-1]
-        if final_key not in temp:
-            # If the final key doesn't exist, decide whether to create a list or string based on target_value type
-            temp[final_key] = [] if isinstance(self.target_value, list) else ""
-
-        # Now, append or concatenate to the target container
-        if isinstance(temp[final_key], list):
-            temp[final_key].append(self.target_value)
-        elif isinstance(temp[final_key], str):
-            temp[final_key] += (
-                f"\n{self.target_value}" if temp[final_key] else str(self.target_value)
-            )
-
-        return process_variables
+    @classmethod
+    def transform(
+        cls, process_variables: Dict, variable: str, target_value: Any
+    ) -> Dict:
+        logger.info(f"Appending {target_value} to {variable}")
+        return get_variable_path(variable).append(process_variables, target_value)
+
+    @classmethod
+    def transform_frame(
+        cls, frame: pd.DataFrame, mask: pd.Series, variable: str, target_value: Any
+    ) -> None:
+        if isinstance(target_value, pd.Series):
+            return super().transform_frame(frame, mask, variable, target_value)
+        positions = np.flatnonzero(mask.to_numpy())
+        if not positions.size:
+            return
+        if variable in frame.columns:
+            values = frame[variable].to_numpy(dtype=object, copy=True)
+        else:
+            values = np.full(len(frame), None, dtype=object)
+        values[positions] = [
+            _appended(value, target_value) for value in values[positions]
+        ]
+        frame[variable] = values
+
+
+def _convert_date_remotely(value: str, output_format: str) -> Any:
+    logger.info(f"Converting {value} with the converter service")
+    url_string = f"{DATE_URL}{value}&output_format={output_format}"
+    response = requests.request("GET", url_string, headers={}, data={})
+    if response.status_code == 200:
+        return json.loads(response.content)["value"]
+    return None
 
 
 class Format(TransfBaseMethod):
@@ -123,8 +146,8 @@ class Format(TransfBaseMethod):
         apply(process_variables: Dict) -> None:
             Applies the formatting method to the input variable.
             This method converts the input variable to the specified format.
-            If the target value is "de_DE.UTF-8", it formats the input variable as a number with two decimal places using the locale module.
-            If the target value contains "%m", it formats the input variable as a date or datetime object using the DATE_URL API endpoint.
+            If the target value is a locale such as "de_DE.UTF-8", it formats the input variable as a number with two decimal places and the decimal separator of the locale (see `converters.LOCALE_NUMBER_FORMATS`).
+            If the target value contains "%m", it formats the input variable as a date or datetime object. The string dates are parsed locally (see `converters.INPUT_DATE_FORMATS`), the DATE_URL API endpoint is only called for the dates that cannot be parsed.
             The formatted value is then stored back in the process variables dictionary.
 
             Args:
@@ -139,32 +162,37 @@ class Format(TransfBaseMethod):
 
     transformation_method: Literal["format"] = "format"
 
-    def apply(self, process_variables: Dict) -> Dict:
-        logger.info(f"Converting {self.variable} to {self.target_value} format")
-        # number formatting
-        if self.target_value == "de_DE.UTF-8":
+    @classmethod
+    def transform(
+        cls, process_variables: Dict, variable: str, target_value: Any
+    ) -> Dict:
+        logger.info(f"Converting {variable} to {target_value} format")
+        # number formatting, without setting the locale of the process
+        number_format = get_number_format(target_value)
+        if number_format is not None:
             assert isinstance(
-                process_variables[self.variable], (int, float)
-            ), f"self.variable [{self.variable}] is not int or float"
-            locale.setlocale(locale.LC_ALL, self.target_value)
-            process_variables[self.variable] = locale.format_string(
-                "%.2f", process_variables[self.variable], False
+                process_variables[variable], (int, float)
+            ), f"variable [{variable}] is not int or float"
+            process_variables[variable] = number_format.format(
+                process_variables[variable]
             )
 
         # date and time formatting
         # VG 02.03.23 united date and time 'cause to the moment for the service there is no difference
-        if "%m" in self.target_value.lower():
+        if "%m" in target_value.lower():
             assert isinstance(
-                process_variables[self.variable], (str, datetime.datetime)
-            ), f"self.variable [{self.variable}] is not str or datetime.datetime"
-            if isinstance(process_variables[self.variable], str):
-                url_string = f"{DATE_URL}{process_variables[self.variable]}&output_format={self.target_value}"
-                response = requests.request("GET", url_string, headers={}, data={})
-                if response.status_code == 200:
-                    formatted_date = json.loads(response.content)["value"]
-                    process_variables[self.variable] = formatted_date
+                process_variables[variable], (str, datetime.datetime)
+            ), f"variable [{variable}] is not str or datetime.datetime"
+            if isinstance(process_variables[variable], str):
+                formatted_date = format_date(process_variables[variable], target_value)
+                if formatted_date is None:
+                    formatted_date = _convert_date_remotely(
+                        process_variables[variable], target_value
+                    )
+                if formatted_date is not None:
+                    process_variables[variable] = formatted_date
             else:
-                process_variables[self.variable] = process_variables[
-                    self.variable
-                ].strftime(self.target_value)
+                process_variables[variable] = process_variables[variable].strftime(
+                    target_value
+                )
         return process_variables
@@ -1 +1 @@
-# Initialize the tests package
\ No newline at end of file
+# Initialize the tests package
@@ -0,0 +1,25 @@
+import pytest
+
+from rules_engine import RulesEngine
+from rules_engine.ext_data_cache import ext_data_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    # the tables parsed by a test are neither written to the user's cache directory
+    # nor served to the next tests
+    monkeypatch.setenv("BRE_DISK_CACHE_DIR", str(tmp_path / "disk_cache"))
+    ext_data_cache.clear()
+    yield
+    ext_data_cache.clear()
+
+
+@pytest.fixture
+def make_engine():
+    """Build a `RulesEngine` without rules, against which single comparisons and
+    transformations are evaluated."""
+
+    def _make_engine(process_variables):
+        return RulesEngine(process_variables=process_variables, rules={"rules": {}})
+
+    return _make_engine
@@ -0,0 +1,65 @@
+import pytest
+from pydantic import BaseModel
+
+from rules_engine.utils.accessors import VariablePath
+
+
+class Item(BaseModel):
+    price: int
+    tags: dict
+
+
+class Order(BaseModel):
+    items: list
+
+
+@pytest.mark.parametrize(
+    ("variable,expected_steps"),
+    [
+        ("var1", ("var1",)),
+        ("var2.var21", ("var2", "var21")),
+        ("var2.var22.1.var221", ("var2", "var22", 1, "var221")),
+        ("var2.var22[1].var221", ("var2", "var22", 1, "var221")),
+    ],
+)
+def test_variable_path_steps(variable, expected_steps):
+    assert VariablePath(variable).steps == expected_steps
+
+
+@pytest.mark.parametrize(
+    ("process_variables,variable,expected_value"),
+    [
+        ({"var1": "test"}, "var1", "test"),
+        ({"var2": {"var22": [{"var221": 1}, {"var221": 2}]}}, "var2.var22.1.var221", 2),
+        (
+            {"var2": {"var22": [{"var221": 1}, {"var221": 2}]}},
+            "var2.var22[0].var221",
+            1,
+        ),
+        (Order(items=[Item(price=3, tags={"a": "b"})]), "items.0.price", 3),
+        (Order(items=[Item(price=3, tags={"a": "b"})]), "items[0].tags.a", "b"),
+    ],
+)
+def test_variable_path_get(process_variables, variable, expected_value):
+    assert VariablePath(variable).get(process_variables) == expected_value
+
+
+def test_variable_path_set():
+    process_variables = {"var2": {"var22": [{"var221": 1}]}}
+    VariablePath("var2.var22.0.var221").set(process_variables, 5)
+    VariablePath("var3.var31").set(process_variables, True)
+    assert process_variables == {
+        "var2": {"var22": [{"var221": 5}]},
+        "var3": {"var31": True},
+    }
+
+
+def test_variable_path_append():
+    process_variables = {"result": [], "items": [{}]}
+    VariablePath("result").append(process_variables, "[OK]")
+    VariablePath("items.0.log").append(process_variables, "first")
+    VariablePath("items.0.log").append(process_variables, "second")
+    assert process_variables == {
+        "result": ["[OK]"],
+        "items": [{"log": "first\nsecond"}],
+    }
@@ -0,0 +1,221 @@
+import copy
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from rules_engine.external_source import (
+    AirTableExternalSource,
+    ExternalSourceException,
+)
+from rules_engine.utils import airtable_utils
+
+RECORDS = [
+    {
+        "id": f"rec{idx}",
+        "createdTime": "2024-01-01T00:00:00.000Z",
+        "fields": {
+            "Name": f"name {idx} ",
+            "Status": "Active" if idx % 2 else "Closed",
+            "ContractEnd": "2024-12-31",
+            "Notes": "not needed",
+        },
+    }
+    for idx in range(7)
+]
+SCHEMA = {
+    "tables": [
+        {
+            "name": "Contracts",
+            "fields": [
+                {"name": "Name", "type": "singleLineText"},
+                {"name": "ContractEnd", "type": "date"},
+            ],
+        }
+    ]
+}
+PAGE_SIZE = 3
+
+
+class MockAirTable(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append((url.path, query))
+        self.server.connections.add(self.client_address)
+        if self.headers["Authorization"] != "Bearer token":
+            return self._send(401, {"error": "AUTHENTICATION_REQUIRED"})
+        if url.path == "/v0/meta/bases/base/tables":
+            return self._send(200, SCHEMA)
+        if url.path != "/v0/base/Contracts":
+            return self._send(404, {"error": "NOT_FOUND"})
+        records = self.server.records
+        formula = query.get("filterByFormula", [""])[0]
+        # the only formulas of the tests
+        if "{Status}='Active'" in formula:
+            records = [r for r in records if r["fields"]["Status"] == "Active"]
+        modified_after = re.search(
+            r"IS_AFTER\(LAST_MODIFIED_TIME\(\),'(.+?)'\)", formula
+        )
+        if modified_after:
+            records = [
+                r
+                for r in records
+                if self.server.modified.get(r["id"], "") > modified_after.group(1)
+            ]
+        if "fields[]" in query:
+            records = [
+                {
+                    **record,
+                    "fields": {
+                        k: v
+                        for k, v in record["fields"].items()
+                        if k in query["fields[]"]
+                    },
+                }
+                for record in records
+            ]
+        offset = int(query.get("offset", ["0"])[0])
+        page = {"records": records[offset : offset + PAGE_SIZE]}
+        if offset + PAGE_SIZE < len(records):
+            page["offset"] = str(offset + PAGE_SIZE)
+        self._send(200, page)
+
+
+@pytest.fixture
+def airtable_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAirTable)
+    server.requests = []
+    server.connections = set()
+    server.records = copy.deepcopy(RECORDS)
+    # record id -> last modified time
+    server.modified = {}
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    monkeypatch.setattr(airtable_utils, "_schemas", {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _source(server, **kwargs):
+    return AirTableExternalSource(
+        source="airtable",
+        airtable_token="token",
+        base_id="base",
+        table="Contracts",
+        api_url=f"http://127.0.0.1:{server.server_port}",
+        **kwargs,
+    )
+
+
+def test_get_data_pages_and_schema(airtable_server):
+    df = _source(airtable_server).get_data()
+
+    assert df["id"].tolist() == [f"rec{idx}" for idx in range(7)]
+    assert df["Name"].tolist() == [f"name {idx}" for idx in range(7)]
+    assert pd.api.types.is_datetime64_any_dtype(df["ContractEnd"])
+    pages = [q for path, q in airtable_server.requests if path == "/v0/base/Contracts"]
+    assert [q.get("offset") for q in pages] == [None, ["3"], ["6"]]
+    # one keep-alive connection for all the requests
+    assert len(airtable_server.connections) == 1
+
+    # the schema is cached
+    _source(airtable_server).get_data()
+    schemas = [p for p, _ in airtable_server.requests if p.startswith("/v0/meta")]
+    assert len(schemas) == 1
+
+
+def test_get_data_projection_and_filters(airtable_server):
+    df = _source(
+        airtable_server, columns=["Name", "Status"], filters={"Status": "Active"}
+    ).get_data()
+
+    assert list(df.columns) == ["id", "createdTime", "Name", "Status"]
+    assert df["Status"].unique().tolist() == ["Active"]
+    pages = [q for path, q in airtable_server.requests if path == "/v0/base/Contracts"]
+    # 3 matching records, one page instead of three
+    assert len(pages) == 1
+    assert pages[0]["fields[]"] == ["Name", "Status"]
+
+
+def test_get_data_error(airtable_server):
+    with pytest.raises(ExternalSourceException, match="AUTHENTICATION_REQUIRED"):
+        AirTableExternalSource(
+            source="airtable",
+            airtable_token="wrong",
+            base_id="base",
+            table="Contracts",
+            api_url=f"http://127.0.0.1:{airtable_server.server_port}",
+        ).get_data()
+
+
+@pytest.mark.parametrize(
+    "filters,filter_by_formula,expected",
+    [
+        ({}, None, None),
+        ({"Status": "Active"}, None, "{Status}='Active'"),
+        ({"Status": ["A", "B"]}, None, "OR({Status}='A',{Status}='B')"),
+        ({"Name": "it's", "Count": 2}, None, "AND({Name}='it\\'s',{Count}=2)"),
+        ({"Done": True}, "{Count}>1", "AND({Done}=TRUE(),{Count}>1)"),
+    ],
+)
+def test_formula(filters, filter_by_formula, expected):
+    source = AirTableExternalSource(
+        source="airtable",
+        airtable_token="token",
+        base_id="base",
+        table="Contracts",
+        filters=filters,
+        filter_by_formula=filter_by_formula,
+    )
+    assert source.formula() == expected
+
+
+def test_refresh_fetches_modified_records(airtable_server):
+    source = _source(airtable_server, filters={"Status": "Active"})
+    df, state = source.load()
+    assert df["id"].tolist() == ["rec1", "rec3", "rec5"]
+
+    airtable_server.records[3]["fields"]["Name"] = "renamed "
+    airtable_server.modified["rec3"] = "9999-01-01T00:00:00.000Z"
+    df, state = source.refresh(df, state)
+
+    pages = [q for path, q in airtable_server.requests if path == "/v0/base/Contracts"]
+    assert "LAST_MODIFIED_TIME()" in pages[-1]["filterByFormula"][0]
+    assert sorted(df["id"].tolist()) == ["rec1", "rec3", "rec5"]
+    assert df.loc[df["id"] == "rec3", "Name"].tolist() == ["renamed"]
+
+    # nothing changed since the previous sync
+    airtable_server.modified.clear()
+    assert source.refresh(df, state)[0] is df
+
+
+def test_refresh_loads_everything_after_full_refresh_after(airtable_server):
+    source = _source(airtable_server, full_refresh_after=0)
+    df, state = source.load()
+
+    df, state = source.refresh(df, state)
+
+    pages = [q for path, q in airtable_server.requests if path == "/v0/base/Contracts"]
+    assert all("filterByFormula" not in q for q in pages)
+    assert len(df) == 7
@@ -0,0 +1,137 @@
+import pickle
+import re
+
+import pandas as pd
+import pytest
+
+from rules_engine.models import Comparison
+from rules_engine.utils.comparison import MembershipList, get_comparison_method
+
+CODES = [f"A{idx:04d}" for idx in range(1000)]
+
+
+@pytest.mark.parametrize("values", [["a", "b"], CODES, CODES + [[1, 2], {"a": 1}]])
+@pytest.mark.parametrize("value", ["a", "A0500", "Z", [1, 2], {"a": 1}, None, 1])
+def test_membership_list_contains(values, value):
+    assert (value in MembershipList(values)) == (value in values)
+
+
+@pytest.mark.parametrize(
+    "values",
+    [[], ["a"], ["a"] * 10, ["a"] * 10 + ["b"], CODES, ["a"] * 10 + [[1]]],
+)
+@pytest.mark.parametrize("value", ["a", "b", [1]])
+def test_membership_list_has_other_than(values, value):
+    expected = any(value != v for v in values)
+    assert MembershipList(values).has_other_than(value) == expected
+
+
+def test_membership_list_pickles():
+    values = MembershipList(CODES)
+    assert "A0001" in values
+
+    unpickled = pickle.loads(pickle.dumps(values))
+
+    assert isinstance(unpickled, MembershipList) and unpickled == CODES
+    assert "A0999" in unpickled and "B" not in unpickled
+
+
+@pytest.mark.parametrize(
+    "comparison_method,value,expected",
+    [
+        ("within", "A0999", True),
+        ("within", "B", False),
+        ("not_in", "B", True),
+        ("equal_to", "A0001", True),
+        ("not_equal_to", "A0001", True),
+    ],
+)
+def test_literal_lists_are_hashed_once(make_engine, comparison_method, value, expected):
+    comparison = Comparison(
+        comparison_method=comparison_method,
+        variable="${code}",
+        comparison_variables=CODES,
+    )
+
+    engine = make_engine({"code": value})
+    constant = comparison.evaluate_comparison_variables(engine, value)
+    assert isinstance(constant, MembershipList)
+    assert comparison.evaluate(engine) == expected
+    # the same list is used by every evaluation
+    assert comparison.evaluate_comparison_variables(engine, value) is constant
+    assert get_comparison_method(comparison_method).compare(value, CODES) == expected
+
+
+@pytest.mark.parametrize("needles", [["A00", "B"], CODES, CODES + [""]])
+@pytest.mark.parametrize(
+    "comparison_method,check",
+    [
+        ("starts_with", lambda value, needle: value.startswith(needle)),
+        ("ends_with", lambda value, needle: value.endswith(needle)),
+        ("contains_string", lambda value, needle: needle in value),
+    ],
+)
+@pytest.mark.parametrize("value", ["A0500", "xA0999y", "B", "Z", ""])
+def test_prepared_needles(needles, comparison_method, check, value):
+    method = get_comparison_method(comparison_method)
+    prepared = method.prepare(MembershipList(needles))
+    expected = any(check(value, needle) for needle in needles)
+
+    assert method.compare(value, prepared) == expected
+    assert method.compare(value, needles) == expected
+    series = pd.Series([value, None])
+    assert method.compare_series(series, prepared).tolist() == [expected, False]
+
+
+def test_contains_string_in_list():
+    method = get_comparison_method("contains_string")
+    prepared = method.prepare(CODES)
+
+    assert method.compare(["x", "A0001"], prepared)
+    assert not method.compare(["x"], prepared)
+
+
+@pytest.mark.parametrize(
+    "pattern,value,expected",
+    [(r"\d{3}-\d{2}", "id 123-45", True), (r"^\d+$", "12a", False), ("x*", "a", True)],
+)
+def test_match_patterns_are_compiled_once(pattern, value, expected):
+    comparison = Comparison(
+        comparison_method="matches_pattern",
+        variable="${code}",
+        comparison_variables=pattern,
+    )
+
+    constant = comparison.evaluate_comparison_variables(None, value)
+    assert isinstance(constant, re.Pattern) and constant.pattern == pattern
+    method = get_comparison_method("matches_pattern")
+    assert method.compare(value, constant) == expected
+    assert method.compare(value, pattern) == expected
+    assert bool(re.findall(pattern, value)) == expected
+
+
+@pytest.mark.parametrize("comparison_variables", ["false", "False", False, "${flag}"])
+@pytest.mark.parametrize("value,expected", [("", False), ("text", True)])
+def test_comparison_variables_are_coerced(
+    make_engine, comparison_variables, value, expected
+):
+    comparison = Comparison(
+        comparison_method="is_empty",
+        variable="${text}",
+        comparison_variables=[comparison_variables],
+    )
+
+    engine = make_engine({"text": value, "flag": "false"})
+    assert comparison.evaluate_comparison_variables(engine, value) is False
+    assert comparison.evaluate(engine) == expected
+
+
+def test_invalid_comparison_variables_fail_at_parse_time():
+    from pydantic import ValidationError
+
+    with pytest.raises(ValidationError):
+        Comparison(
+            comparison_method="is_empty",
+            variable="${text}",
+            comparison_variables=["maybe"],
+        )
@@ -0,0 +1,97 @@
+import pytest
+
+from rules_engine import CompiledRuleSet
+from rules_engine import decision_table
+
+COUNTRIES = [f"C{idx:02d}" for idx in range(30)]
+
+
+def _rule(comparisons, result, logical_operator=None, else_result=None):
+    condition = {logical_operator: comparisons} if logical_operator else comparisons
+    rule = {"if": {**condition, "then": {"${result}": {"append": [result]}}}}
+    if else_result:
+        rule["else"] = {"${result}": {"append": [else_result]}}
+    return rule
+
+
+def _rules():
+    # a global rule, the group stops at it when it is satisfied
+    rules = {"large": _rule({"${amount}": {"greater_than": [1000]}}, "large")}
+    for country in COUNTRIES[:10]:
+        rules[f"is {country}"] = _rule({"${country}": {"equal_to": [country]}}, country)
+    rules["is C10 or C11"] = _rule(
+        {"${country}": {"within": [["C10", "C11"]]}}, "C10/C11"
+    )
+    rules["is C12 and large"] = _rule(
+        {
+            "${country}": {"equal_to": ["C12"]},
+            "${amount}": {"greater_than": [100]},
+        },
+        "C12 large",
+        logical_operator="and",
+    )
+    rules["is C12"] = _rule({"${country}": {"equal_to": [" C12 "]}}, "C12")
+    rules["is 13"] = _rule({"${country}": {"equal_to": [13]}}, "13")
+    # the else is applied when it is not satisfied, it cannot be skipped
+    rules["is C14 else"] = _rule(
+        {"${country}": {"equal_to": ["C14"]}}, "C14", else_result="not C14"
+    )
+    for country in COUNTRIES[15:]:
+        rules[f"is {country}"] = _rule({"${country}": {"equal_to": [country]}}, country)
+    rules["is C20 again"] = _rule({"${country}": {"equal_to": ["C20"]}}, "C20 again")
+    rules["stop"] = _rule({"${country}": {"equal_to": ["C29"]}}, "stop")
+    rules["after stop"] = _rule({"${country}": {"equal_to": ["C29"]}}, "after stop")
+    return {
+        "rules": rules,
+        "groups": {
+            "countries": [name for name in rules if name not in ("stop", "after stop")],
+            "stop": ["stop"],
+            "after": ["after stop"],
+            "global": ["stop", "large"],
+        },
+    }
+
+
+@pytest.fixture
+def rule_sets(monkeypatch):
+    dispatched = CompiledRuleSet(rules=_rules())
+    monkeypatch.setattr(decision_table, "MIN_RULES", 10**9)
+    sequential = CompiledRuleSet(rules=_rules())
+    return dispatched, sequential
+
+
+def test_decision_tables_are_compiled(rule_sets):
+    dispatched, sequential = rule_sets
+
+    tables = dispatched.compiled_rules[()][0].decision_tables
+    assert list(tables) == ["countries"]
+    # the rule with an else splits the group in two tables
+    assert [(table.start, len(table)) for table in tables["countries"].values()] == [
+        (1, 14),
+        (16, 16),
+    ]
+    assert sequential.compiled_rules[()][0].decision_tables == {}
+
+
+@pytest.mark.parametrize(
+    "country", [*COUNTRIES, " C03 ", " C12", 13, 13.0, None, ["C01"], "unknown"]
+)
+@pytest.mark.parametrize("amount", [10, 500, 5000])
+def test_decision_tables_keep_first_hit(rule_sets, country, amount):
+    dispatched, sequential = rule_sets
+    process_variables = {"country": country, "amount": amount, "result": []}
+
+    expected = sequential.evaluate({**process_variables, "result": []})
+    assert dispatched.evaluate({**process_variables, "result": []}) == expected
+
+
+def test_decision_tables_dispatch_to_candidates(rule_sets):
+    dispatched, _ = rule_sets
+    engine = dispatched.engine({"country": " C12", "amount": 10, "result": []})
+    table = engine.rules_definition.decision_tables["countries"][1]
+
+    assert table.candidates(engine) == ["is C12 and large", "is C12"]
+    assert engine.process_rules()["result"] == ["C12"]
+    assert dispatched.evaluate({"country": "C29", "amount": 10, "result": []})[
+        "result"
+    ] == ["not C14", "C29", "stop"]
@@ -0,0 +1,143 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rules_engine.external_source import ExcelExternalSource, remove_trailing_spaces
+from rules_engine.get_external_source import get_ext_source
+from rules_engine.utils import disk_cache
+from rules_engine.utils.ext_data import ExtDataTable
+
+TEST_EXT_DATA_PATH = os.path.join(os.path.dirname(__file__), "ext_data")
+
+
+@pytest.mark.parametrize("file_name", ["test_1.xlsx", "test_2.xlsx"])
+def test_cached_frame_matches_parsed_frame(tmp_path, file_name):
+    file_name = os.path.join(TEST_EXT_DATA_PATH, file_name)
+    parsed = remove_trailing_spaces(pd.read_excel(file_name))
+    ext_source = get_ext_source(
+        {"source": "excel", "file_name": file_name, "disk_cache_dir": str(tmp_path)}
+    )
+
+    ext_source.get_data()
+    cached = ext_source.get_data()
+
+    pd.testing.assert_frame_equal(cached, parsed)
+    assert len(os.listdir(tmp_path)) == 1
+    # the cached frame can be indexed like a parsed one
+    table = ExtDataTable(cached)
+    for column in cached.columns:
+        value = cached[column].iloc[0]
+        assert (
+            table.select(column, value).tolist()
+            == np.flatnonzero((cached[column] == value).to_numpy()).tolist()
+        )
+
+
+def test_workbook_is_parsed_once(tmp_path, monkeypatch):
+    file_name = tmp_path / "test_1.xlsx"
+    shutil.copy(os.path.join(TEST_EXT_DATA_PATH, "test_1.xlsx"), file_name)
+    cache_dir = tmp_path / "cache"
+    parsed = []
+    read_excel = pd.read_excel
+
+    def _read_excel(*args, **kwargs):
+        parsed.append(args[0])
+        return read_excel(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_excel", _read_excel)
+    ext_source = ExcelExternalSource(
+        source="excel", file_name=str(file_name), disk_cache_dir=str(cache_dir)
+    )
+
+    ext_source.get_data()
+    ext_source.get_data()
+    assert len(parsed) == 1
+
+    # a modified workbook replaces its previous entry
+    stat = os.stat(file_name)
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    ext_source.get_data()
+    assert len(parsed) == 2
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_object_and_numeric_columns_round_trip(tmp_path):
+    frame = pd.DataFrame(
+        {
+            "str": ["a", None, "c"],
+            "str_nan": [np.nan, "b ", ""],
+            "mixed": ["a", 1, 2.5],
+            "lists": [["a", 1], ["b", 2], None],
+            "category": pd.Categorical(["x", "y", "x"]),
+            "int": [1, 2, 3],
+            "float": [1.5, np.nan, 3.0],
+            "date": pd.to_datetime(["2024-01-01", None, "2024-03-01"]),
+            1: [True, False, True],
+        }
+    )
+    disk_cache.save_frame(frame, str(tmp_path / "frame"))
+
+    loaded = disk_cache.load_frame(str(tmp_path / "frame"))
+
+    pd.testing.assert_frame_equal(loaded, frame)
+    assert isinstance(loaded["int"].values.base, np.memmap) or isinstance(
+        loaded["int"].values, np.memmap
+    )
+
+    # nothing has to be unpickled
+    for file_name in os.listdir(tmp_path / "frame"):
+        if file_name.endswith(".npy"):
+            np.load(tmp_path / "frame" / file_name, allow_pickle=False)
+
+
+def test_long_string_does_not_pad_the_others(tmp_path):
+    values = [f"v{idx}" for idx in range(50_000)]
+    values[7] = "x" * 4000 + "é"
+    frame = pd.DataFrame(
+        {"str": values, "category": pd.Categorical(values), "empty": [None] * 50_000}
+    )
+    disk_cache.save_frame(frame, str(tmp_path / "frame"))
+
+    loaded = disk_cache.load_frame(str(tmp_path / "frame"))
+
+    pd.testing.assert_frame_equal(loaded, frame)
+    size = sum(path.stat().st_size for path in (tmp_path / "frame").iterdir())
+    assert size < 3 * 1024 * 1024
+
+
+def test_unpicklable_column_is_not_saved(tmp_path):
+    frame = pd.DataFrame({"dates": [pd.Timestamp("2024-01-01"), "a"]})
+
+    with pytest.raises(TypeError):
+        disk_cache.save_frame(frame, str(tmp_path / "frame"))
+
+    # numpy would pickle the timestamps of a timezone-aware column
+    frame = pd.DataFrame({"dates": pd.date_range("2024-01-01", periods=2, tz="UTC")})
+    with pytest.raises(ValueError):
+        disk_cache.save_frame(frame, str(tmp_path / "tz"))
+
+
+def test_cache_dir_writable_by_others_is_not_used(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o777)
+    parsed = []
+
+    def _parse():
+        parsed.append(True)
+        return pd.DataFrame({"a": [1, 2]})
+
+    disk_cache.read_through(__file__, None, _parse, str(cache_dir))
+    disk_cache.read_through(__file__, None, _parse, str(cache_dir))
+
+    assert len(parsed) == 2 and os.listdir(cache_dir) == []
+    # the default directory belongs to the user
+    monkeypatch.delenv("BRE_DISK_CACHE_DIR", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "home"))
+    disk_cache.read_through(__file__, None, _parse, None)
+    default_dir = tmp_path / "home" / "business_rules_engine"
+    assert len(os.listdir(default_dir)) == 1
+    assert not os.stat(default_dir).st_mode & 0o077
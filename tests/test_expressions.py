@@ -0,0 +1,85 @@
+import datetime
+import pickle
+
+import pytest
+
+from rules_engine.exceptions import ParsingRuleException
+from rules_engine.models import Transformation
+from rules_engine.utils.expressions import Expression
+from rules_engine.utils.literals import UnsupportedLiteral
+
+
+@pytest.mark.parametrize(
+    ("source,values,expected"),
+    [
+        ("max(a, b)", {"a": 1, "b": 2.5}, 2.5),
+        ("round(a * 1.1 - b, 2)", {"a": 10, "b": 1}, 10.0),
+        ("a + ' ' + b.strip().upper()", {"a": "x", "b": " y "}, "x Y"),
+        ("a[1:]", {"a": [1, 2, 3]}, [2, 3]),
+        ("a if a > b else b", {"a": 1, "b": 2}, 2),
+        ("a in ['x', 'y'] and not b", {"a": "x", "b": False}, True),
+        (
+            "a + datetime.timedelta(days=1)",
+            {"a": datetime.date(2024, 3, 11)},
+            datetime.date(2024, 3, 12),
+        ),
+        ("f'{a}-{b:03d}'", {"a": "x", "b": 7}, "x-007"),
+    ],
+)
+def test_expression(source, values, expected):
+    assert Expression(source, values).evaluate(values) == expected
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "__import__('os')",
+        "open(a)",
+        "a.__class__",
+        "a.__class__.__mro__",
+        "unknown + a",
+        "(lambda: a)()",
+        "[x for x in a]",
+        "a.format(1)",
+        "getattr(a, 'x')",
+        "max(*a)",
+        "9 ** 9 ** 9",
+        "a +",
+    ],
+)
+def test_expression_refuses_code(source):
+    with pytest.raises(UnsupportedLiteral):
+        Expression(source, ["a"])
+
+
+def test_expression_pickles():
+    expression = Expression("max(a, b) + 1", ["a", "b"])
+
+    unpickled = pickle.loads(pickle.dumps(expression))
+
+    assert unpickled.names == expression.names
+    assert unpickled.evaluate({"a": 1, "b": 2}) == 3
+
+
+def test_expression_has_no_builtins():
+    with pytest.raises(NameError):
+        Expression("a", ["a"]).evaluate({})
+
+
+def test_transformation_expression_is_compiled_once(make_engine):
+    transformation = Transformation(
+        transformation_method="set",
+        variable="result",
+        target_value="max(${float_variable}, ${int_variable}) * 2",
+    )
+
+    engine = make_engine({"float_variable": 1.5, "int_variable": 3})
+    transformation.apply(engine)
+    assert engine.process_variables["result"] == 6
+
+    with pytest.raises(ParsingRuleException):
+        Transformation(
+            transformation_method="set",
+            variable="result",
+            target_value="${float_variable}.__class__",
+        )
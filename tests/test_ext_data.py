@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rules_engine.utils.ext_data import ExtDataTable
+
+FRAME = pd.DataFrame(
+    {
+        "Name": ["ciao", "hello", None, "ciao", np.nan],
+        "Amount": [1, 2, 3, 1, 2],
+        "Mixed": [1, "1", 1.0, True, "a"],
+        "Lists": [[1], [2], [1], [3], [4]],
+        "Date": pd.to_datetime(["2024-01-01"] * 5),
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "column,value",
+    [
+        ("Name", "ciao"),
+        ("Name", "hello"),
+        ("Name", "unknown"),
+        ("Name", None),
+        ("Name", np.nan),
+        ("Amount", 1),
+        ("Amount", 1.0),
+        ("Amount", "1"),
+        ("Mixed", 1),
+        ("Mixed", "1"),
+    ],
+)
+def test_lookup_matches_column_scan(column, value):
+    table = ExtDataTable(FRAME)
+
+    positions = table.lookup(column, value)
+
+    expected = np.flatnonzero((FRAME[column] == value).to_numpy())
+    assert positions.tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize(
+    "column,value",
+    [("Name", ["ciao"]), ("Lists", [1]), ("Date", "2024-01-01")],
+)
+def test_lookup_falls_back_to_scan(column, value):
+    assert ExtDataTable(FRAME).lookup(column, value) is None
+
+
+def test_index_is_built_once():
+    table = ExtDataTable(FRAME)
+
+    table.lookup("Name", "ciao")
+    index = table.indexes["Name"]
+    table.lookup("Name", "hello")
+
+    assert table.indexes["Name"] is index
+
+
+def test_select_narrows_selection_without_copy():
+    table = ExtDataTable(FRAME)
+
+    selection = table.select("Amount", 1)
+    selection = table.select("Name", "ciao", selection)
+    assert selection.tolist() == [0, 3]
+    # scanned column
+    assert table.select("Date", "2024-01-01", selection).tolist() == [0, 3]
+    assert table.select("Name", "hello", selection).tolist() == []
+
+    assert table.column("Amount", selection).tolist() == [1, 1]
+    assert table.first("Mixed", selection) == 1
+    assert table.first("Mixed", table.select("Name", "hello", selection)) is None
+    assert table.frame is FRAME and len(FRAME) == 5
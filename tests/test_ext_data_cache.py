@@ -0,0 +1,268 @@
+import copy
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from rules_engine.ext_data_cache import ExtDataCache
+from rules_engine.external_source import ExcelExternalSource, remove_trailing_spaces
+from rules_engine.get_external_source import get_ext_source
+from rules_engine.models import RulesDefinition
+from rules_engine.rules_engine import (
+    load_external_data,
+    load_external_tables,
+    referenced_external_data,
+)
+
+TEST_EXT_DATA_PATH = os.path.join(os.path.dirname(__file__), "ext_data")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    loads = []
+    get_data = ExcelExternalSource.get_data
+
+    def _get_data(self):
+        loads.append(self.file_name)
+        return get_data(self)
+
+    monkeypatch.setattr(ExcelExternalSource, "get_data", _get_data)
+    return loads
+
+
+def _excel_source(file_name, **kwargs):
+    return get_ext_source(
+        {
+            "source": "excel",
+            "file_name": os.path.join(TEST_EXT_DATA_PATH, file_name),
+            **kwargs,
+        }
+    )
+
+
+def test_cache_hit_and_ttl(loads):
+    clock = FakeClock()
+    cache = ExtDataCache(default_ttl=10, background_refresh=False, clock=clock)
+
+    ext_data = cache.get(_excel_source("test_1.xlsx"))
+    assert cache.get(_excel_source("test_1.xlsx")) is ext_data
+    # the per-source TTL overrides the default one
+    cache.get(_excel_source("test_2.xlsx", cache_ttl=60))
+    clock.now = 30
+    assert cache.get(_excel_source("test_1.xlsx")) is not ext_data
+    cache.get(_excel_source("test_2.xlsx", cache_ttl=60))
+
+    assert len(loads) == 3
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.expirations) == (2, 2, 1)
+    assert stats.refreshes == 1
+    assert stats.entries == 2
+
+
+def test_cache_refreshes_in_background(monkeypatch):
+    clock = FakeClock()
+    cache = ExtDataCache(default_ttl=10, clock=clock)
+    refresh_started = threading.Event()
+    release_refresh = threading.Event()
+    refreshed = pd.DataFrame({"Name": ["refreshed"]})
+
+    def _refresh(self, data, state):
+        refresh_started.set()
+        release_refresh.wait(5)
+        return refreshed, {"version": state["version"] + 1}
+
+    monkeypatch.setattr(
+        ExcelExternalSource, "load", lambda self: (pd.DataFrame(), {"version": 1})
+    )
+    monkeypatch.setattr(ExcelExternalSource, "refresh", _refresh)
+
+    ext_data = cache.get(_excel_source("test_1.xlsx"))
+    clock.now = 30
+    # the previous snapshot is served while the refresh runs
+    assert cache.get(_excel_source("test_1.xlsx")) is ext_data
+    assert refresh_started.wait(5)
+    assert cache.get(_excel_source("test_1.xlsx")) is ext_data
+    release_refresh.set()
+    for _ in range(100):
+        if cache.stats().refreshes:
+            break
+        time.sleep(0.01)
+
+    assert cache.get(_excel_source("test_1.xlsx")) is refreshed
+    stats = cache.stats()
+    assert (stats.refreshes, stats.expirations) == (1, 2)
+
+
+def test_cache_key_is_normalized():
+    relative = get_ext_source(
+        {"source": "excel", "file_name": "./tests/ext_data/test_1.xlsx"}
+    )
+    absolute = _excel_source("test_1.xlsx", cache_ttl=5)
+
+    assert relative.cache_key() == absolute.cache_key()
+    assert relative.cache_key() != _excel_source("test_2.xlsx").cache_key()
+
+
+def test_cache_evicts_least_recently_used(loads, tmp_path):
+    copy_path = tmp_path / "test_1.xlsx"
+    copy_path.write_bytes(
+        open(os.path.join(TEST_EXT_DATA_PATH, "test_1.xlsx"), "rb").read()
+    )
+    sources = [
+        _excel_source("test_1.xlsx"),
+        _excel_source("test_2.xlsx"),
+        _excel_source(str(copy_path)),
+    ]
+    sizes = [
+        int(pd.read_excel(source.file_name).memory_usage(index=True, deep=True).sum())
+        for source in sources
+    ]
+    # room for the first two sources only
+    cache = ExtDataCache(max_bytes=sizes[0] + sizes[1])
+
+    cache.get(sources[0])
+    cache.get(sources[1])
+    cache.get(sources[0])
+    cache.get(sources[2])
+
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.size_bytes == sizes[0] + sizes[2]
+    # the least recently used source has been evicted
+    cache.get(sources[0])
+    cache.get(sources[1])
+    assert loads.count(sources[1].file_name) == 2
+    assert loads.count(sources[0].file_name) == 1
+
+
+def test_cache_disabled_for_zero_ttl(loads):
+    cache = ExtDataCache()
+
+    cache.get(_excel_source("test_1.xlsx", cache_ttl=0))
+    cache.get(_excel_source("test_1.xlsx", cache_ttl=0))
+
+    assert len(loads) == 2
+    assert cache.stats().entries == 0
+
+
+def test_cached_table_keeps_its_indexes(loads):
+    clock = FakeClock()
+    cache = ExtDataCache(default_ttl=10, background_refresh=False, clock=clock)
+
+    table = cache.get_table(_excel_source("test_1.xlsx"))
+    table.lookup("Name", "a")
+    assert "Name" in table.indexes
+    assert cache.get_table(_excel_source("test_1.xlsx")) is table
+    # a new version of the data comes with a new table
+    clock.now = 30
+    assert cache.get_table(_excel_source("test_1.xlsx")) is not table
+    # the uncached data is wrapped in a table of its own
+    uncached = _excel_source("test_1.xlsx", cache_ttl=0)
+    assert cache.get_table(uncached) is not cache.get_table(uncached)
+
+
+def _rules_definition(references=("${test_1}", "${test_2}"), **kwargs):
+    return RulesDefinition(
+        rules={
+            "test rule": {
+                "if": {"${str_variable}": {"within": list(references)}},
+                "then": {"${result}": {"set": [True]}},
+            }
+        },
+        external_data={
+            name: {
+                "source": "excel",
+                "file_name": os.path.join(TEST_EXT_DATA_PATH, f"{name}.xlsx"),
+                "cache_ttl": 0,
+                **kwargs,
+            }
+            for name in ("test_1", "test_2")
+        },
+    )
+
+
+def test_sources_are_loaded_concurrently(monkeypatch):
+    get_data = ExcelExternalSource.get_data
+
+    def _slow_get_data(self):
+        time.sleep(0.5)
+        return get_data(self)
+
+    monkeypatch.setattr(ExcelExternalSource, "get_data", _slow_get_data)
+    load_times = {}
+
+    start = time.perf_counter()
+    ext_data = load_external_data(_rules_definition(), load_times=load_times)
+
+    assert time.perf_counter() - start < 0.9
+    assert list(ext_data) == ["test_1", "test_2"]
+    assert set(load_times) == {"test_1", "test_2"}
+    assert all(load_time >= 0.5 for load_time in load_times.values())
+
+
+def test_workbooks_parsed_in_processes():
+    ext_data = load_external_data(_rules_definition(), excel_processes=2)
+
+    for name, frame in ext_data.items():
+        expected = pd.read_excel(os.path.join(TEST_EXT_DATA_PATH, f"{name}.xlsx"))
+        pd.testing.assert_frame_equal(frame, remove_trailing_spaces(expected))
+
+
+def test_only_referenced_sources_and_columns_are_loaded(monkeypatch):
+    loaded = []
+    get_data = ExcelExternalSource.get_data
+
+    def _get_data(self):
+        loaded.append(self.file_name)
+        return get_data(self)
+
+    monkeypatch.setattr(ExcelExternalSource, "get_data", _get_data)
+    rules_definition = _rules_definition(["${test_1.Name}", "${test_1.MaxPayout}"])
+
+    assert referenced_external_data(rules_definition) == {
+        "test_1": ["Name", "MaxPayout"]
+    }
+    tables = load_external_tables(rules_definition, lazy=True)
+    assert list(tables) == ["test_1"]
+    assert not tables["test_1"].loaded and not loaded
+
+    assert list(tables["test_1"].frame.columns) == ["Name", "MaxPayout"]
+    assert tables["test_1"].loaded and len(loaded) == 1
+
+
+def test_engine_fails_when_created_for_a_missing_source():
+    from rules_engine import RulesEngine
+
+    rules = {
+        "rules": {
+            "test rule": {
+                "if": {"${str_variable}": {"within": ["${missing.Name}"]}},
+                "then": {"${result}": {"set": [True]}},
+            }
+        },
+        "external_data": {
+            "missing": {"source": "excel", "file_name": "missing.xlsx", "cache_ttl": 0}
+        },
+    }
+    process_variables = {"str_variable": "a"}
+
+    with pytest.raises(FileExistsError):
+        RulesEngine(process_variables=process_variables, rules=copy.deepcopy(rules))
+
+    engine = RulesEngine(
+        process_variables=process_variables,
+        rules=copy.deepcopy(rules),
+        ext_data_lazy=True,
+    )
+    with pytest.raises(FileExistsError):
+        engine.process_rules()
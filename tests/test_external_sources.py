@@ -45,3 +45,29 @@ from rules_engine.get_external_source import get_ext_source
 )
 def test_class_assignment(input_source, expected_model):
     assert isinstance(get_ext_source(input_source), expected_model)
+
+
+def test_remove_trailing_spaces():
+    import numpy as np
+    import pandas as pd
+    from rules_engine.external_source import remove_trailing_spaces
+
+    df = pd.DataFrame(
+        {
+            "names": [" a ", "a", "b  ", None, "b"],
+            "mixed": [" a ", 1, None, np.nan, [" b "]],
+            "ints": [1, 2, 3, 4, 5],
+            "floats": [1.5, np.nan, 3.0, 4.0, 5.0],
+            "objects": [1, 2, 3, None, 5.0],
+        }
+    )
+    expected = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+
+    pd.testing.assert_frame_equal(remove_trailing_spaces(df), expected)
+    # the input frame is left untouched
+    assert df["names"].tolist()[0] == " a "
+
+    categorical = remove_trailing_spaces(df, categorical_threshold=0.5)
+    assert isinstance(categorical["names"].dtype, pd.CategoricalDtype)
+    assert categorical["names"].tolist() == ["a", "a", "b", np.nan, "b"]
+    assert categorical["mixed"].dtype == object
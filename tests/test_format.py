@@ -0,0 +1,115 @@
+import datetime
+import locale
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from rules_engine.utils.transformation import Format
+from rules_engine.utils.transformation.converters import (
+    format_date,
+    get_number_format,
+    parse_date,
+)
+
+
+@pytest.fixture
+def converter_calls(monkeypatch):
+    calls = []
+
+    class Response:
+        status_code = 200
+        content = b'{"value": "remote"}'
+
+    def _request(method, url, **kwargs):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(requests, "request", _request)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "13.03.2024",
+        "13/03/2024",
+        "13-03-2024",
+        "2024-03-13",
+        "20240313",
+        "2024/03/13",
+        " 13.03.24 ",
+        "13 March 2024",
+        "Mar 13, 2024",
+    ],
+)
+def test_format_date(value):
+    assert format_date(value, "%Y%m%d") == "20240313"
+
+
+def test_parse_datetime():
+    assert parse_date("2024-03-13T10:30:00Z") == datetime.datetime(
+        2024, 3, 13, 10, 30, tzinfo=datetime.timezone.utc
+    )
+    assert parse_date("13.03.2024 10:30") == datetime.datetime(2024, 3, 13, 10, 30)
+    assert parse_date("not a date") is None
+
+
+def test_format_dates_locally(converter_calls):
+    process_variables = {
+        "date": "13.03.2024",
+        "datetime": datetime.datetime(2024, 3, 11),
+    }
+
+    Format.transform(process_variables, "date", "%d/%m/%Y")
+    Format.transform(process_variables, "datetime", "%d/%m/%Y")
+
+    assert process_variables == {"date": "13/03/2024", "datetime": "11/03/2024"}
+    assert not converter_calls
+
+
+def test_format_falls_back_to_converter(converter_calls):
+    process_variables = {"date": "the 13th of March"}
+
+    Format.transform(process_variables, "date", "%Y%m%d")
+
+    assert process_variables == {"date": "remote"}
+    assert len(converter_calls) == 1
+
+
+@pytest.mark.parametrize(
+    "target_value,value,expected",
+    [
+        ("de_DE.UTF-8", 1234.5, "1234,50"),
+        ("de_DE.UTF-8", -0.091, "-0,09"),
+        ("de_DE", 3, "3,00"),
+        ("en_US.UTF-8", 1234.567, "1234.57"),
+    ],
+)
+def test_format_numbers(target_value, value, expected):
+    process_variables = {"amount": value}
+
+    Format.transform(process_variables, "amount", target_value)
+
+    assert process_variables == {"amount": expected}
+
+
+def test_number_format_grouping():
+    assert get_number_format("de_DE.UTF-8").format(1234567.5, True) == "1.234.567,50"
+    assert get_number_format("fr_FR").format(-1234.5, True) == "-1\u202f234,50"
+    assert get_number_format("xx_XX.UTF-8") is None
+
+
+def test_format_numbers_in_threads():
+    locale_before = locale.setlocale(locale.LC_ALL)
+    values = [float(idx) + 0.25 for idx in range(1000)]
+
+    def _format(value):
+        return Format.transform({"amount": value}, "amount", "de_DE.UTF-8")["amount"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        formatted = list(executor.map(_format, values))
+
+    assert formatted == [f"{idx},25" for idx in range(1000)]
+    # the locale of the process is left untouched
+    assert locale.setlocale(locale.LC_ALL) == locale_before
@@ -0,0 +1,144 @@
+import io
+import threading
+
+import httplib2
+import pandas as pd
+import pytest
+from googleapiclient.errors import HttpError
+
+from rules_engine.get_external_source import get_ext_source
+from rules_engine.utils import gdrive_utils
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeDrive:
+    """A stand-in of the Drive API client, serving the files of `contents`."""
+
+    def __init__(self):
+        # file id -> (name, mimetype, content)
+        self.contents = {}
+        self.queries = []
+        self.downloads = []
+
+    def files(self):
+        return self
+
+    def list(self, q, **kwargs):
+        self.queries.append(q)
+        files = [
+            {"id": file_id, "name": name, "mimeType": mimetype}
+            for file_id, (name, mimetype, _) in self.contents.items()
+            if f"name='{name}'" in q and f"mimeType='{mimetype}'" in q
+        ]
+        return FakeRequest({"files": files[: kwargs.get("pageSize", 100)]})
+
+    def get_media(self, fileId):
+        return ("media", fileId)
+
+    def export_media(self, fileId, mimeType):
+        assert mimeType == gdrive_utils.XLSX_MIMETYPE
+        return ("export", fileId)
+
+
+class FakeDownload:
+    def __init__(self, fd, request, chunksize):
+        self.fd = fd
+        self.request = request
+        self.chunksize = chunksize
+        self.position = 0
+
+    def next_chunk(self):
+        drive = gdrive_utils.get_service()
+        drive.downloads.append(self.request)
+        if self.request[1] not in drive.contents:
+            raise HttpError(httplib2.Response({"status": 404}), b"File not found")
+        content = drive.contents[self.request[1]][2]
+        chunk = content[self.position : self.position + self.chunksize]
+        self.fd.write(chunk)
+        self.position += len(chunk)
+        return None, self.position >= len(content)
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    drive = FakeDrive()
+    builds = []
+
+    def _build(*args, **kwargs):
+        builds.append(threading.get_ident())
+        return drive
+
+    drive.builds = builds
+    monkeypatch.setattr(gdrive_utils, "build", _build)
+    monkeypatch.setattr(gdrive_utils, "get_credentials", lambda: object())
+    monkeypatch.setattr(gdrive_utils, "MediaIoBaseDownload", FakeDownload)
+    monkeypatch.setattr(gdrive_utils, "_credentials", None)
+    monkeypatch.setattr(gdrive_utils, "_local", threading.local())
+    monkeypatch.setattr(gdrive_utils, "_files", {})
+    return drive
+
+
+def _csv(rows):
+    output = io.BytesIO()
+    pd.DataFrame({"Name": [f"name {idx} " for idx in range(rows)]}).to_csv(
+        output, index=False
+    )
+    return output.getvalue()
+
+
+def test_search_file_is_cached(drive):
+    drive.contents["id1"] = ("a.csv", "text/csv", _csv(2))
+    source = get_ext_source(
+        {"source": "gdrive", "file_name": "a.csv", "mimetype": "text/csv"}
+    )
+
+    for _ in range(2):
+        assert source.get_data()["Name"].tolist() == ["name 0", "name 1"]
+
+    assert drive.queries == ["name='a.csv' and mimeType='text/csv' and trashed=false"]
+    assert len(drive.builds) == 1
+
+
+def test_open_file_streams_chunks(drive):
+    drive.contents["id1"] = ("a.csv", "text/csv", _csv(100))
+    file = gdrive_utils.search_file("a.csv", "text/csv")
+
+    df = pd.read_csv(gdrive_utils.open_file(file, chunksize=64))
+
+    assert len(df) == 100
+    assert len(drive.downloads) == -(-len(_csv(100)) // 64)
+
+
+def test_spreadsheet_is_exported(drive):
+    output = io.BytesIO()
+    pd.DataFrame({"Name": ["a ", "b"]}).to_excel(output, index=False)
+    drive.contents["id1"] = (
+        "a.xlsx",
+        gdrive_utils.SPREADSHEET_MIMETYPE,
+        output.getvalue(),
+    )
+
+    df = get_ext_source({"source": "gdrive", "file_name": "a.xlsx"}).get_data()
+
+    assert df["Name"].tolist() == ["a", "b"]
+    assert drive.downloads[0] == ("export", "id1")
+
+
+def test_replaced_file_is_searched_again(drive):
+    drive.contents["id1"] = ("a.csv", "text/csv", _csv(1))
+    source = get_ext_source(
+        {"source": "gdrive", "file_name": "a.csv", "mimetype": "text/csv"}
+    )
+    source.get_data()
+
+    drive.contents["id2"] = drive.contents.pop("id1")
+
+    assert len(source.get_data()) == 1
+    assert len(drive.queries) == 2
@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+from rules_engine import CompiledRuleSet
+from rules_engine.exceptions import ParsingRuleException
+from rules_engine.models import Comparison, Transformation
+from rules_engine.models import models
+from rules_engine.utils.literals import parse_literal
+
+
+@pytest.mark.parametrize(
+    ("text,expected"),
+    [
+        ("test", "test"),
+        ("'test'", "test"),
+        ("hello world", "hello world"),
+        ("123", "123"),
+        ("1.5", 1.5),
+        ("-3", -3),
+        ("True", True),
+        ("None", None),
+        ("[1, 'a', 2.5]", [1, "a", 2.5]),
+        ("{'a': 1}", {"a": 1}),
+        ("datetime.datetime(2024, 3, 11)", datetime.datetime(2024, 3, 11)),
+        ("datetime.date(2024, 3, 11)", datetime.date(2024, 3, 11)),
+        (
+            "datetime.date(2024, 3, 11) + datetime.timedelta(days=1)",
+            datetime.date(2024, 3, 12),
+        ),
+        ("2 * 3 + 1", 7),
+        ("max(1, 4)", 4),
+    ],
+)
+def test_parse_literal(text, expected):
+    assert parse_literal(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "__import__('os').system('echo')",
+        "open('file')",
+        "len",
+        "datetime.datetime.now()",
+        "(1).__class__",
+        "9 ** 9 ** 9",
+        "'a' * 10 ** 9",
+        "1 / 0",
+    ],
+)
+def test_parse_literal_refuses_code(text):
+    assert parse_literal(text) == text
+
+
+def test_mutable_literals_are_copied():
+    value = parse_literal("[1, 2]")
+    value.append(3)
+    assert parse_literal("[1, 2]") == [1, 2]
+
+
+def test_literals_are_parsed_once(make_engine, monkeypatch):
+    comparison = Comparison(
+        comparison_method="within",
+        variable="${status}",
+        comparison_variables=["'Active'", "datetime.date(2024, 3, 11)"],
+    )
+    transformation = Transformation(
+        transformation_method="set", variable="result", target_value="[1, 2]"
+    )
+
+    def _parse_literal(value):
+        raise AssertionError(f"{value} is parsed again")
+
+    monkeypatch.setattr(models, "parse_literal", _parse_literal)
+
+    engine = make_engine({"status": "Active"})
+    assert comparison.evaluate(engine)
+    transformation.apply(engine)
+    transformation.apply(engine)
+    assert engine.process_variables["result"] == [1, 2]
+
+
+def test_clock_calls_are_evaluated_at_each_evaluation():
+    rule_set = CompiledRuleSet(
+        rules={
+            "rules": {
+                "past": {
+                    "if": {
+                        "${date}": {"less_than": ["datetime.datetime.now()"]},
+                        "then": {"${checked_on}": {"set": ["datetime.date.today()"]}},
+                    }
+                }
+            }
+        }
+    )
+    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    assert rule_set.evaluate({"date": yesterday})["checked_on"] == (
+        datetime.date.today()
+    )
+    assert "checked_on" not in rule_set.evaluate({"date": tomorrow})
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "datetime.datetime.fromisoformat('2024-03-11')",
+        "datetime.date(2024, 13, 1)",
+        "datetime.datetime.now().year",
+    ],
+)
+def test_unsupported_datetime_call_fails_at_parse_time(value):
+    with pytest.raises(ParsingRuleException):
+        Comparison(
+            comparison_method="less_than",
+            variable="${date}",
+            comparison_variables=[value],
+        )
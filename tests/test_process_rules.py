@@ -1,7 +1,7 @@
 import os
 import pytest
 
-from rules_engine import RulesEngine
+from rules_engine import CompiledRuleSet, RulesEngine
 
 
 TEST_RULES_PATH = os.path.join(os.getcwd(), "tests", "test_rules")
@@ -138,3 +138,214 @@ def test_ext_data_rules_fail(ext_data_rules_path_fail, process_variables):
     vars_output = rules_engine.process_rules()
     assert vars_output["test_status"] == False
     assert "[NOK] test ext_data_1" in vars_output["result"]
+
+
+def test_compiled_rule_set(all_rules_path):
+    from .process_variables import TestProcessVariables
+
+    rule_set = CompiledRuleSet(rules_definition_path=all_rules_path)
+    for _ in range(3):
+        vars_output = rule_set.evaluate(TestProcessVariables().model_dump())
+        for result in vars_output["result"]:
+            assert "NOK" not in result
+        assert vars_output["test_status"] == True
+    assert len(rule_set.compiled_rules) == 1
+
+
+def test_compiled_rule_set_nested_variables():
+    rule_set = CompiledRuleSet(
+        rules={
+            "rules": {
+                "price check": {
+                    "if": {
+                        "${items.price}": {"greater_than": [2]},
+                        "then": {"${items.expensive}": {"set": [True]}},
+                    },
+                    "else": {"${items.expensive}": {"set": [False]}},
+                }
+            }
+        }
+    )
+    vars_output = rule_set.evaluate({"items": [{"price": 1}, {"price": 5}]})
+    assert [item["expensive"] for item in vars_output["items"]] == [False, True]
+    vars_output = rule_set.evaluate({"items": [{"price": 3}]})
+    assert vars_output["items"][0]["expensive"] == True
+    vars_output = rule_set.evaluate({"items": [{"price": 4}, {"price": 0}]})
+    assert [item["expensive"] for item in vars_output["items"]] == [True, False]
+    # one parse per shape of the `items` list
+    assert len(rule_set.compiled_rules) == 2
+
+    # only the most recently used shapes are kept
+    rule_set.max_compiled_shapes = 3
+    for length in range(1, 50):
+        rule_set.evaluate({"items": [{"price": 3}] * length})
+        rule_set.evaluate({"items": [{"price": 1}, {"price": 5}]})
+    assert len(rule_set.compiled_rules) == 3
+    assert next(reversed(rule_set.compiled_rules)) == rule_set._shape_key(
+        {"items": [{"price": 1}, {"price": 5}]}
+    )
+
+
+def test_compiled_rule_set_thread_pool(ext_data_rules_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from .process_variables import TestProcessVariables
+
+    rule_set = CompiledRuleSet(rules_definition_path=ext_data_rules_path)
+    inputs = [TestProcessVariables().model_dump() for _ in range(50)]
+    for idx, process_variables in enumerate(inputs):
+        if idx % 2:
+            process_variables["no_empty_str_variable"] = "unknown"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(rule_set.evaluate, inputs))
+    for idx, vars_output in enumerate(outputs):
+        assert ("[NOK] test ext_data_1" in vars_output["result"]) == (idx % 2 == 1)
+    # the parsed comparisons still hold the rule references
+    for rule in rule_set.compiled_rules[()][1].values():
+        for comparison in rule.if_condition.comparisons:
+            assert comparison.variable.startswith("${")
+
+
+def test_unknown_comparison_method_fails_at_parse_time():
+    from pydantic import ValidationError
+
+    with pytest.raises(ValidationError, match="Unknown comparison method"):
+        RulesEngine(
+            rules={
+                "rules": {
+                    "unknown method": {
+                        "if": {
+                            "${int_variable}": {"bigger_than": [1]},
+                            "then": {"${result}": {"set": [True]}},
+                        }
+                    }
+                }
+            },
+            process_variables={"int_variable": 2},
+        )
+
+
+@pytest.mark.parametrize(
+    "rules_path",
+    [
+        "test_all_rules.yml",
+        "test_groups.yml",
+        "test_global_rules.yml",
+        "test_logic_operator.yml",
+        "test_ext_source.yml",
+    ],
+)
+def test_compiled_rule_set_evaluate_frame(rules_path):
+    import copy
+    import pandas as pd
+    from .process_variables import TestProcessVariables
+
+    records = []
+    for idx in range(6):
+        process_variables = TestProcessVariables().model_dump()
+        if idx % 2:
+            process_variables["empty_str_variable"] = "not empty"
+        if idx % 3 == 1:
+            process_variables["float_variable"] = 5.5
+        records.append(process_variables)
+    frame = pd.DataFrame(copy.deepcopy(records))
+
+    rule_set = CompiledRuleSet(
+        rules_definition_path=os.path.join(TEST_RULES_PATH, rules_path)
+    )
+    vars_output = rule_set.evaluate_frame(frame)
+    expected_output = pd.DataFrame(
+        [
+            rule_set.evaluate(copy.deepcopy(process_variables))
+            for process_variables in records
+        ]
+    )
+    pd.testing.assert_frame_equal(
+        vars_output, expected_output[vars_output.columns], check_like=True
+    )
+    # the input records are left untouched
+    pd.testing.assert_frame_equal(frame, pd.DataFrame(copy.deepcopy(records)))
+
+
+def test_compiled_rule_set_process_many():
+    from .process_variables import TestProcessVariables
+
+    rule_set = CompiledRuleSet(
+        rules_definition_path=os.path.join(TEST_RULES_PATH, "test_ext_source.yml")
+    )
+    records = []
+    for idx in range(20):
+        process_variables = TestProcessVariables().model_dump()
+        if idx % 2:
+            process_variables["no_empty_str_variable"] = "unknown"
+        records.append(process_variables)
+
+    vars_outputs = list(rule_set.process_many(records, workers=2, chunksize=3))
+
+    assert "[NOK] test ext_data_1" in vars_outputs[1]["result"]
+    # the filters of the evaluations do not shrink the shared tables
+    for name, ext_data in rule_set.ext_data_variables.items():
+        assert ext_data is rule_set.ext_data_tables[name].frame
+        assert len(ext_data) > 1
+    assert vars_outputs == [
+        rule_set.evaluate(process_variables) for process_variables in records
+    ]
+
+
+def test_process_many_reads_records_as_needed():
+    import itertools
+
+    rule_set = CompiledRuleSet(
+        rules={
+            "rules": {
+                "large": {
+                    "if": {
+                        "${amount}": {"greater_than": [10]},
+                        "then": {"${large}": {"set": [True]}},
+                    },
+                    "else": {"${large}": {"set": [False]}},
+                }
+            }
+        }
+    )
+    read = []
+
+    def _records():
+        for idx in itertools.count():
+            read.append(idx)
+            yield {"amount": idx}
+
+    results = rule_set.process_many(_records(), workers=2, chunksize=3)
+    first = list(itertools.islice(results, 15))
+    results.close()
+
+    assert [result["large"] for result in first] == [idx > 10 for idx in range(15)]
+    # at most two chunks per worker are submitted ahead of the results
+    assert len(read) <= 15 + 2 * 2 * 3
+
+
+def test_process_many_with_spawned_workers():
+    import multiprocessing
+    import pickle
+
+    rule_set = CompiledRuleSet(
+        rules={
+            "rules": {
+                "double": {
+                    "if": {
+                        "${amount}": {"greater_than": [0]},
+                        "then": {"${result}": {"set": ["max(${amount}, 5) * 2"]}},
+                    }
+                }
+            }
+        }
+    )
+    records = [{"amount": amount, "result": None} for amount in range(-1, 9)]
+    expected = [rule_set.evaluate(dict(record)) for record in records]
+
+    # the compiled expressions are compiled again when unpickled
+    assert pickle.loads(pickle.dumps(rule_set)).evaluate(records[-1]) == expected[-1]
+    results = rule_set.process_many(
+        records, workers=2, chunksize=4, mp_context=multiprocessing.get_context("spawn")
+    )
+    assert list(results) == expected
+    assert expected[-1]["result"] == 16
@@ -0,0 +1,161 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+import pandas as pd
+import pytest
+
+from rules_engine.external_source import ExternalSourceException
+from rules_engine.get_external_source import get_ext_source
+from rules_engine.utils import s3_utils
+
+
+def _csv(rows):
+    output = io.BytesIO()
+    pd.DataFrame(
+        {"Name": [f"name {idx} " for idx in range(rows)], "Value": range(rows)}
+    ).to_csv(output, index=False)
+    return output.getvalue()
+
+
+def _xlsx():
+    output = io.BytesIO()
+    pd.DataFrame({"Name": ["a ", "b"], "Value": [1, 2]}).to_excel(output, index=False)
+    return output.getvalue()
+
+
+class MockS3(BaseHTTPRequestHandler):
+    """A local stand-in of S3 serving the objects of `server.objects` (path-style
+    URLs), with conditional and ranged GETs."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None, include_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def _object(self, include_body):
+        path = unquote(urlparse(self.path).path)
+        self.server.requests.append((self.command, path, self.headers.get("Range")))
+        content = self.server.objects.get(path)
+        if content is None:
+            return self._send(404, b"<Error><Code>NoSuchKey</Code></Error>")
+        etag = f'"{self.server.versions[path]}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        if self.headers.get("If-Match", etag) != etag:
+            return self._send(412, b"<Error><Code>PreconditionFailed</Code></Error>")
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+        if self.headers.get("Range"):
+            start, end = self.headers["Range"].split("=")[1].split("-")
+            start, end = int(start), min(int(end), len(content) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return self._send(206, content[start : end + 1], headers, include_body)
+        if not include_body:
+            # the length of the object, without sending it
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            return
+        self._send(200, content, headers)
+
+    def do_GET(self):
+        self._object(include_body=True)
+
+    def do_HEAD(self):
+        self._object(include_body=False)
+
+
+@pytest.fixture
+def s3_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockS3)
+    server.requests = []
+    server.objects = {}
+    server.versions = {}
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    monkeypatch.setenv("AWS_ENDPOINT_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(s3_utils, "_clients", {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _put(server, key, content, version="v1"):
+    server.objects[f"/bucket/{key}"] = content
+    server.versions[f"/bucket/{key}"] = version
+
+
+def _source(file_name, **kwargs):
+    return get_ext_source(
+        {"source": "s3", "bucket": "bucket", "file_name": file_name, **kwargs}
+    )
+
+
+def test_client_is_reused(s3_server):
+    _put(s3_server, "a.csv", _csv(3))
+
+    assert s3_utils.get_file_from_s3("bucket", "a.csv") == _csv(3)
+    assert s3_utils.get_file_from_s3("bucket", "a.csv") == _csv(3)
+    assert len(s3_utils._clients) == 1
+
+
+@pytest.mark.parametrize("file_name", ["a.csv", "a.xlsx"])
+def test_load_and_refresh(s3_server, file_name):
+    content = _csv(2) if file_name.endswith(".csv") else _xlsx()
+    _put(s3_server, file_name, content)
+    source = _source(file_name)
+
+    df, state = source.load()
+    assert df["Name"].tolist() == (
+        ["name 0", "name 1"] if file_name.endswith(".csv") else ["a", "b"]
+    )
+    assert state == {"etag": '"v1"'}
+
+    # not modified, the parsed frame is kept
+    refreshed, state = source.refresh(df, state)
+    assert refreshed is df and state == {"etag": '"v1"'}
+    assert s3_server.requests[-1][0] == "GET"
+
+    if file_name.endswith(".csv"):
+        _put(s3_server, file_name, _csv(3), "v2")
+        refreshed, state = source.refresh(df, state)
+        assert len(refreshed) == 3 and state == {"etag": '"v2"'}
+
+
+def test_csv_ranged_reads(s3_server):
+    content = _csv(1000)
+    _put(s3_server, "large.csv", content)
+
+    df = _source("large.csv", range_size=4096, columns=["Name"]).get_data()
+
+    assert list(df.columns) == ["Name"]
+    assert df["Name"].tolist() == [f"name {idx}" for idx in range(1000)]
+    ranges = [r for method, _, r in s3_server.requests if method == "GET"]
+    assert len(ranges) == -(-len(content) // 4096)
+    assert ranges[0] == "bytes=0-4095"
+
+
+def test_missing_file(s3_server, caplog):
+    with pytest.raises(ExternalSourceException):
+        _source("missing.csv").get_data()
+
+    # the error of S3 is logged, not only reported as a missing source
+    assert any(
+        record.levelname == "ERROR" and "missing.csv" in record.getMessage()
+        for record in caplog.records
+    )
@@ -0,0 +1,131 @@
+import copy
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rules_engine import CompiledRuleSet
+from rules_engine.shared_ext_data import SharedExtDataStore, SharedFrame
+
+TEST_RULES_PATH = os.path.join(os.path.dirname(__file__), "test_rules")
+
+
+def _is_memory_mapped(values: np.ndarray) -> bool:
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def test_store_publishes_once_and_attaches(tmp_path):
+    frame = pd.DataFrame(
+        {"Name": ["a", "b", None], "Amount": [1.5, 2.0, 3.0], "Count": [1, 2, 3]}
+    )
+    loads = []
+
+    def load():
+        loads.append(1)
+        return frame
+
+    generation, first = SharedExtDataStore(str(tmp_path)).get("key", load)
+    # another process attaches the published generation
+    same_generation, second = SharedExtDataStore(str(tmp_path)).get("key", load)
+
+    assert len(loads) == 1 and same_generation == generation
+    pd.testing.assert_frame_equal(
+        second.astype({"Name": object}), frame, check_dtype=False
+    )
+    assert _is_memory_mapped(second["Amount"].values)
+    assert _is_memory_mapped(second["Name"].cat.codes.values)
+
+
+def test_store_generations(tmp_path):
+    store = SharedExtDataStore(str(tmp_path), keep_generations=2)
+    generations = [
+        store.publish("key", pd.DataFrame({"Amount": [idx]})) for idx in range(4)
+    ]
+
+    assert store.current_generation("key") == generations[-1]
+    assert store.attach("key", generations[-1])["Amount"].tolist() == [3]
+    table_dir = store._table_dir("key")
+    assert sorted(
+        entry for entry in os.listdir(table_dir) if entry.isdigit()
+    ) == sorted(generations[-2:])
+
+
+@pytest.mark.parametrize(
+    "column",
+    [
+        # e.g. a workbook column mixing text and dates
+        ["a", pd.Timestamp("2024-01-01"), None],
+        # numpy would pickle the timestamps
+        pd.date_range("2024-01-01", periods=3, tz="Europe/Paris"),
+    ],
+)
+def test_unshareable_table_is_loaded_by_each_process(tmp_path, column):
+    frame = pd.DataFrame({"Name": ["a", "b", "c"], "Column": column})
+    store = SharedExtDataStore(str(tmp_path))
+
+    for _ in range(2):
+        generation, loaded = store.get("key", lambda: frame)
+        assert generation is None and loaded is frame
+    assert store.current_generation("key") is None
+
+    shared_frame = SharedFrame(store, "key", lambda: frame)
+    assert shared_frame() is frame and not shared_frame.is_stale()
+    assert shared_frame.publish() is None
+    assert store.current_generation("key") is None
+
+
+def test_unreadable_generation_is_published_again(tmp_path):
+    store = SharedExtDataStore(str(tmp_path))
+    generation = store.publish("key", pd.DataFrame({"Amount": [1]}))
+    with open(
+        os.path.join(store._table_dir("key"), generation, "meta.json"), "w"
+    ) as meta:
+        meta.write('{"columns": [], "rows": 0}')
+
+    new_generation, frame = store.get("key", lambda: pd.DataFrame({"Amount": [2]}))
+
+    assert new_generation not in (None, generation)
+    assert frame["Amount"].tolist() == [2]
+
+
+def test_rule_set_with_shared_ext_data(tmp_path):
+    from .process_variables import TestProcessVariables
+
+    rules_definition_path = os.path.join(TEST_RULES_PATH, "test_ext_source.yml")
+    rule_set = CompiledRuleSet(
+        rules_definition_path=rules_definition_path,
+        ext_data_shared_dir=str(tmp_path),
+    )
+    records = []
+    for idx in range(6):
+        process_variables = TestProcessVariables().model_dump()
+        if idx % 2:
+            process_variables["no_empty_str_variable"] = "unknown"
+        records.append(process_variables)
+    expected = [
+        CompiledRuleSet(rules_definition_path=rules_definition_path).evaluate(
+            copy.deepcopy(process_variables)
+        )
+        for process_variables in records
+    ]
+
+    assert [rule_set.evaluate(copy.deepcopy(pv)) for pv in records] == expected
+    # the workers attach the tables themselves, the frames are not pickled
+    unpickled = pickle.loads(pickle.dumps(rule_set))
+    assert not any(table.loaded for table in unpickled.ext_data_tables.values())
+    assert list(rule_set.process_many(records, workers=2)) == expected
+
+    engine = rule_set.engine({})
+    tables = rule_set.ext_data_tables
+    assert not rule_set.refresh_ext_data()
+    assert rule_set.publish_ext_data()
+    assert rule_set.ext_data_tables is not tables
+    # the engine created before the swap keeps its generation
+    assert engine.ext_data_tables is tables
+    assert [rule_set.evaluate(copy.deepcopy(pv)) for pv in records] == expected